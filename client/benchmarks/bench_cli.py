@@ -0,0 +1,99 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from dynamic_inst_client.communicator import Communicator
+from benchmarks.stub_server import StubServer, make_mangled_names
+
+# The modules that take the longest to import, none of them should be imported by the command line commands
+HEAVY_MODULES = ['urwid', 'requests', 'urllib3']
+
+
+def commands(address, name, directory):
+    """
+    :param address: The arguments of the server address, e.g. ['-p', '8000']
+    :param name: A function of the server, set and restored by the commands
+    :param directory: Directory for the profile and the counts file
+    :return: The list of (label, arguments of the interpreter), in the order they are run
+    """
+    profile = os.path.join(directory, 'bench')
+    counts = os.path.join(directory, 'counts')
+    with open(counts, 'w') as f:
+        f.write('1000000 %s\n' % name)
+    client = ['-m', 'dynamic_inst_client'] + address
+    return [
+        ('import', ['-c', 'import dynamic_inst_client.client']),
+        ('import ui', ['-c', 'import dynamic_inst_client.ui']),
+        ('list page', client + ['--limit', '10', 'list']),
+        ('list active', client + ['-f', 'active:', 'list']),
+        ('libraries', client + ['libraries']),
+        ('activate', client + ['activate', name]),
+        ('save', client + ['--profile', profile, 'save']),
+        ('diff', client + ['--profile', profile, 'diff']),
+        ('budget', client + ['--counts', counts, '--budget', '1', 'budget']),
+        ('apply', client + ['--profile', profile, 'apply']),
+        ('deactivate', client + ['deactivate', name]),
+    ]
+
+
+def heavy_imports(args):
+    """
+    Runs a command once with -X importtime to see which heavy modules it imports
+    :param args: The arguments of the interpreter
+    :return: The heavy modules imported
+    """
+    p = subprocess.run([sys.executable, '-X', 'importtime'] + args, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.PIPE, universal_newlines=True)
+    imported = {line.rsplit('|', 1)[-1].strip() for line in p.stderr.splitlines() if line.startswith('import time:')}
+    return [m for m in HEAVY_MODULES if m in imported]
+
+
+def time_command(args, repeat):
+    """
+    :param args: The arguments of the interpreter
+    :param repeat: The number of runs
+    :return: The wall times of the runs in seconds, from the start of the interpreter to its exit
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of each command line command, in a new interpreter')
+    parser.add_argument('-p', '--port', type=int, help='Port of a running server, a stand-in is used if not given')
+    parser.add_argument('-n', '--functions', type=int, default=10000, help='Number of functions of the stand-in')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    if port is None:
+        server = StubServer(make_mangled_names(args.functions))
+        server.start()
+        port = server.port
+    try:
+        comm = Communicator(light=True)
+        comm.connect(port)
+        name = comm.function_list.names[0]
+        comm.disconnect()
+        with tempfile.TemporaryDirectory() as directory:
+            print('%-12s %12s %12s  %s' % ('command', 'median (ms)', 'min (ms)', 'heavy imports'))
+            for label, command in commands(['-p', str(port)], name, directory):
+                times = time_command(command, args.repeat)
+                print('%-12s %12.1f %12.1f  %s' % (label, statistics.median(times) * 1000, min(times) * 1000,
+                                                   ', '.join(heavy_imports(command)) or '-'))
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
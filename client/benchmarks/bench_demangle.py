@@ -0,0 +1,59 @@
+import argparse
+import shutil
+import statistics
+import tempfile
+import time
+from functools import partial
+
+from dynamic_inst_client.demangle import CxaDemangler, Demangler, demangle_cxxfilt
+from benchmarks.stub_server import make_mangled_names
+
+
+def time_call(fn, repeat):
+    """
+    :param fn: The function to time, called without parameters
+    :param repeat: The number of calls
+    :return: The median time of a call in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time of the demangling of the function names')
+    parser.add_argument('-s', '--size', type=int, default=200000)
+    parser.add_argument('-r', '--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    names = make_mangled_names(args.size)
+    cases = []
+    cxxfilt = shutil.which('c++filt')
+    if cxxfilt is not None:
+        cases.append(('c++filt batch', partial(demangle_cxxfilt, names, cxxfilt)))
+    try:
+        cases.append(('__cxa_demangle', partial(CxaDemangler(), names)))
+    except (OSError, AttributeError):
+        pass
+
+    with tempfile.TemporaryDirectory() as directory:
+        Demangler(directory).demangle(names)
+        # A new demangler only has the disk cache, e.g. the next start of the client
+        cases.append(('disk cache', lambda: Demangler(directory).demangle(list(names))))
+        demangler = Demangler(directory)
+        demangler.demangle(names)
+        # A new list of the same names, e.g. after a refresh
+        cases.append(('memory cache', lambda: demangler.demangle(list(names))))
+
+        print('%d functions' % args.size)
+        print('%-16s %12s %14s' % ('demangling', 'median (ms)', 'names/s'))
+        for label, fn in cases:
+            t = time_call(fn, args.repeat)
+            print('%-16s %12.1f %14.0f' % (label, t * 1000, args.size / t))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import statistics
+import time
+
+from dynamic_inst_client.table import FunctionTable
+from dynamic_inst_client.ui import FilterFunctionWalker
+from dynamic_inst_client.util import Filter
+from benchmarks.stub_server import make_mangled_names
+
+# Typed one character at a time, then erased
+DEFAULT_QUERIES = ['Queue3push', '_ZN4core', 'active:Pool', 'serialize.*vector']
+
+
+def keystrokes(query):
+    """
+    :param query: The filter typed
+    :return: The successive texts of the filter edit, typed then erased one character at a time
+    """
+    typed = [query[:i] for i in range(1, len(query) + 1)]
+    return typed + typed[-2::-1]
+
+
+def time_full_scan(table, texts):
+    """
+    The previous filtering, the filter called on every function at each keystroke
+    :param table: The FunctionTable
+    :param texts: The successive filter texts
+    :return: The time of each keystroke in seconds, the invalid texts are skipped
+    """
+    times = []
+    for text in texts:
+        try:
+            fil = Filter(text)
+        except ValueError:
+            continue
+        start = time.perf_counter()
+        _ = [i for i, (f, a, s) in enumerate(zip(table.names, table.active, table.selected))
+             if fil(f, a == 1, s == 1)]
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def time_walker(table, texts):
+    """
+    The filtering of the ui while typing, with the substring index of the walker
+    :param table: The FunctionTable
+    :param texts: The successive filter texts
+    :return: The time of each keystroke in seconds, the invalid texts are skipped
+    """
+    walker = FilterFunctionWalker(table)
+    times = []
+    for text in texts:
+        try:
+            fil = Filter(text)
+        except ValueError:
+            continue
+        start = time.perf_counter()
+        walker.set_filter(fil)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time of each keystroke of the filter of the ui')
+    parser.add_argument('-s', '--size', type=int, default=200000)
+    parser.add_argument('-q', '--queries', nargs='+', default=DEFAULT_QUERIES)
+    args = parser.parse_args()
+
+    names = make_mangled_names(args.size)
+    table = FunctionTable((f, i % 7 == 0) for i, f in enumerate(names))
+    print('%d functions' % args.size)
+    print('%-20s %-10s %12s %12s %12s' % ('query', 'mode', 'first (ms)', 'median (ms)', 'max (ms)'))
+    for query in args.queries:
+        texts = keystrokes(query)
+        for mode, fn in (('full scan', time_full_scan), ('index', time_walker)):
+            times = fn(table, texts)
+            print('%-20s %-10s %12.2f %12.2f %12.2f' % (query, mode, times[0] * 1000, statistics.median(times) * 1000,
+                                                        max(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
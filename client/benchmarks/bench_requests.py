@@ -0,0 +1,104 @@
+import argparse
+import statistics
+import time
+
+import requests
+
+from dynamic_inst_client.communicator import Communicator
+from benchmarks.stub_server import StubServer, make_mangled_names
+
+# Query string of each kind of request of the clients
+QUERIES = [
+    ('whole list', {}),
+    ('active only', {'status': 'active'}),
+    ('first page', {'limit': 100}),
+    ('glob', {'match': '_ZN4core*'}),
+]
+
+
+def time_query(session, port, params, duration):
+    """
+    Sends the same GET request again and again, the body is read but not decoded so that only the server is measured
+    :param session: The requests session, its connection is kept alive
+    :param port: The port of the server
+    :param params: The query string parameters
+    :param duration: Seconds to send the requests for
+    :return: (the latencies in seconds, the size of a response in bytes)
+    """
+    url = Communicator.URL_TEMPLATE % port
+    times = []
+    size = 0
+    end = time.perf_counter() + duration
+    while not times or time.perf_counter() < end:
+        start = time.perf_counter()
+        r = session.get(url, params=params)
+        r.raise_for_status()
+        size = len(r.content)
+        times.append(time.perf_counter() - start)
+    return times, size
+
+
+def time_delta(session, port, name, duration):
+    """
+    Toggles a function then asks for the changes since the previous generation, the request of a refresh
+    :param session: The requests session
+    :param port: The port of the server
+    :param name: The function to toggle
+    :param duration: Seconds to send the requests for
+    :return: (the latencies of the delta requests in seconds, the size of a response in bytes)
+    """
+    url = Communicator.URL_TEMPLATE % port
+    times = []
+    size = 0
+    end = time.perf_counter() + duration
+    while not times or time.perf_counter() < end:
+        r = session.put(url, params={'reply': 'ack'},
+                        json={'functions': [{'name': name, 'active': len(times) % 2 == 0}]})
+        r.raise_for_status()
+        since = r.json()['generation'] - 1
+        start = time.perf_counter()
+        r = session.get(url, params={'since': since})
+        r.raise_for_status()
+        size = len(r.content)
+        times.append(time.perf_counter() - start)
+    session.put(url, params={'reply': 'ack'}, json={'functions': [{'name': name, 'active': False}]})
+    return times, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput of the list requests of the server')
+    parser.add_argument('-p', '--ports', type=int, nargs='+',
+                        help='Ports of running servers, e.g. the previous build and this one, a stand-in if not given')
+    parser.add_argument('-n', '--functions', type=int, default=200000, help='Number of functions of the stand-in')
+    parser.add_argument('-d', '--duration', type=float, default=3.0, help='Seconds of requests of each kind')
+    args = parser.parse_args()
+
+    server = None
+    ports = args.ports
+    if not ports:
+        server = StubServer(make_mangled_names(args.functions))
+        server.start()
+        ports = [server.port]
+    try:
+        print('%6s %-14s %10s %12s %12s %12s' % ('port', 'request', 'requests', 'req/s', 'median (ms)',
+                                                 'MiB/s'))
+        with requests.Session() as session:
+            for port in ports:
+                comm = Communicator()
+                comm.connect(port)
+                name = comm.function_list.names[0]
+                comm.disconnect()
+                results = [(label, time_query(session, port, params, args.duration)) for label, params in QUERIES]
+                results.append(('delta', time_delta(session, port, name, args.duration)))
+                for label, (times, size) in results:
+                    total = sum(times)
+                    print('%6d %-14s %10d %12.1f %12.3f %12.1f' % (port, label, len(times), len(times) / total,
+                                                                   statistics.median(times) * 1000,
+                                                                   size * len(times) / total / 2 ** 20))
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
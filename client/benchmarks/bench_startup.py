@@ -0,0 +1,139 @@
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import tempfile
+import time
+
+from dynamic_inst_client.communicator import Communicator, CommunicatorException
+
+DEFAULT_LIBRARY = os.path.join(os.path.dirname(__file__), '..', '..', 'server', '.libs',
+                               'libdynamic-inst-server.so')
+MCOUNT_LIBRARY = 'liblttng-mcount.so'
+
+
+def generate_binary(directory, count):
+    """
+    Compiles an instrumentable program with many functions.
+    It exits right away, or waits to be killed when it gets an argument.
+    :param directory: The directory to put the source and the binary in
+    :param count: The number of functions
+    :return: The path of the binary
+    """
+    source = os.path.join(directory, 'large.c')
+    binary = os.path.join(directory, 'large')
+    with open(source, 'w') as f:
+        f.write('#include <unistd.h>\n')
+        for i in range(count):
+            f.write('__attribute__((noinline)) void benchmark_function_%d(void) {}\n' % i)
+        f.write('int main(int argc, char **argv)\n{\n'
+                '\tbenchmark_function_0();\n'
+                '\tif (argc > 1)\n\t\tpause();\n'
+                '\treturn 0;\n}\n')
+    subprocess.run(['cc', '-O0', '-pg', '-o', binary, source], check=True)
+    return binary
+
+
+def free_port():
+    """
+    :return: A port nothing listens on
+    """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def preload_env(library, port, symcache=None):
+    """
+    :param library: The server library
+    :param port: The port of the server
+    :param symcache: The symbol cache directory, None to parse the symbols at each launch
+    :return: The environment to launch a program with lttng-mcount and the server preloaded
+    """
+    env = dict(os.environ)
+    env['LD_PRELOAD'] = '%s %s' % (MCOUNT_LIBRARY, os.path.abspath(library))
+    env['DYN_SERVER_PORT'] = str(port)
+    env.pop('DYN_SERVER_SYMCACHE', None)
+    if symcache is not None:
+        env['DYN_SERVER_SYMCACHE'] = symcache
+    return env
+
+
+def time_run(binary, env):
+    """
+    Launches the program and waits for it to exit
+    :param binary: The program
+    :param env: The environment, None for the current one
+    :return: The time from launch to exit, in seconds
+    """
+    start = time.perf_counter()
+    subprocess.run([binary], env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def time_ready(binary, library, timeout, symcache=None):
+    """
+    Launches the program with the server preloaded and waits until its function list can be fetched
+    :param binary: The program
+    :param library: The server library
+    :param timeout: Seconds to wait for the server
+    :param symcache: The symbol cache directory, None to parse the symbols at each launch
+    :return: The time from launch to the first function list, in seconds
+    """
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen([binary, 'wait'], env=preload_env(library, port, symcache),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        comm = Communicator()
+        while True:
+            try:
+                # Retried by the communicator while the server is loading the symbols
+                comm.connect(port)
+                return time.perf_counter() - start
+            except CommunicatorException:
+                if time.perf_counter() - start > timeout:
+                    raise
+                time.sleep(0.01)
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time of a program with and without the preloaded server')
+    parser.add_argument('-b', '--binary', help='Program to launch, generated if not given')
+    parser.add_argument('-n', '--functions', type=int, default=50000,
+                        help='Number of functions of the generated program')
+    parser.add_argument('-L', '--library', default=DEFAULT_LIBRARY, help='Path of libdynamic-inst-server.so')
+    parser.add_argument('-r', '--repeat', type=int, default=10)
+    parser.add_argument('-t', '--timeout', type=float, default=60.0)
+    parser.add_argument('-c', '--symcache', action='store_true',
+                        help='Also measure the list ready time with the symbol cache (DYN_SERVER_SYMCACHE)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.library):
+        parser.error('server library not found: %s' % args.library)
+
+    with tempfile.TemporaryDirectory() as directory:
+        binary = args.binary or generate_binary(directory, args.functions)
+        plain = [time_run(binary, None) for _ in range(args.repeat)]
+        preloaded = [time_run(binary, preload_env(args.library, free_port())) for _ in range(args.repeat)]
+        ready = [time_ready(binary, args.library, args.timeout) for _ in range(args.repeat)]
+        rows = [('plain, exit', plain), ('preloaded, exit', preloaded), ('preloaded, list ready', ready)]
+        if args.symcache:
+            symcache = os.path.join(directory, 'symcache')
+            # The first launch fills the cache
+            time_ready(binary, args.library, args.timeout, symcache)
+            cached = [time_ready(binary, args.library, args.timeout, symcache) for _ in range(args.repeat)]
+            rows.append(('cached, list ready', cached))
+
+    print('%s, %d runs' % (args.binary or '%d generated functions' % args.functions, args.repeat))
+    print('%22s %12s %12s' % ('launch', 'median (ms)', 'max (ms)'))
+    for name, times in rows:
+        print('%22s %12.1f %12.1f' % (name, statistics.median(times) * 1000, max(times) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import requests
+
+from dynamic_inst_client.communicator import Communicator
+from dynamic_inst_client.util import Filter, function_status
+from benchmarks.stub_server import StubServer, make_function_names
+
+
+def list_buffered(port, fil, out):
+    """
+    The previous list path: whole body parsed, copied in the cache, sorted, then printed
+    :param port: The port of the server
+    :param fil: The filter
+    :param out: The output file
+    :return: The time of the first output line
+    """
+    r = requests.get(Communicator.URL_TEMPLATE % port)
+    r.raise_for_status()
+    cache = {}
+    for f in r.json()['functions']:
+        cache[f['name']] = f['active']
+    first = None
+    for f in sorted([f for f in cache]):
+        if fil(f, cache[f]):
+            print(f, function_status(cache[f]), file=out)
+            if first is None:
+                first = time.perf_counter()
+    return first
+
+
+def list_streaming(port, fil, out):
+    """
+    The streaming list path of the list command
+    :param port: The port of the server
+    :param fil: The filter
+    :param out: The output file
+    :return: The time of the first output line
+    """
+    comm = Communicator()
+    comm.connect(port, fetch=False)
+    first = None
+    for f, active in comm.iter_functions():
+        if fil(f, active):
+            print(f, function_status(active), file=out)
+            if first is None:
+                first = time.perf_counter()
+    return first
+
+
+MODES = {'buffered': list_buffered, 'streaming': list_streaming}
+
+
+def run_child(mode, port, filter_text):
+    """
+    Runs one list in this process and prints its measures as JSON
+    """
+    with open(os.devnull, 'w') as out:
+        start = time.perf_counter()
+        first = MODES[mode](port, Filter(filter_text), out)
+        end = time.perf_counter()
+    print(json.dumps({
+        'first': None if first is None else first - start,
+        'total': end - start,
+        'maxrss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak RSS and time-to-first-output of the list command')
+    parser.add_argument('-s', '--size', type=int, default=200000)
+    parser.add_argument('-f', '--filter', default='')
+    parser.add_argument('--child', choices=sorted(MODES), help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.port, args.filter)
+        return
+
+    print('%d functions, filter %r' % (args.size, args.filter))
+    print('%10s %12s %12s %14s' % ('mode', 'first (ms)', 'total (ms)', 'peak RSS (MiB)'))
+    with StubServer(make_function_names(args.size)) as server:
+        for mode in sorted(MODES):
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.bench_stream', '--child', mode,
+                                  '--port', str(server.port), '-f', args.filter],
+                                 check=True, stdout=subprocess.PIPE).stdout
+            m = json.loads(out)
+            first = float('nan') if m['first'] is None else m['first'] * 1000
+            print('%10s %12.1f %12.1f %14.1f' % (mode, first, m['total'] * 1000, m['maxrss'] / 1024))
+
+
+if __name__ == '__main__':
+    main()
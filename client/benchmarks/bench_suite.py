@@ -0,0 +1,225 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import statistics
+import time
+import tracemalloc
+from argparse import Namespace
+
+from dynamic_inst_client.client import run_list
+from dynamic_inst_client.communicator import Communicator
+from dynamic_inst_client.scopes import ScopeTree
+from dynamic_inst_client.ui import FilterFunctionWalker
+from dynamic_inst_client.util import Filter
+from benchmarks.stub_server import StubServer, make_mangled_names
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+# Server-side (status, glob), client-side regex, and both
+LIST_FILTERS = ['', 'active:', '^_ZN4core', 'Queue[0-9]+push', 'active:^_ZN2io']
+WALKER_FILTERS = ['', 'Queue[0-9]+push']
+CHANGES = 100
+STEPS = 1000
+
+
+def serve(count, conn):
+    """
+    Runs a stand-in server in a child process, so that its allocations and its CPU time are not measured
+    :param count: The number of functions
+    :param conn: The pipe the port is sent through, the server stops when something is received
+    """
+    names = make_mangled_names(count)
+    # One function in 7 is active, for the status filters
+    with StubServer(names) as server:
+        for name in names[::7]:
+            server.functions[name] = True
+        conn.send(server.port)
+        conn.recv()
+
+
+def measure(fn, repeat):
+    """
+    Measures a case: its wall time without tracing, then its peak of Python memory with tracemalloc
+    :param fn: The case, called without arguments
+    :param repeat: The number of timed calls
+    :return: (the median wall time in seconds, the peak memory in bytes)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def connected(port):
+    """
+    :param port: The port of the server
+    :return: A Communicator connected to the server
+    """
+    comm = Communicator()
+    comm.connect(port)
+    return comm
+
+
+def cases(port):
+    """
+    Makes the cases to measure against a server
+    :param port: The port of the server
+    :return: The list of (name, function)
+    """
+    comm = connected(port)
+    other = connected(port)
+    table = comm.function_list
+    names = table.names
+    changed = names[1:CHANGES * 13:13]
+    toggle = names[len(names) // 2]
+    state = {'toggle': False, 'changes': False}
+
+    def connect():
+        connected(port).disconnect()
+
+    def refresh_unchanged():
+        comm.refresh()
+
+    def refresh_changed():
+        # Another client changes the functions, the refresh downloads them
+        state['changes'] = not state['changes']
+        other.function_list = {f: state['changes'] for f in changed}
+        comm.refresh()
+
+    def toggle_one():
+        state['toggle'] = not state['toggle']
+        comm.function_list = {toggle: state['toggle']}
+
+    def list_filtered(text):
+        args = Namespace(port=[port], socket=None, filter=text, offset=0, limit=None, demangle=False)
+
+        def run():
+            with open(os.devnull, 'w') as out, contextlib.redirect_stdout(out):
+                run_list(args)
+        return run
+
+    def walker_build(text):
+        return lambda: FilterFunctionWalker(table, Filter(text))
+
+    def walker_navigate(text):
+        walker = FilterFunctionWalker(table, Filter(text))
+
+        def run():
+            # Like the ListBox moving the focus down, the title shows the position at each step
+            pos = walker.focus
+            for _ in range(STEPS):
+                if pos is None:
+                    break
+                walker.set_focus(pos)
+                _ = walker.position
+                try:
+                    pos = walker.next_position(pos)
+                except IndexError:
+                    pos = None
+        return run
+
+    def tree_root():
+        ScopeTree(names).children(ScopeTree(names).root)
+
+    def tree_expand():
+        # The biggest namespace, then its biggest class
+        tree = ScopeTree(names)
+        scope = tree.root
+        for _ in range(2):
+            scopes, _ = tree.children(scope)
+            if not scopes:
+                break
+            scope = max(scopes, key=lambda s: tree.count(s, table.active)[1])
+
+    result = [
+        ('connect', connect),
+        ('refresh, unchanged', refresh_unchanged),
+        ('refresh, %d changed' % CHANGES, refresh_changed),
+        ('toggle', toggle_one),
+    ]
+    result += [('list %r' % text, list_filtered(text)) for text in LIST_FILTERS]
+    result += [('walker build %r' % text, walker_build(text)) for text in WALKER_FILTERS]
+    result += [('walker %d steps %r' % (STEPS, text), walker_navigate(text)) for text in WALKER_FILTERS]
+    result += [('tree root', tree_root), ('tree expand 2 levels', tree_expand)]
+    return result
+
+
+def run_size(count, repeat):
+    """
+    Measures every case against a server with a number of functions
+    :param count: The number of functions
+    :param repeat: The number of timed calls of each case
+    :return: The results, case -> {'time': seconds, 'peak': bytes}
+    """
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(count, child), daemon=True)
+    server.start()
+    try:
+        port = parent.recv()
+        results = {}
+        for name, fn in cases(port):
+            elapsed, peak = measure(fn, repeat)
+            results[name] = {'time': elapsed, 'peak': peak}
+        return results
+    finally:
+        parent.send(None)
+        server.join()
+
+
+def print_results(results, baseline, threshold):
+    """
+    Prints the results, compared with the baseline if any
+    :param results: The results, size -> case -> measures
+    :param baseline: The results of a previous run, None for no comparison
+    :param threshold: The ratio to the baseline above which a measure is flagged as a regression
+    """
+    print('%8s %-40s %12s %12s %s' % ('symbols', 'case', 'time (ms)', 'peak (KiB)',
+                                      'vs. baseline' if baseline else ''))
+    for size, size_results in results.items():
+        for name, r in size_results.items():
+            line = '%8s %-40s %12.3f %12.1f' % (size, name, r['time'] * 1000, r['peak'] / 1024)
+            old = (baseline or {}).get(size, {}).get(name)
+            if old is not None:
+                marks = []
+                for key in ('time', 'peak'):
+                    ratio = r[key] / old[key] if old[key] else 1.0
+                    marks.append('%s x%.2f%s' % (key, ratio, ' REGRESSION' if ratio > threshold else ''))
+                line += ' ' + ', '.join(marks)
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Wall time and peak memory of the client operations vs. symbol count')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES)
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='Writes the results to a JSON file, to use as a baseline later')
+    parser.add_argument('-b', '--baseline', help='Compares with the results of a previous run')
+    parser.add_argument('-t', '--threshold', type=float, default=1.2,
+                        help='Ratio to the baseline above which a measure is flagged as a regression')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    # The sizes are the keys of the JSON file, they are strings there too
+    results = {str(size): run_size(size, args.repeat) for size in args.sizes}
+    print_results(results, baseline, args.threshold)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
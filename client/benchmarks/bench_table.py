@@ -0,0 +1,72 @@
+import argparse
+import json
+import time
+import tracemalloc
+
+from dynamic_inst_client.table import FunctionTable
+from benchmarks.stub_server import make_function_names
+
+
+def decoded_entries(body):
+    """
+    Decodes a function list body like the Communicator does, every name is a new string
+    :param body: The JSON body
+    :return: Generator of (name, active)
+    """
+    for f in json.loads(body)['functions']:
+        yield f['name'], f['active']
+
+
+def build_dicts(body, selection):
+    """
+    The previous layout: cache dict, sorted copy of the names and a set for the selection
+    """
+    cache = {}
+    for name, active in decoded_entries(body):
+        cache[name] = active
+    names = sorted([f for f in cache])
+    selected = set(names[::selection])
+    return cache, names, selected
+
+
+def build_table(body, selection):
+    """
+    The FunctionTable layout
+    """
+    table = FunctionTable(decoded_entries(body))
+    table.selected[::selection] = b'\x01' * len(range(0, len(table), selection))
+    return table
+
+
+def measure(build, body, selection):
+    """
+    Measures the memory kept by a layout and the time to build it
+    :return: (bytes, seconds)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = build(body, selection)
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory of the function list layouts')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[10000, 100000, 200000])
+    parser.add_argument('--selection', type=int, default=10, help='One function in SELECTION is selected')
+    args = parser.parse_args()
+
+    print('%10s %10s %12s %12s' % ('symbols', 'layout', 'memory (MiB)', 'build (ms)'))
+    for size in args.sizes:
+        body = json.dumps({'functions': [{'name': f, 'active': i % 7 == 0}
+                                         for i, f in enumerate(sorted(make_function_names(size)))]})
+        for layout, build in (('dicts', build_dicts), ('table', build_table)):
+            mem, elapsed = measure(build, body, args.selection)
+            print('%10d %10s %12.2f %12.1f' % (size, layout, mem / 2 ** 20, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
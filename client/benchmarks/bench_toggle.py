@@ -0,0 +1,64 @@
+import argparse
+import json
+import time
+
+import requests
+
+from dynamic_inst_client.communicator import Communicator
+from benchmarks.stub_server import StubServer, make_function_names
+
+
+def time_toggles(comm, name, repeat):
+    """
+    Measures the latency of activating/deactivating one function through the Communicator
+    :param comm: The connected Communicator
+    :param name: The function to toggle
+    :param repeat: The number of toggles
+    :return: The mean latency in seconds
+    """
+    start = time.perf_counter()
+    for i in range(repeat):
+        comm.function_list = {name: i % 2 == 0}
+    return (time.perf_counter() - start) / repeat
+
+
+def time_full_puts(port, functions, repeat):
+    """
+    Measures the latency of the previous behaviour, a PUT of the whole table answered by the whole table
+    :param port: The port of the server
+    :param functions: The function list
+    :param repeat: The number of requests
+    :return: The mean latency in seconds
+    """
+    session = requests.Session()
+    url = Communicator.URL_TEMPLATE % port
+    data = json.dumps({'functions': [{'name': f, 'active': functions[f]} for f in functions]})
+    start = time.perf_counter()
+    for _ in range(repeat):
+        r = session.put(url, data=data)
+        r.raise_for_status()
+        r.json()
+    session.close()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-toggle latency vs. symbol-table size')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('-r', '--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print('%10s %15s %15s' % ('symbols', 'delta (ms)', 'full (ms)'))
+    for size in args.sizes:
+        names = make_function_names(size)
+        with StubServer(names) as server:
+            comm = Communicator()
+            comm.connect(server.port)
+            delta = time_toggles(comm, names[size // 2], args.repeat)
+            full = time_full_puts(server.port, comm.function_list, args.repeat)
+            comm.disconnect()
+        print('%10d %15.3f %15.3f' % (size, delta * 1000, full * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from dynamic_inst_client.communicator import Communicator
+from benchmarks.stub_server import StubServer, make_function_names
+
+
+def time_requests(address, repeat):
+    """
+    Measures the latency of the requests of a client, a toggle (PUT) and a refresh (GET of the changes)
+    :param address: The port or the Unix socket path of the server
+    :param repeat: The number of requests of each kind
+    :return: (the toggle latencies, the refresh latencies), in seconds
+    """
+    comm = Communicator()
+    comm.connect(address)
+    name = comm.function_list.names[0]
+    toggles = []
+    refreshes = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        comm.function_list = {name: i % 2 == 0}
+        toggles.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        comm.refresh()
+        refreshes.append(time.perf_counter() - start)
+    comm.function_list = {name: False}
+    comm.disconnect()
+    return toggles, refreshes
+
+
+def time_connect(address, repeat):
+    """
+    Measures the time to connect and fetch the whole function list
+    :param address: The port or the Unix socket path of the server
+    :param repeat: The number of connections
+    :return: The latencies, in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        comm = Communicator()
+        comm.connect(address)
+        times.append(time.perf_counter() - start)
+        comm.disconnect()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Request latency over TCP vs. over a Unix socket')
+    parser.add_argument('-p', '--port', type=int, help='Port of a running server, a stand-in is used if not given')
+    parser.add_argument('-s', '--socket', help='Unix socket of a running server, a stand-in is used if not given')
+    parser.add_argument('-n', '--functions', type=int, default=10000,
+                        help='Number of functions of the stand-ins')
+    parser.add_argument('-r', '--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    servers = []
+    with tempfile.TemporaryDirectory() as directory:
+        try:
+            names = make_function_names(args.functions)
+            port = args.port
+            if port is None:
+                servers.append(StubServer(names))
+                servers[-1].start()
+                port = servers[-1].port
+            socket_path = args.socket
+            if socket_path is None:
+                servers.append(StubServer(names, socket_path=os.path.join(directory, 'dyn-server-0.sock')))
+                servers[-1].start()
+                socket_path = servers[-1].socket_path
+
+            print('%d runs' % args.repeat)
+            print('%10s %20s %20s %20s' % ('transport', 'toggle median (ms)', 'refresh median (ms)',
+                                           'connect median (ms)'))
+            for transport, address in (('tcp', port), ('unix', socket_path)):
+                toggles, refreshes = time_requests(address, args.repeat)
+                connects = time_connect(address, max(args.repeat // 20, 1))
+                print('%10s %20.3f %20.3f %20.3f' % (transport, statistics.median(toggles) * 1000,
+                                                     statistics.median(refreshes) * 1000,
+                                                     statistics.median(connects) * 1000))
+        finally:
+            for server in servers:
+                server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import statistics
+import time
+
+from dynamic_inst_client.communicator import Communicator
+from benchmarks.stub_server import StubServer, make_function_names
+
+
+def is_active(comm, name):
+    """
+    Asks the server for the status of one function
+    :param comm: The connected Communicator
+    :param name: The function
+    :return: True if the function is active
+    """
+    return any(True for _ in comm.iter_functions(status='active', match=name))
+
+
+def measure_window(comm, name, window, interval):
+    """
+    Activates a function for a while and polls the server until it is set back
+    :param comm: The connected Communicator
+    :param name: The function, nopped
+    :param window: The length of the window in seconds
+    :param interval: Seconds between the polls
+    :return: The time from the activation to the first poll that sees the function nopped again, in seconds
+    """
+    start = time.perf_counter()
+    comm.set_functions({name: True}, window)
+    time.sleep(max(window - 0.05, 0))
+    while is_active(comm, name):
+        time.sleep(interval)
+    elapsed = time.perf_counter() - start
+    # The function list doesn't see the revert, set it back for the next run
+    comm.function_list = {name: False}
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Accuracy of the activation windows set back by the server')
+    parser.add_argument('-p', '--port', type=int,
+                        help='Port of a running server, a local stand-in is used if not given')
+    parser.add_argument('-n', '--name', help='Function to activate, the first one of the list if not given')
+    parser.add_argument('-w', '--windows', type=float, nargs='+', default=[0.1, 0.5, 1.0, 2.0],
+                        help='Windows to measure, in seconds')
+    parser.add_argument('-r', '--repeat', type=int, default=5)
+    parser.add_argument('-i', '--interval', type=float, default=0.001, help='Seconds between the polls')
+    args = parser.parse_args()
+
+    server = None
+    port = args.port
+    if port is None:
+        server = StubServer(make_function_names(1000))
+        server.start()
+        port = server.port
+    try:
+        comm = Communicator()
+        comm.connect(port)
+        name = args.name or comm.function_list.names[0]
+        print('%s on port %d, %d runs, polled every %.1f ms' % (name, port, args.repeat, args.interval * 1000))
+        print('%12s %12s %12s %12s' % ('window (s)', 'median (ms)', 'min (ms)', 'max (ms)'))
+        for window in args.windows:
+            errors = [measure_window(comm, name, window, args.interval) - window for _ in range(args.repeat)]
+            print('%12.3f %+12.1f %+12.1f %+12.1f' % (window, statistics.median(errors) * 1000,
+                                                      min(errors) * 1000, max(errors) * 1000))
+        comm.disconnect()
+    finally:
+        if server is not None:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+import json
+import os
+import random
+import threading
+import time
+from fnmatch import fnmatchcase
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingUnixStreamServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def make_function_names(count):
+    """
+    Generates mangled looking function names
+    :param count: The number of names to generate
+    :return: The list of names
+    """
+    return ['_ZN9benchmark6detail%dEv' % i for i in range(count)]
+
+
+NAMESPACES = ['app', 'core', 'net', 'detail', 'impl', 'util', 'storage', 'http', 'json', 'io', 'sched', 'cache']
+WORDS = ['request', 'queue', 'buffer', 'handler', 'session', 'parser', 'token', 'stream', 'worker', 'pool',
+         'connection', 'allocator', 'record', 'index', 'table', 'event', 'timer', 'channel', 'context', 'policy']
+VERBS = ['push', 'pop', 'get', 'set', 'reset', 'flush', 'parse', 'handle', 'dispatch', 'update', 'find', 'insert',
+         'erase', 'resize', 'compare', 'serialize', 'visit', 'notify']
+PARAMETERS = ['v', 'i', 'm', 'b', 'RKSt6string', 'PKcm', 'RKS0_', 'St10shared_ptrIS0_E', 'iPv', 'OS0_',
+              'RKSt6vectorIiSaIiEE', 'NS_8optionalIiEE', 'mmb']
+
+
+def make_mangled_names(count, seed=0):
+    """
+    Generates unique Itanium-mangled C++ method names of realistic lengths (30 to 90 characters, 50 on average), e.g.
+    _ZN4core6detail16RequestQueue1234pushERKSt6string
+    :param count: The number of names to generate
+    :param seed: The seed, the same seed gives the same names
+    :return: The sorted list of names
+    """
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        parts = rng.sample(NAMESPACES, rng.randint(1, 3))
+        parts.append('%s%s%d' % (rng.choice(WORDS).capitalize(), rng.choice(WORDS).capitalize(),
+                                 rng.randrange(max(count // 20, 1))))
+        parts.append(rng.choice(VERBS) + rng.choice(['', '_impl', 'All', 'Locked']))
+        names.add('_ZN%sE%s' % (''.join('%d%s' % (len(p), p) for p in parts), rng.choice(PARAMETERS)))
+    return sorted(names)
+
+
+class StubBinary:
+    """
+    Instrumentation state of the main program or of a shared library
+    :ivar functions: The function states, name -> active
+    :ivar generation: The generation of the last change set, the functions changed by a PUT share one generation
+    :ivar changed: The generation of the last change of each function
+    :ivar loaded: True once a client asked for the functions of the binary
+    :ivar reverts: The functions set for a while, name -> (status to set back, threading.Timer)
+    """
+
+    def __init__(self, names):
+        """
+        :param names: The function names, all nopped at start
+        """
+        self.functions = {f: False for f in names}
+        self.generation = 0
+        self.changed = {}
+        self.loaded = False
+        self.reverts = {}
+
+    def set(self, name, active, generation=None):
+        """
+        Sets the status of a function, the generation is bumped if it changes
+        :param name: The name of the function
+        :param active: The status
+        :param generation: The generation of the change set, None for a change on its own
+        """
+        if self.functions[name] != active:
+            self.functions[name] = active
+            self.generation = self.generation + 1 if generation is None else generation
+            self.changed[name] = self.generation
+
+    def set_for(self, name, active, window, generation):
+        """
+        Sets the status of a function, or ends its window
+        :param name: The name of the function
+        :param active: The status
+        :param window: The window in milliseconds after which the previous status is set back, 0 for no window
+        :param generation: The generation of the change set
+        """
+        pending = self.reverts.pop(name, None)
+        if pending is not None:
+            pending[1].cancel()
+        if window:
+            previous = pending[0] if pending is not None else self.functions[name]
+            timer = threading.Timer(window / 1000, self.__revert, (name,))
+            self.reverts[name] = (previous, timer)
+            timer.start()
+        self.set(name, active, generation)
+
+    def __revert(self, name):
+        """
+        Timer callback, sets back the status a function had before its window
+        :param name: The name of the function
+        """
+        pending = self.reverts.pop(name, None)
+        if pending is not None:
+            self.set(name, pending[0])
+
+
+class StubInstrumentationHandler(BaseHTTPRequestHandler):
+    """
+    Request handler that mimics the /instrumentation and /libraries endpoints of dynamic-server.c
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    WRITE_SIZE = 64 * 1024
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/libraries':
+            self.__send_libraries()
+            return
+        if url.path != '/instrumentation':
+            self.send_error(404)
+            return
+        if self.__loading():
+            return
+        query = parse_qs(url.query)
+        if query.get('status', ['active'])[0] not in ('active', 'nopped'):
+            self.send_error(400)
+            return
+        binary = self.__get_binary(query)
+        if binary is None:
+            return
+        since = query.get('since')
+        if since is not None and int(since[0]) <= binary.generation:
+            since = int(since[0])
+            if since == binary.generation:
+                self.send_response(304)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.__send_list(binary, since, query)
+        else:
+            self.__send_list(binary, query=query)
+
+    def do_PUT(self):
+        url = urlsplit(self.path)
+        if url.path != '/instrumentation':
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if self.__loading():
+            return
+        query = parse_qs(url.query)
+        binary = self.__get_binary(query)
+        if binary is None:
+            return
+        body = json.loads(body)
+        window = int(query.get('for', [0])[0])
+        generation = binary.generation + 1
+        for f in body['functions']:
+            if f['name'] not in binary.functions:
+                self.send_error(400)
+                return
+            binary.set_for(f['name'], f['active'], window, generation)
+        if query.get('reply') == ['ack']:
+            self.__send_chunks([json.dumps({'updated': len(body['functions']),
+                                            'generation': binary.generation}).encode()])
+        else:
+            self.__send_list(binary, query=query)
+
+    def __get_binary(self, query):
+        """
+        Gets the binary named by the lib parameter, answers 404 if there is no such library
+        :param query: The parsed query string
+        :return: The StubBinary, None if there is no such library
+        """
+        lib = query.get('lib', [None])[0]
+        binary = self.server.binaries.get(lib)
+        if binary is None:
+            self.send_error(404)
+            return None
+        binary.loaded = True
+        return binary
+
+    def __send_libraries(self):
+        """
+        Sends the library list
+        """
+        libs = [{'name': lib, 'path': '/usr/lib/' + lib, 'loaded': binary.loaded}
+                for lib, binary in sorted(self.server.binaries.items(), key=lambda b: b[0] or '') if lib is not None]
+        self.__send_chunks([json.dumps({'libraries': libs}).encode()])
+
+    def __loading(self):
+        """
+        Answers like the server does while it is loading the symbols
+        :return: True if the server is still loading
+        """
+        if time.monotonic() >= self.server.ready_at:
+            return False
+        body = b'{ "loading": true }\n'
+        self.send_response(503)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def __send_list(self, binary, since=None, query=None):
+        """
+        Sends the function list, one chunk per function like the server does
+        :param binary: The StubBinary whose functions are sent
+        :param since: Only send the functions changed after this generation, None for all
+        :param query: The parsed query string, status, match, offset and limit filter and page the list
+        """
+        query = query or {}
+        functions = binary.functions
+        header = '{ "generation": %d, ' % binary.generation
+        if 'lib' in query:
+            header += '"lib": "%s", ' % query['lib'][0]
+        if since is None:
+            names = sorted(functions)
+        else:
+            names = sorted(f for f, g in binary.changed.items() if g > since)
+            header += '"since": %d, ' % since
+        header += '"functions": ['
+
+        if 'status' in query:
+            active = query['status'][0] == 'active'
+            names = [f for f in names if functions[f] == active]
+        if 'match' in query:
+            names = [f for f in names if fnmatchcase(f, query['match'][0])]
+        total = len(names)
+        offset = int(query.get('offset', [0])[0])
+        limit = int(query.get('limit', [0])[0])
+        names = names[offset:offset + limit] if limit else names[offset:]
+
+        def chunks():
+            yield header.encode()
+            for i, f in enumerate(names):
+                yield ('{"name":"%s", "active":%s}%s' % (
+                    f, 'true' if functions[f] else 'false', ', ' if i < len(names) - 1 else '')).encode()
+            yield b'], "total": %d }\n' % total
+
+        self.__send_chunks(chunks())
+
+    def __send_chunks(self, chunks):
+        """
+        Sends a chunked HTTP response, written as the chunks are produced
+        :param chunks: Iterable of the chunks of the body
+        """
+        self.send_response(200)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        out = bytearray()
+        for c in chunks:
+            out += b'%x\r\n%s\r\n' % (len(c), c)
+            if len(out) >= StubInstrumentationHandler.WRITE_SIZE:
+                self.wfile.write(out)
+                out = bytearray()
+        out += b'0\r\n\r\n'
+        self.wfile.write(out)
+
+
+class StubUnixHandler(StubInstrumentationHandler):
+    """
+    Request handler of the stand-in listening on a Unix socket
+    """
+    disable_nagle_algorithm = False
+
+    def address_string(self):
+        return 'unix'
+
+
+class StubUnixServer(ThreadingUnixStreamServer):
+    """
+    HTTP server listening on a Unix socket, like the server with DYN_SERVER_SOCKET_DIR
+    """
+    daemon_threads = True
+
+
+class StubServer:
+    """
+    Local stand-in for the instrumentation server, runs in a background thread
+    :ivar port: The port the server listens on, None on a Unix socket
+    :ivar socket_path: The path of the Unix socket the server listens on, None on a TCP port
+    :ivar functions: The function states of the main program, shared with the request handlers
+    :ivar binaries: The StubBinary of the main program (None) and of each library (file name)
+    """
+
+    def __init__(self, names, port=0, loading=0.0, libraries=None, socket_path=None):
+        """
+        :param names: The function names to serve, all nopped at start
+        :param port: The port to use, 0 to pick a free one
+        :param loading: Seconds during which the server answers that it is loading the symbols, from start
+        :param libraries: The function names of the shared libraries, file name -> names
+        :param socket_path: The path of a Unix socket to listen on instead of the port
+        """
+        if socket_path is None:
+            self.__httpd = ThreadingHTTPServer(('127.0.0.1', port), StubInstrumentationHandler)
+            self.__httpd.daemon_threads = True
+            self.port = self.__httpd.server_address[1]
+        else:
+            self.__httpd = StubUnixServer(socket_path, StubUnixHandler)
+            self.port = None
+        self.socket_path = socket_path
+        self.__httpd.binaries = {None: StubBinary(names)}
+        for lib, lib_names in (libraries or {}).items():
+            self.__httpd.binaries[lib] = StubBinary(lib_names)
+        self.__httpd.ready_at = 0.0
+        self.__loading = loading
+        self.binaries = self.__httpd.binaries
+        self.functions = self.binaries[None].functions
+        self.__thread = None
+
+    def start(self):
+        self.__httpd.ready_at = time.monotonic() + self.__loading
+        self.__thread = threading.Thread(target=self.__httpd.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__httpd.shutdown()
+        self.__httpd.server_close()
+        if self.socket_path is not None:
+            os.unlink(self.socket_path)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,86 @@
+import socket
+from urllib.parse import unquote, urlsplit
+
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool
+from urllib3.connection import HTTPConnection
+from urllib3.exceptions import NewConnectionError
+
+
+class UnixSocketConnection(HTTPConnection):
+    """
+    HTTP connection over a Unix socket
+    :ivar __path: The path of the socket
+    """
+
+    def __init__(self, path, **kwargs):
+        """
+        :param path: The path of the socket
+        :param kwargs: The arguments of urllib3.connection.HTTPConnection
+        """
+        super().__init__('localhost', **kwargs)
+        self.__path = path
+
+    def _new_conn(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Without a timeout, urllib3 passes its default timeout sentinel
+        sock.settimeout(self.timeout if isinstance(self.timeout, (int, float)) else None)
+        try:
+            sock.connect(self.__path)
+        except OSError as e:
+            sock.close()
+            raise NewConnectionError(self, 'Could not connect to %s: %s' % (self.__path, e)) from e
+        return sock
+
+
+class UnixSocketConnectionPool(HTTPConnectionPool):
+    """
+    Pool of the HTTP connections to one Unix socket
+    :ivar __path: The path of the socket
+    """
+
+    def __init__(self, path, **kwargs):
+        """
+        :param path: The path of the socket
+        :param kwargs: The arguments of urllib3.HTTPConnectionPool
+        """
+        super().__init__('localhost', **kwargs)
+        self.__path = path
+
+    def _new_conn(self):
+        return UnixSocketConnection(self.__path, timeout=self.timeout.connect_timeout)
+
+
+class UnixSocketAdapter(HTTPAdapter):
+    """
+    Transport adapter of requests for the http+unix:// urls made by transport.unix_url, the host part is the quoted
+    path of the socket. The connections are kept alive like the TCP ones.
+    :ivar __pools: The connection pools, socket path -> UnixSocketConnectionPool
+    """
+
+    def __init__(self, **kwargs):
+        """
+        :param kwargs: The arguments of requests.adapters.HTTPAdapter
+        """
+        super().__init__(**kwargs)
+        self.__pools = {}
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        return self.get_connection(request.url, proxies)
+
+    def get_connection(self, url, proxies=None):
+        path = unquote(urlsplit(url).netloc)
+        pool = self.__pools.get(path)
+        if pool is None:
+            pool = UnixSocketConnectionPool(path, maxsize=self._pool_maxsize)
+            self.__pools[path] = pool
+        return pool
+
+    def request_url(self, request, proxies):
+        return request.path_url
+
+    def close(self):
+        for pool in self.__pools.values():
+            pool.close()
+        self.__pools = {}
+        super().close()
@@ -0,0 +1,65 @@
+DURATION_HEADER = '# duration:'
+
+
+def read_rates(lines, duration=None):
+    """
+    Reads the event rates of the functions from a counts file. Each line is the number of entry events of a
+    function then its name, as printed by 'uniq -c', function@library for the functions of a library.
+    A '# duration: SECONDS' line gives the length of the trace the events were counted over, the other lines
+    starting with '#' and the blank lines are skipped.
+    :param lines: Iterable of the lines
+    :param duration: The length of the trace in seconds, overrides the duration line, None to use it
+    :return: The event rates, name -> events per second. Without any duration, the counts are used as rates.
+    :raise ValueError: If a line is invalid or the duration is not positive
+    """
+    counts = {}
+    file_duration = None
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line.startswith(DURATION_HEADER):
+            try:
+                file_duration = float(line[len(DURATION_HEADER):])
+            except ValueError:
+                raise ValueError('Invalid duration on line %d' % number)
+            continue
+        if not line or line.startswith('#'):
+            continue
+        count, _, name = line.partition(' ')
+        name = name.strip()
+        try:
+            count = int(count)
+        except ValueError:
+            raise ValueError('Invalid count on line %d' % number)
+        if not name or count < 0:
+            raise ValueError('Invalid line %d' % number)
+        counts[name] = counts.get(name, 0) + count
+
+    if duration is None:
+        duration = file_duration if file_duration is not None else 1.0
+    if duration <= 0:
+        raise ValueError('The duration must be positive')
+    return {name: count / duration for name, count in counts.items()}
+
+
+def over_budget(function_list, rates, budget):
+    """
+    Chooses the active functions to deactivate so that the events of the active functions stay within a budget.
+    The hottest functions are deactivated first, the functions without a rate are counted as silent.
+    :param function_list: The function list (FunctionTable)
+    :param rates: The event rates, name -> events per second
+    :param budget: The maximum number of events per second of the active functions
+    :return: (the names of the functions to deactivate, hottest first,
+        the events per second of the active functions before, and after deactivating them)
+    """
+    table_active = function_list.active
+    active = [(rates[f], f) for i, f in enumerate(function_list.names) if table_active[i] and f in rates]
+    active.sort(key=lambda r: (-r[0], r[1]))
+    total = sum(rate for rate, _ in active)
+    remaining = total
+    hot = []
+    for rate, f in active:
+        if remaining <= budget:
+            break
+        hot.append(f)
+        remaining -= rate
+    return hot, total, max(remaining, 0.0)
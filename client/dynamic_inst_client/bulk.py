@@ -0,0 +1,115 @@
+import re
+import time
+from fnmatch import translate
+
+from dynamic_inst_client.util import split_name
+
+GLOB_CHARACTERS = '*?['
+
+
+def read_entries(lines):
+    """
+    Reads the entries of a function list file: one function name or fnmatch pattern per line, the blank lines and
+    the lines starting with '#' are skipped
+    :param lines: Iterable of the lines
+    :return: Generator of the entries
+    """
+    for line in lines:
+        entry = line.strip()
+        if entry and not entry.startswith('#'):
+            yield entry
+
+
+def is_pattern(entry):
+    """
+    :param entry: A function name or pattern
+    :return: True if the entry is an fnmatch pattern
+    """
+    return any(c in entry for c in GLOB_CHARACTERS)
+
+
+def entry_libraries(entries):
+    """
+    Gets the libraries the entries refer to, they must be loaded before resolving the entries
+    :param entries: The function names and patterns, function@library for the functions of a library
+    :return: The sorted list of library file names
+    """
+    libs = {split_name(e)[1] for e in entries}
+    libs.discard(None)
+    return sorted(lib for lib in libs if not is_pattern(lib))
+
+
+def resolve_entries(entries, function_list):
+    """
+    Resolves function names and patterns against a function list
+    :param entries: The function names and fnmatch patterns
+    :param function_list: The function list (FunctionTable)
+    :return: (the names of the matching functions, without duplicates and in entry order,
+        the names that are not in the list and the patterns that match nothing)
+    """
+    names = {}
+    unknown = []
+    for entry in entries:
+        if not is_pattern(entry):
+            if entry in function_list:
+                names[entry] = None
+            else:
+                unknown.append(entry)
+            continue
+        match = re.compile(translate(entry)).match
+        found = [f for f in function_list.names if match(f)]
+        if not found:
+            unknown.append(entry)
+        names.update(dict.fromkeys(found))
+    return list(names), unknown
+
+
+class BulkStats:
+    """
+    Statistics of a bulk status change
+    :ivar functions: The number of functions sent
+    :ivar batches: The number of batches sent
+    :ivar elapsed: The time spent sending the batches, in seconds
+    """
+
+    def __init__(self):
+        self.functions = 0
+        self.batches = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        """
+        Read-only property of the throughput
+        :return: The number of functions per second
+        """
+        if self.elapsed == 0:
+            return 0.0
+        return self.functions / self.elapsed
+
+
+def set_in_batches(comm, names, value, batch_size, on_batch=None, window=None):
+    """
+    Sets the status of many functions, with one request per batch so that the requests stay bounded in size.
+    The batches already sent are kept if a later one fails.
+    :param comm: The Communicator or Fleet
+    :param names: The names of the functions, they must be in the function list
+    :param value: The status to set the functions to
+    :param batch_size: The maximum number of functions per batch
+    :param on_batch: Called with the BulkStats after each batch
+    :param window: The length in seconds of the window after which the server sets the functions back, None for
+        no window. Each batch has its own window, starting when the server receives it.
+    :return: The BulkStats
+    :raise CommunicatorException: If a request fails
+    """
+    stats = BulkStats()
+    start = time.perf_counter()
+    for i in range(0, len(names), batch_size):
+        batch = names[i:i + batch_size]
+        comm.set_functions({f: value for f in batch}, window)
+        stats.functions += len(batch)
+        stats.batches += 1
+        stats.elapsed = time.perf_counter() - start
+        if on_batch is not None:
+            on_batch(stats)
+    return stats
@@ -1,10 +1,17 @@
 
 import argparse
+import os
 import sys
+from itertools import islice
 
+from dynamic_inst_client.budget import over_budget, read_rates
+from dynamic_inst_client.bulk import entry_libraries, read_entries, resolve_entries, set_in_batches
 from dynamic_inst_client.communicator import Communicator, CommunicatorException
-from dynamic_inst_client.ui import Ui
-from dynamic_inst_client.util import Filter
+from dynamic_inst_client.fleet import Fleet
+from dynamic_inst_client.profile import Profile, profile_path
+from dynamic_inst_client.stats import STATS
+from dynamic_inst_client.transport import find_sockets
+from dynamic_inst_client.util import Filter, format_rate, function_status
 
 
 def print_err(*args, **kwargs):
@@ -16,19 +23,197 @@ def print_err(*args, **kwargs):
     print(*args, **kwargs, file=sys.stderr)
 
 
-def run_ui(args):
+def port_list(text):
     """
-    Runs the ui command
+    Parses the port argument, a comma separated list of ports and port ranges (first-last)
+    :param text: The argument
+    :return: The list of ports
+    :raise argparse.ArgumentTypeError: If the argument is invalid
+    """
+    ports = []
+    try:
+        for part in text.split(','):
+            first, _, last = part.partition('-')
+            if last:
+                ports += range(int(first), int(last) + 1)
+            else:
+                ports.append(int(first))
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid port list: %r' % text)
+    if not ports:
+        raise argparse.ArgumentTypeError('empty port range: %r' % text)
+    return ports
+
+
+def library_list(text):
+    """
+    Parses the library argument, a comma separated list of library file names
+    :param text: The argument
+    :return: The list of file names
+    """
+    return [lib for lib in text.split(',') if lib]
+
+
+def natural(text):
+    """
+    Argument type of the non-negative integers
+    :param text: The argument
+    :return: The integer
+    :raise argparse.ArgumentTypeError: If the argument is not a non-negative integer
+    """
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid number: %r' % text)
+    if value < 0:
+        raise argparse.ArgumentTypeError('must not be negative: %r' % text)
+    return value
+
+
+def positive(text):
+    """
+    Argument type of the positive integers
+    :param text: The argument
+    :return: The integer
+    :raise argparse.ArgumentTypeError: If the argument is not a positive integer
+    """
+    value = natural(text)
+    if value == 0:
+        raise argparse.ArgumentTypeError('must be positive: %r' % text)
+    return value
+
+
+def positive_float(text):
+    """
+    Argument type of the positive numbers
+    :param text: The argument
+    :return: The number
+    :raise argparse.ArgumentTypeError: If the argument is not a positive number
+    """
+    try:
+        value = float(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid number: %r' % text)
+    if not value > 0:
+        raise argparse.ArgumentTypeError('must be positive: %r' % text)
+    return value
+
+
+def duration(text):
+    """
+    Argument type of the durations, a positive number of seconds or of milliseconds with the 'ms' suffix, or of
+    minutes with the 'm' suffix (e.g. 2, 2.5s, 500ms, 1m)
+    :param text: The argument
+    :return: The duration in seconds
+    :raise argparse.ArgumentTypeError: If the argument is not a positive duration
+    """
+    for suffix, scale in (('ms', 0.001), ('s', 1.0), ('m', 60.0)):
+        if text.endswith(suffix):
+            return positive_float(text[:-len(suffix)]) * scale
+    return positive_float(text)
+
+
+def describe(address):
+    """
+    :param address: The port or the Unix socket path of a process
+    :return: The description of the address, e.g. 'port 8000'
+    """
+    if isinstance(address, str):
+        return 'socket %s' % address
+    return 'port %d' % address
+
+
+def process_addresses(args):
+    """
+    Gets the addresses of the processes to connect to: the Unix sockets given with --socket, a directory standing for
+    every socket in it, else the ports. Exits if a directory has no socket.
     :param args: The command line arguments
+    :return: The list of the ports or of the socket paths
     """
-    comm = Communicator()
+    if not args.socket:
+        return args.port
+    if not os.path.isdir(args.socket):
+        return [args.socket]
     try:
-        comm.connect(args.port)
-    except CommunicatorException:
-        print_err('Could not connect, is the server started on port %d ?' % args.port)
+        sockets = find_sockets(args.socket)
+    except OSError as e:
+        print_err('Could not read %s: %s' % (args.socket, e.strerror))
+        exit(1)
+    if not sockets:
+        print_err('No server socket in %s' % args.socket)
         exit(1)
+    return sockets
+
+
+def report_failures(comm):
+    """
+    Prints the processes of a fleet that failed
+    :param comm: The Communicator or Fleet
+    """
+    if isinstance(comm, Fleet):
+        for address in sorted(comm.failures):
+            print_err('Request failed for the process on %s' % describe(address))
+        comm.clear_failures()
+
+
+def connect(args, fetch=True, libs=(), light=True):
+    """
+    Connects to the server process, or to every process when many ports or sockets are given. Exits on failure.
+    :param args: The command line arguments
+    :param fetch: False to not fetch the function list of a single process, see Communicator.connect
+    :param libs: The file names of the shared libraries to load
+    :param light: False to send the requests with requests (the ui), True for a command that doesn't take the time
+        to import it, see Communicator
+    :return: The connected Communicator or Fleet
+    """
+    addresses = process_addresses(args)
+    if len(addresses) == 1:
+        comm = Communicator(light)
+        try:
+            comm.connect(addresses[0], fetch)
+        except CommunicatorException:
+            print_err('Could not connect, is the server started on %s ?' % describe(addresses[0]))
+            exit(1)
+    else:
+        comm = Fleet(light)
+        try:
+            comm.connect(addresses)
+        except CommunicatorException:
+            print_err('Could not connect, are the servers started on %s ?' % ', '.join(describe(a) for a in addresses))
+            exit(1)
+
+    load_libraries(comm, libs)
+    return comm
+
+
+def load_libraries(comm, libs):
+    """
+    Loads the functions of shared libraries. Exits on failure.
+    :param comm: The Communicator or Fleet
+    :param libs: The file names of the libraries
+    """
+    for lib in libs:
+        try:
+            comm.load_library(lib)
+        except CommunicatorException:
+            print_err('Could not load the library %s' % lib)
+            exit(1)
+    report_failures(comm)
+
+
+def run_ui(args):
+    """
+    Runs the ui command
+    :param args: The command line arguments
+    """
+    # Imported here, urwid takes longer to import than the other commands take to run
+    from dynamic_inst_client.ui import Ui
+
+    rates = read_counts(args) if args.counts else None
+    comm = connect(args, libs=args.lib, light=False)
+    demangler = make_demangler() if args.demangle else None
     try:
-        ui = Ui(comm)
+        ui = Ui(comm, args.live, rates, args.window, demangler)
         ui.run()
     except CommunicatorException:
         print_err('Connection lost')
@@ -37,74 +222,450 @@ def run_ui(args):
         pass
 
 
+def make_demangler():
+    """
+    Makes the demangler of the --demangle option, warns if the names can't be demangled
+    :return: The Demangler
+    """
+    # Imported here with ctypes, only for --demangle
+    from dynamic_inst_client.demangle import Demangler
+
+    demangler = Demangler()
+    if not demangler.available:
+        print_err('Neither c++filt nor libstdc++ was found, the names are not demangled')
+    return demangler
+
+
 def run_list(args):
     """
-    Runs the list command
+    Runs the list command. With a single process, the list is printed while it is received and the server
+    only sends the functions that can match the filter.
     :param args: The command line arguments
     """
-    comm = Communicator()
     try:
-        comm.connect(args.port)
         fil = Filter(args.filter)
-        for f in sorted([f for f in comm.function_list]):
-            if fil(f, comm.function_list[f]):
-                if comm.function_list[f]:
-                    s = '(active)'
-                else:
-                    s = '(nopped)'
-                print(f, s)
-    except CommunicatorException:
-        print_err('Could not connect, is the server started on port %d ?' % args.port)
-        exit(1)
     except ValueError:
         print('Invalid filter')
         exit(1)
+    if args.demangle:
+        list_demangled(args, fil)
+        return
+    comm = connect(args, fetch=False)
+    if isinstance(comm, Fleet):
+        if fil.library:
+            load_libraries(comm, [fil.library])
+        matching = (f for f in comm.function_list if fil(f, comm.function_list[f]))
+        for f in islice(matching, args.offset, page_end(args)):
+            print(f, function_status(comm.function_list[f], comm.active_count(f), len(comm)))
+        report_failures(comm)
+        if comm.dropped:
+            exit(1)
+        return
+    query, exact = fil.server_query()
+    if exact:
+        # The server pages the matching functions itself
+        query['offset'] = args.offset
+        if args.limit is not None:
+            query['limit'] = args.limit
+    try:
+        matching = ((f, active) for f, active in comm.iter_functions(**query) if fil(f, active))
+        if not exact:
+            matching = islice(matching, args.offset, page_end(args))
+        for f, active in matching:
+            print(f, function_status(active))
+    except CommunicatorException:
+        print_err('Could not connect, is the server started on %s ?' % describe(process_addresses(args)[0]))
+        exit(1)
+
+
+def list_demangled(args, fil):
+    """
+    Lists the functions by their demangled names, the filter applies to them. The server only knows the mangled
+    names, so the whole function list is fetched then demangled, once per binary thanks to the Demangler's cache.
+    :param args: The command line arguments
+    :param fil: The filter
+    """
+    comm = connect(args, libs=[fil.library] if fil.library else ())
+    table = comm.function_list
+    labels = make_demangler().demangle(table.names)
+    for i in islice(fil.select(labels, table.active, table.selected), args.offset, page_end(args)):
+        if isinstance(comm, Fleet):
+            status = function_status(table.active[i] == 1, comm.active_count(table.names[i]), len(comm))
+        else:
+            status = function_status(table.active[i] == 1)
+        print(labels[i], status)
+    if isinstance(comm, Fleet):
+        report_failures(comm)
+        if comm.dropped:
+            exit(1)
+
+
+def page_end(args):
+    """
+    :param args: The command line arguments
+    :return: The end of the page of functions to list, None for no limit
+    """
+    if args.limit is None:
+        return None
+    return args.offset + args.limit
+
+
+def run_libraries(args):
+    """
+    Runs the libraries command
+    :param args: The command line arguments
+    """
+    comm = connect(args, fetch=False)
+    try:
+        libs = comm.libraries()
+    except CommunicatorException:
+        print_err('Could not list the libraries')
+        exit(1)
+    for lib in libs:
+        if lib['loaded']:
+            print(lib['name'], lib['path'], '(loaded)')
+        else:
+            print(lib['name'], lib['path'])
+    report_failures(comm)
+
+
+def read_function_file(path):
+    """
+    Reads the function names and patterns of a file. Exits on failure.
+    :param path: The path of the file, '-' for stdin
+    :return: The list of entries, see bulk.read_entries
+    """
+    try:
+        if path == '-':
+            return list(read_entries(sys.stdin))
+        with open(path) as f:
+            return list(read_entries(f))
+    except OSError as e:
+        print_err('Could not read %s: %s' % (path, e.strerror))
+        exit(1)
 
 
 def run_set(args, value):
     """
-    Runs the activate/deactivate command
+    Runs the activate/deactivate command. The functions are given on the command line or in a file, by name or
+    by pattern. The functions not in the process are reported and the others are set anyway, in batches.
     :param args: The command line arguments
     :param value: The value to set the functions to
     """
-    comm = Communicator()
+    entries = list(args.functions)
+    if args.file is not None:
+        entries += read_function_file(args.file)
+
+    comm = connect(args)
+    for lib in entry_libraries(entries):
+        try:
+            comm.load_library(lib)
+        except CommunicatorException:
+            print_err('Could not load the library %s' % lib)
+    names, unknown = resolve_entries(entries, comm.function_list)
+    for entry in unknown:
+        print_err('Function not in list: %s' % entry)
+
+    try:
+        stats = set_in_batches(comm, names, value, args.batch_size, window=args.window)
+    except CommunicatorException:
+        print_err('Request failed, the functions of the previous batches were set')
+        exit(1)
+    if args.file is not None:
+        print_err('%s %d functions in %d batches in %.3f s (%.0f functions/s)' % (
+            'Activated' if value else 'Deactivated', stats.functions, stats.batches, stats.elapsed, stats.rate))
+    failed = isinstance(comm, Fleet) and comm.failures
+    report_failures(comm)
+    if unknown or failed:
+        exit(1)
+
+
+def load_loaded_libraries(comm, libs=()):
+    """
+    Loads the functions of the shared libraries that the server already loaded, and of other libraries.
+    The libraries that can't be loaded are reported.
+    :param comm: The Communicator or Fleet
+    :param libs: The file names of the other libraries
+    :raise CommunicatorException: If the libraries can't be listed
+    """
+    libs = set(libs)
+    libs.update(lib['name'] for lib in comm.libraries() if lib['loaded'])
+    for lib in sorted(libs):
+        try:
+            comm.load_library(lib)
+        except CommunicatorException:
+            print_err('Could not load the library %s' % lib)
+
+
+def read_profile(args):
+    """
+    Reads the profile given on the command line. Exits on failure.
+    :param args: The command line arguments
+    :return: (the Profile, its path)
+    """
+    path = profile_path(args.profile)
+    try:
+        return Profile.load(path), path
+    except OSError as e:
+        print_err('Could not read the profile %s: %s' % (path, e.strerror))
+    except ValueError:
+        print_err('Not a profile: %s' % path)
+    exit(1)
+
+
+def run_save(args):
+    """
+    Runs the save command, the active functions of the process (of the main program and of the loaded libraries)
+    are saved to the profile
+    :param args: The command line arguments
+    """
+    comm = connect(args)
     try:
-        comm.connect(args.port)
+        load_loaded_libraries(comm)
     except CommunicatorException:
-        print_err('Could not connect, is the server started on port %d ?' % args.port)
+        print_err('Could not list the libraries')
+        exit(1)
+    profile = Profile.from_function_list(comm.function_list)
+    path = profile_path(args.profile)
+    try:
+        profile.save(path)
+    except OSError as e:
+        print_err('Could not write the profile %s: %s' % (path, e.strerror))
         exit(1)
+    print('Saved %d active functions to %s' % (len(profile.active), path))
+    report_failures(comm)
+
+
+def profile_diff(args):
+    """
+    Compares the profile given on the command line with the process, with each process of a fleet on its own.
+    Exits on failure.
+    :param args: The command line arguments
+    :return: (the connected Communicator or Fleet, the list of (address, ProfileDiff) sorted by address, the address
+        is None for a single process)
+    """
+    profile, _ = read_profile(args)
+    comm = connect(args)
     try:
-        f = {f: value for f in args.functions}
-        comm.function_list = f
+        load_loaded_libraries(comm, profile.libraries)
     except CommunicatorException:
-        print_err('Function not in list')
+        print_err('Could not list the libraries')
         exit(1)
+    if isinstance(comm, Fleet):
+        tables = comm.process_function_lists
+        return comm, [(address, profile.diff(tables[address])) for address in sorted(tables)]
+    return comm, [(None, profile.diff(comm.function_list))]
 
 
-def main():
+def run_diff(args):
     """
-    Entry point function
+    Runs the diff command, prints the functions to activate (+) and to deactivate (-) for the process to match
+    the profile, and the functions of the profile not in the process (?). With many processes, the differences of
+    each process are printed after its address. Exits with 1 if any process differs.
+    :param args: The command line arguments
     """
-    parser = argparse.ArgumentParser()
+    comm, diffs = profile_diff(args)
+    for address, diff in diffs:
+        if address is not None and diff:
+            print('%s:' % describe(address))
+        for f in diff.activate:
+            print('+', f)
+        for f in diff.deactivate:
+            print('-', f)
+        for f in diff.missing:
+            print('?', f)
+    report_failures(comm)
+    if any(diff for _, diff in diffs):
+        exit(1)
 
-    parser.add_argument('command',
-                        choices=['ui', 'list', 'activate', 'deactivate'],
-                        help='Command to run, default is \'ui\'', nargs='?', default='ui')
-    parser.add_argument('-p', '--port', type=int, help='Port to use, default is \'8000\'', default=8000)
-    parser.add_argument('-f', '--filter',
-                        help='list command only, Applies a filter to the list of function before printing', default='')
-    parser.add_argument('functions',
-                        help='activate and deactivate only, list of function to activate/deactivate', nargs='*')
 
-    args = parser.parse_args()
+def run_apply(args):
+    """
+    Runs the apply command, only the functions whose status differs from the profile are sent, each process of a
+    fleet receives its own differences
+    :param args: The command line arguments
+    """
+    comm, diffs = profile_diff(args)
+    for address, diff in diffs:
+        for f in diff.missing:
+            if address is None:
+                print_err('Function not in list: %s' % f)
+            else:
+                print_err('Function not in list of the process on %s: %s' % (describe(address), f))
+    changes = {address: diff.changes() for address, diff in diffs}
+    try:
+        if isinstance(comm, Fleet):
+            comm.set_process_functions(changes)
+        elif changes[None]:
+            comm.function_list = changes[None]
+    except CommunicatorException:
+        print_err('Request failed')
+        exit(1)
+    print('Activated %d and deactivated %d functions' % (sum(len(diff.activate) for _, diff in diffs),
+                                                         sum(len(diff.deactivate) for _, diff in diffs)))
+    failed = isinstance(comm, Fleet) and comm.failures
+    report_failures(comm)
+    if any(diff.missing for _, diff in diffs) or failed:
+        exit(1)
+
+
+def read_counts(args):
+    """
+    Reads the event rates of the counts file given on the command line. Exits on failure.
+    :param args: The command line arguments
+    :return: The event rates, name -> events per second, see budget.read_rates
+    """
+    try:
+        if args.counts == '-':
+            return read_rates(sys.stdin, args.duration)
+        with open(args.counts) as f:
+            return read_rates(f, args.duration)
+    except OSError as e:
+        print_err('Could not read %s: %s' % (args.counts, e.strerror))
+    except ValueError as e:
+        print_err('Invalid counts file %s: %s' % (args.counts, e))
+    exit(1)
+
 
+def run_budget(args):
+    """
+    Runs the budget command, the hottest active functions are deactivated until the events of the active
+    functions fit in the budget
+    :param args: The command line arguments
+    """
+    rates = read_counts(args)
+    comm = connect(args)
+    for lib in entry_libraries(rates):
+        try:
+            comm.load_library(lib)
+        except CommunicatorException:
+            print_err('Could not load the library %s' % lib)
+    hot, before, after = over_budget(comm.function_list, rates, args.budget)
+    try:
+        if hot:
+            comm.function_list = {f: False for f in hot}
+    except CommunicatorException:
+        print_err('Request failed')
+        exit(1)
+    for f in hot:
+        print(f, format_rate(rates[f]))
+    print_err('Deactivated %d functions, the active functions went from %s to %s (budget %s)' % (
+        len(hot), format_rate(before), format_rate(after), format_rate(args.budget)))
+    failed = isinstance(comm, Fleet) and comm.failures
+    report_failures(comm)
+    if failed:
+        exit(1)
+
+
+def run_command(args):
+    """
+    Runs the command given on the command line
+    :param args: The command line arguments
+    """
     if args.command == 'ui':
         run_ui(args)
     elif args.command == 'list':
         run_list(args)
+    elif args.command == 'libraries':
+        run_libraries(args)
     elif args.command == 'activate':
         run_set(args, True)
     elif args.command == 'deactivate':
         run_set(args, False)
+    elif args.command == 'save':
+        run_save(args)
+    elif args.command == 'diff':
+        run_diff(args)
+    elif args.command == 'apply':
+        run_apply(args)
+    elif args.command == 'budget':
+        run_budget(args)
     else:
         assert False, 'Not supposed to come here'
+
+
+def report_stats(args):
+    """
+    Prints the timings of the client and writes them as JSON, as asked on the command line
+    :param args: The command line arguments
+    """
+    if args.stats:
+        print_err('\n'.join(STATS.report()))
+    if args.stats_json is not None:
+        try:
+            STATS.dump(args.stats_json)
+        except OSError as e:
+            print_err('Could not write %s: %s' % (args.stats_json, e.strerror))
+
+
+def main():
+    """
+    Entry point function
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('command',
+                        choices=['ui', 'list', 'libraries', 'activate', 'deactivate', 'save', 'diff', 'apply',
+                                 'budget'],
+                        help='Command to run, default is \'ui\'', nargs='?', default='ui')
+    parser.add_argument('-p', '--port', type=port_list, default=[8000],
+                        help='Port to use, default is \'8000\'. '
+                             'A comma separated list of ports and ranges (e.g. 8000,8010-8020) controls many processes')
+    parser.add_argument('-s', '--socket',
+                        help='Unix socket of the server to use instead of a port, or directory whose sockets are all '
+                             'used (DYN_SERVER_SOCKET_DIR of the processes)')
+    parser.add_argument('-f', '--filter',
+                        help='list command only, Applies a filter to the list of function before printing', default='')
+    parser.add_argument('--offset', type=natural, default=0,
+                        help='list command only, Number of matching functions to skip')
+    parser.add_argument('--limit', type=natural,
+                        help='list command only, Maximum number of functions to print')
+    parser.add_argument('-d', '--demangle', action='store_true',
+                        help='ui and list only, Shows the demangled names and applies the filter to them, they are '
+                             'cached in $DYN_INST_CACHE or ~/.cache/dynamic_inst')
+    parser.add_argument('--lib', type=library_list, default=[],
+                        help='ui command only, Comma separated list of shared libraries whose functions are listed too')
+    parser.add_argument('-l', '--live', action='store_true',
+                        help='ui command only, Polls the server for changes made by other clients')
+    parser.add_argument('--file',
+                        help='activate and deactivate only, File of functions to activate/deactivate, one name or '
+                             'pattern per line, \'-\' for stdin')
+    parser.add_argument('--batch-size', type=positive, default=1000,
+                        help='activate and deactivate only, Maximum number of functions per request, '
+                             'default is \'1000\'')
+    parser.add_argument('--for', dest='window', type=duration, metavar='DURATION',
+                        help='activate, deactivate and ui only, Sets the functions for a while, the server sets them '
+                             'back when it ends (e.g. 2s, 500ms). The window of the \'t\' key of the ui, default is '
+                             '\'5s\'')
+    parser.add_argument('--profile',
+                        help='save, diff and apply only, Name or path of the profile, the names are kept in '
+                             '$DYN_INST_PROFILES or ~/.config/dynamic_inst/profiles')
+    parser.add_argument('--counts',
+                        help='ui and budget only, File of the number of entry events of each function, '
+                             '\'COUNT NAME\' lines as printed by uniq -c, \'-\' for stdin')
+    parser.add_argument('--duration', type=positive_float,
+                        help='ui and budget only, Length in seconds of the trace the events were counted over, '
+                             'overrides the \'# duration: SECONDS\' line of the counts file')
+    parser.add_argument('--budget', type=positive_float,
+                        help='budget command only, Maximum number of events per second of the active functions')
+    parser.add_argument('--stats', action='store_true',
+                        help='Prints a summary of the timings of the requests and of the ui on exit')
+    parser.add_argument('--stats-json',
+                        help='Writes the summary and the samples of the timings to a JSON file on exit')
+    parser.add_argument('functions',
+                        help='activate and deactivate only, list of function to activate/deactivate, '
+                             'function@library for the functions of a shared library, '
+                             'fnmatch patterns (e.g. \'_ZN5myapp*\') for every matching function', nargs='*')
+
+    args = parser.parse_args()
+    if args.command in ('save', 'diff', 'apply') and not args.profile:
+        parser.error('the %s command needs a --profile' % args.command)
+    if args.command == 'budget' and (not args.counts or args.budget is None):
+        parser.error('the budget command needs --counts and --budget')
+
+    STATS.enabled = args.stats or args.stats_json is not None
+    try:
+        run_command(args)
+    finally:
+        report_stats(args)
+
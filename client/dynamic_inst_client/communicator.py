@@ -1,6 +1,12 @@
 
-import requests
 import json
+import time
+
+from dynamic_inst_client.jsonstream import FunctionListStream
+from dynamic_inst_client.stats import STATS
+from dynamic_inst_client.table import FunctionTable
+from dynamic_inst_client.transport import UNIX_SCHEME, HttpSession, unix_url
+from dynamic_inst_client.util import qualify_name, split_name
 
 
 class CommunicatorException(Exception):
@@ -12,31 +18,92 @@ class CommunicatorException(Exception):
 
 class Communicator:
     """
-    Objects that communicates with the server process
+    Objects that communicates with the server process.
+    The function list holds the functions of the main program and of the shared libraries loaded with load_library,
+    the functions of a library are named function@library (see qualify_name).
+    :ivar __light: True to send the requests with a HttpSession, False with a requests.Session
     :ivar __session: The HTTP session, None if not connected
     :ivar __url: The HTTP url, None if not connected
-    :ivar __cache: The function list cache, used so that there is not a request each time we read the function list
+    :ivar __libraries_url: The HTTP url of the library list, None if not connected
+    :ivar __cache: The function list cache (FunctionTable), used so that there is not a request each time we read the
+        function list
+    :ivar __dirty: The functions modified since the last PUT, only these are sent to the server
+    :ivar __generations: The server's instrumentation generations the cache is up to date with, library -> generation,
+        None for the main program. There is one generation per library.
+    :ivar __libs: The file names of the loaded libraries
     :cvar function_list: Function list property that modifies __cache
+    :cvar LOADING_RETRY_INTERVAL: Seconds between the requests while the server is loading the symbols
+    :cvar LOADING_TIMEOUT: Seconds after which a server still loading the symbols is considered unreachable
     """
     URL_TEMPLATE = 'http://127.0.0.1:%d/instrumentation'
+    LIBRARIES_URL_TEMPLATE = 'http://127.0.0.1:%d/libraries'
+    ENDPOINT = '/instrumentation'
+    LIBRARIES_ENDPOINT = '/libraries'
+    ACK_PARAMS = {'reply': 'ack'}
+    NOT_MODIFIED = 304
+    SERVICE_UNAVAILABLE = 503
+    CHUNK_SIZE = 64 * 1024
+    LOADING_RETRY_INTERVAL = 0.1
+    LOADING_TIMEOUT = 60.0
 
-    def __init__(self):
+    def __init__(self, light=False):
+        """
+        :param light: True to send the requests with the stdlib HttpSession instead of requests, which is only
+            imported when used: for a short lived client, e.g. a command line command
+        """
+        self.__light = light
         self.__session = None
         self.__url = None
-        self.__cache = {}
+        self.__libraries_url = None
+        self.__cache = FunctionTable()
+        self.__dirty = {}
+        self.__generations = {}
+        self.__libs = []
+
+    def connect(self, address, fetch=True):
+        """
+        Connects to the server process, on a TCP port or on a Unix socket (DYN_SERVER_SOCKET_DIR)
+        :param address: The port, or the path of the socket
+        :param fetch: True to fetch the function list, False when only iter_functions is used
+        :raise ValueError: When the port is invalid
+        """
+        with STATS.timer('connect'):
+            self.__connect(address, fetch)
 
-    def connect(self, port):
+    def __connect(self, address, fetch):
         """
-        Connects to the server process
-        :param port: The port
+        Connects to the server process, see connect
+        :param address: The port, or the path of the socket
+        :param fetch: True to fetch the function list
         :raise ValueError: When the port is invalid
         """
         self.disconnect()
-        if not isinstance(port, int) or port < 0 or port > 65535:
-            raise ValueError('Port must be an int between 0 and 65535')
-        self.__session = requests.Session()
-        self.__url = Communicator.URL_TEMPLATE % port
-        self.__request_get_function_list()
+        if isinstance(address, str):
+            self.__session = self.__new_session()
+            self.__url = unix_url(address, Communicator.ENDPOINT)
+            self.__libraries_url = unix_url(address, Communicator.LIBRARIES_ENDPOINT)
+        else:
+            if not isinstance(address, int) or address < 0 or address > 65535:
+                raise ValueError('Port must be an int between 0 and 65535')
+            self.__session = self.__new_session()
+            self.__url = Communicator.URL_TEMPLATE % address
+            self.__libraries_url = Communicator.LIBRARIES_URL_TEMPLATE % address
+        if fetch:
+            self.__request_get_function_list()
+
+    def __new_session(self):
+        """
+        Makes the HTTP session, see light
+        :return: The HttpSession, or the requests.Session that can also send the requests over the Unix sockets
+        """
+        if self.__light:
+            return HttpSession()
+        # Imported here, the command line commands don't pay for it
+        import requests
+        from dynamic_inst_client.adapter import UnixSocketAdapter
+        session = requests.Session()
+        session.mount(UNIX_SCHEME, UnixSocketAdapter())
+        return session
 
     def disconnect(self):
         """
@@ -45,13 +112,73 @@ class Communicator:
         if self.__session is not None:
             self.__session.close()
             self.__url = None
-            self.__cache = {}
+            self.__libraries_url = None
+            self.__cache = FunctionTable()
+            self.__dirty = {}
+            self.__generations = {}
+            self.__libs = []
 
     def refresh(self):
         """
-        Manually refreshes the function list from the server
+        Manually refreshes the function list from the server, only the changes since the last refresh are downloaded
+        :return: The set of functions whose status changed
+        """
+        changed = self.__request_get_function_list()
+        for lib in self.__libs:
+            changed.update(self.__request_get_function_list(lib))
+        return changed
+
+    def libraries(self):
+        """
+        Gets the shared libraries mapped in the server process
+        :return: The list of libraries, dictionaries with the name (file name), path and loaded (True if the server
+            loaded its symbols) keys
+        :raise CommunicatorException: If the request fails
+        """
+        self.__check_connected()
+        try:
+            r = self.__send('GET', url=self.__libraries_url)
+            r.raise_for_status()
+            return r.json()['libraries']
+        except Exception as e:
+            raise CommunicatorException(e.args) from e
+
+    @property
+    def loaded_libraries(self):
+        """
+        Read-only property of the loaded libraries
+        :return: The file names of the libraries whose functions are in the function list
         """
-        self.__request_get_function_list()
+        return list(self.__libs)
+
+    def load_library(self, lib):
+        """
+        Adds the functions of a shared library to the function list, the server only loads the symbols of a library
+        when it is first asked for it
+        :param lib: The file name of the library
+        :return: The set of functions added
+        :raise CommunicatorException: If the library is not in the process or the request fails
+        """
+        self.__check_connected()
+        if lib in self.__libs:
+            return set()
+        changed = self.__request_get_function_list(lib)
+        self.__libs.append(lib)
+        return changed
+
+    def iter_functions(self, **query):
+        """
+        Streams the function list from the server without caching it.
+        The functions are yielded as the server sends them, in name order.
+        :param query: The query parameters, status ('active' or 'nopped'), match (fnmatch pattern),
+        offset and limit (the page of the matching functions to send), lib (file name of a shared library)
+        :return: Generator of (qualified name, active)
+        :raise CommunicatorException: If the request fails
+        """
+        self.__check_connected()
+        lib = query.get('lib')
+        for f in self.__stream_get(query or None):
+            yield qualify_name(f['name'], lib), f['active']
 
     def __get_function_status(self):
         """
@@ -67,15 +194,35 @@ class Communicator:
         :param funcs: The dictionary of functions to modify
         :raise CommunicatorException: If one of the function in the list is not in the server process
         """
+        self.set_functions(funcs)
+
+    function_list = property(__get_function_status, __set_function_status)
+
+    def set_functions(self, funcs, window=None):
+        """
+        Sets the status of functions, for a while if a window is given. The server sets the functions back to their
+        status before the window when it ends, even if the client is gone by then. The function list is not updated
+        when the window ends, it must be refreshed.
+        :param funcs: The dictionary of functions to modify
+        :param window: The length of the window in seconds, None to set the functions for good
+        :raise CommunicatorException: If one of the function in the list is not in the server process
+        """
         self.__check_connected()
         for f in funcs:
-            if f in self.__cache:
-                self.__cache[f] = funcs[f]
-            else:
+            if f not in self.__cache:
                 raise CommunicatorException('Function not in the process')
-        self.__request_put_function_list()
+        for f in funcs:
+            self.__cache.set_active(f, funcs[f])
+            self.__dirty[f] = funcs[f]
+        self.__request_put_function_list(window)
 
-    function_list = property(__get_function_status, __set_function_status)
+    def snapshot(self):
+        """
+        Copies what the ui shows, so that it can read it while the function list is updated by another thread
+        :return: (a copy of the function list, None: there are no per-process counts)
+        """
+        self.__check_connected()
+        return self.__cache.copy(), None
 
     def status(self):
         """
@@ -84,45 +231,184 @@ class Communicator:
         """
         return self.__session is not None
 
-    def __request_get_function_list(self):
+    def __request_get_function_list(self, lib=None):
         """
-        Does a HTTP GET to update the file list
+        Does a HTTP GET to update the file list.
+        If the generation of the cache is known, only the functions that changed since are requested.
+        :param lib: The file name of the library to update, None for the main program
+        :return: The set of functions whose status changed
         """
+        params = {}
+        if self.__generations.get(lib) is not None:
+            params['since'] = self.__generations[lib]
+        if lib is not None:
+            params['lib'] = lib
+        stream = FunctionListStream()
+        timing = {}
+        functions = ((qualify_name(f['name'], lib), f['active']) for f in self.__stream_get(params, stream, timing))
+        start = time.perf_counter()
+        changed = self.__write_to_cache(functions)
+        # The body is received and decoded while the cache is updated
+        STATS.record('cache.update', time.perf_counter() - start - timing.get('stream', 0.0))
+        if 'generation' in stream.members:
+            self.__generations[lib] = stream.members['generation']
+        return changed
+
+    def __stream_get(self, params, stream=None, timing=None):
+        """
+        Does a HTTP GET of the function list and parses the body as it arrives
+        :param params: The query parameters
+        :param stream: The parser to use, to get the other members of the response after the functions
+        :param timing: Dictionary the time spent receiving and decoding the body is put in, under 'stream'
+        :return: Generator of the function entries, nothing if the server answers that nothing changed
+        :raise CommunicatorException: If the request fails or the response is invalid
+        """
+        if stream is None:
+            stream = FunctionListStream()
+        receive = decode = 0.0
+        size = 0
         try:
-            r = self.__session.get(self.__url)
-            r.raise_for_status()
+            with self.__send('GET', params=params, stream=True) as r:
+                r.raise_for_status()
+                if r.status_code == Communicator.NOT_MODIFIED:
+                    return
+                chunks = r.iter_content(Communicator.CHUNK_SIZE)
+                while True:
+                    start = time.perf_counter()
+                    chunk = next(chunks, None)
+                    received = time.perf_counter()
+                    receive += received - start
+                    if chunk is None:
+                        break
+                    size += len(chunk)
+                    entries = stream.feed(chunk)
+                    decode += time.perf_counter() - received
+                    yield from entries
+                stream.close()
         except Exception as e:
             raise CommunicatorException(e.args) from e
-        self.__write_to_cache(r.json())
+        finally:
+            STATS.record('get.receive', receive)
+            STATS.record('get.decode', decode)
+            STATS.record('get.bytes', size, 'B')
+            if timing is not None:
+                timing['stream'] = receive + decode
 
-    def __request_put_function_list(self):
+    def __request_put_function_list(self, window=None):
         """
-        Does a HTTP PUT to set the function status in the server process, updates the function list at the same time
+        Does a HTTP PUT to set the status of the modified functions in the server process, one per library.
+        Only the change set is sent and the server only acknowledges it, the rest of the cache is left untouched.
+        A change is forgotten once the server acknowledged it, and the acknowledged generation is kept when it is the
+        only change since the cache's, so the next refresh doesn't fetch the change back. If a PUT fails, the cache
+        may hold statuses the server never applied: the whole function list is fetched again.
+        :param window: The length in seconds of the window after which the server sets the functions back, None for
+            no window
         """
         self.__check_connected()
+        by_lib = {}
+        for f, active in self.__dirty.items():
+            name, lib = split_name(f)
+            if lib not in self.__libs:
+                name, lib = f, None
+            by_lib.setdefault(lib, {})[name] = active
         try:
-            r = self.__session.put(self.__url, data=self.__read_from_cache())
-            r.raise_for_status()
+            for lib, funcs in by_lib.items():
+                params = dict(Communicator.ACK_PARAMS)
+                if window is not None:
+                    params['for'] = max(1, round(window * 1000))
+                if lib is not None:
+                    params['lib'] = lib
+                with STATS.timer('put.encode'):
+                    data = self.__read_from_cache(funcs)
+                STATS.record('put.bytes', len(data), 'B')
+                r = self.__send('PUT', params=params, data=data)
+                r.raise_for_status()
+                for name in funcs:
+                    self.__dirty.pop(qualify_name(name, lib), None)
+                # The change set is one generation, one past the cache's means no one else changed anything
+                generation = r.json()['generation']
+                if self.__generations.get(lib) is not None and generation == self.__generations[lib] + 1:
+                    self.__generations[lib] = generation
         except Exception as e:
+            self.__resync()
             raise CommunicatorException(e.args) from e
-        self.__write_to_cache(r.json())
 
-    def __write_to_cache(self, response):
+    def __resync(self):
         """
-        Writes the HTTP response body to the function list
-        :param response: HTTP response body
+        Forgets the changes not sent and fetches the whole function list again, so that the cache matches the server
+        after a failed PUT. If the server can't be reached, the next refresh fetches the whole list.
         """
-        for f in response['functions']:
-            self.__cache[f['name']] = f['active']
+        self.__dirty = {}
+        self.__generations = {}
+        try:
+            self.refresh()
+        except CommunicatorException:
+            pass
 
-    def __read_from_cache(self):
+    def __send(self, method, url=None, **kwargs):
+        """
+        Sends a HTTP request, sent again while the server answers that it is still loading the symbols of the
+        process (the server starts answering before its process is done loading them)
+        :param method: The HTTP method
+        :param url: The url, None for the function list
+        :param kwargs: The arguments of the session's request, see HttpSession.request
+        :return: The response
+        :raise CommunicatorException: If the server is still loading after LOADING_TIMEOUT
         """
-        Creates a HTTP request body from the function list
-        :return:
+        deadline = time.monotonic() + Communicator.LOADING_TIMEOUT
+        while True:
+            # Until the headers are received, the body is streamed after
+            with STATS.timer('%s.request' % method.lower()):
+                r = self.__session.request(method, url or self.__url, **kwargs)
+            if r.status_code != Communicator.SERVICE_UNAVAILABLE:
+                return r
+            r.close()
+            if time.monotonic() >= deadline:
+                raise CommunicatorException('The server is still loading the symbols')
+            time.sleep(Communicator.LOADING_RETRY_INTERVAL)
+
+    def __write_to_cache(self, functions):
+        """
+        Writes the function entries of a HTTP response body to the function list.
+        An empty cache is loaded in one go, otherwise the entries are updated one by one.
+        :param functions: Iterable of (qualified name, active)
+        :return: The set of functions whose status changed
+        """
+        cache = self.__cache
+        if len(cache) == 0:
+            cache.load(functions)
+            return set(cache.names)
+
+        changed = set()
+        added = []
+        active = cache.active
+        for name, a in functions:
+            i = cache.find(name)
+            if i < 0:
+                added.append((name, a))
+                continue
+            value = 1 if a else 0
+            if active[i] != value:
+                active[i] = value
+                changed.add(name)
+        if added:
+            # Only when the server process changed, the positions of the functions change, the selection is kept
+            selected = cache.selected_names()
+            cache.load(list(zip(cache.names, cache.active)) + added)
+            for f in selected:
+                cache.selected[cache.index(f)] = 1
+            changed.update(name for name, _ in added)
+        return changed
+
+    def __read_from_cache(self, funcs):
+        """
+        Creates a HTTP request body from the modified functions of the function list
+        :param funcs: The modified functions of a binary, name in the binary -> active
+        :return: The HTTP request body
         """
         data = []
-        for f in self.__cache:
-            data += [{'name': f, 'active': self.__cache[f]}]
+        for f in funcs:
+            data += [{'name': f, 'active': funcs[f]}]
         data = {'functions': data}
         return json.dumps(data)
 
@@ -0,0 +1,185 @@
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import shutil
+import subprocess
+from functools import partial
+
+from dynamic_inst_client.stats import STATS
+from dynamic_inst_client.util import qualify_name, split_name
+
+CACHE_DIR_ENV = 'DYN_INST_CACHE'
+DEFAULT_CACHE_DIR = '~/.cache/dynamic_inst'
+CACHE_SUBDIR = 'demangled'
+
+
+def demangle_cxxfilt(names, cxxfilt):
+    """
+    Demangles names with a single c++filt process
+    :param names: The list of mangled names, without library
+    :param cxxfilt: The path of c++filt
+    :return: The list of the demangled names, the names that are not mangled are kept
+    :raise OSError: If c++filt can't be run
+    :raise subprocess.CalledProcessError: If c++filt fails
+    """
+    out = subprocess.run([cxxfilt], input='\n'.join(names) + '\n', stdout=subprocess.PIPE,
+                         universal_newlines=True, check=True).stdout
+    demangled = out.split('\n')[:len(names)]
+    if len(demangled) != len(names):
+        raise OSError('c++filt gave %d names for %d' % (len(demangled), len(names)))
+    return demangled
+
+
+class CxaDemangler:
+    """
+    Demangler calling __cxa_demangle of libstdc++ through ctypes, used when c++filt is not installed
+    :ivar __demangle: The __cxa_demangle function
+    :ivar __free: The free function of the C library
+    """
+
+    def __init__(self):
+        """
+        :raise OSError: If libstdc++ can't be loaded
+        """
+        path = ctypes.util.find_library('stdc++')
+        if path is None:
+            raise OSError('libstdc++ not found')
+        # Not an attribute, it would be mangled as a private name of the class
+        self.__demangle = ctypes.CDLL(path)['__cxa_demangle']
+        self.__demangle.restype = ctypes.c_void_p
+        self.__demangle.argtypes = [ctypes.c_char_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.POINTER(ctypes.c_int)]
+        self.__free = ctypes.CDLL(None).free
+        self.__free.argtypes = [ctypes.c_void_p]
+
+    def __call__(self, names):
+        """
+        :param names: The list of mangled names, without library
+        :return: The list of the demangled names, the names that are not mangled are kept
+        """
+        status = ctypes.c_int()
+        demangled = []
+        for name in names:
+            p = self.__demangle(name.encode(), None, None, ctypes.byref(status)) if name.startswith('_Z') else None
+            if p:
+                demangled.append(ctypes.string_at(p).decode(errors='replace'))
+                self.__free(p)
+            else:
+                demangled.append(name)
+        return demangled
+
+
+class Demangler:
+    """
+    Cached, batched demangler of the function names. The names of each binary (the main program and each library)
+    are demangled in one batch, with c++filt or else __cxa_demangle, and kept in memory and in a cache directory,
+    $DYN_INST_CACHE or ~/.cache/dynamic_inst, keyed by a hash of the names of the binary: the same binary is only
+    demangled once. The function names stay the mangled ones, the demangled names are only shown and filtered.
+    :ivar __directory: The cache directory, None to only keep the names in memory
+    :ivar __batch: The function demangling a list of names, None if neither c++filt nor libstdc++ can be found
+    :ivar __binaries: The demangled names of the binaries seen, hash of the names -> list of demangled names
+    :ivar __lists: The last function list demangled and its demangled names, (names, demangled)
+    """
+
+    def __init__(self, directory=None):
+        """
+        :param directory: The cache directory, None for the default one, '' to not keep the names on disk
+        """
+        if directory is None:
+            directory = os.path.join(os.environ.get(CACHE_DIR_ENV) or os.path.expanduser(DEFAULT_CACHE_DIR),
+                                     CACHE_SUBDIR)
+        self.__directory = directory or None
+        cxxfilt = shutil.which('c++filt')
+        if cxxfilt is not None:
+            self.__batch = partial(demangle_cxxfilt, cxxfilt=cxxfilt)
+        else:
+            try:
+                self.__batch = CxaDemangler()
+            except (OSError, AttributeError):
+                self.__batch = None
+        self.__binaries = {}
+        self.__lists = (None, None)
+
+    @property
+    def available(self):
+        """
+        Read-only property
+        :return: True if names can be demangled
+        """
+        return self.__batch is not None
+
+    def demangle(self, names):
+        """
+        Demangles a function list
+        :param names: The qualified names of the functions, e.g. FunctionTable.names
+        :return: The list of the demangled names, indexed like names, the library part is kept
+        """
+        if names is self.__lists[0]:
+            return self.__lists[1]
+
+        binaries = {}
+        for i, name in enumerate(names):
+            func, lib = split_name(name)
+            binaries.setdefault(lib, ([], []))
+            binaries[lib][0].append(i)
+            binaries[lib][1].append(func)
+
+        demangled = list(names)
+        for lib, (positions, funcs) in binaries.items():
+            for i, d in zip(positions, self.__demangle_binary(funcs)):
+                demangled[i] = qualify_name(d, lib)
+        self.__lists = (names, demangled)
+        return demangled
+
+    def __demangle_binary(self, funcs):
+        """
+        Demangles the functions of a binary, from the memory or the disk cache if they are there
+        :param funcs: The names of the functions in the binary
+        :return: The list of the demangled names
+        """
+        key = hashlib.sha1('\n'.join(funcs).encode(errors='surrogateescape')).hexdigest()
+        demangled = self.__binaries.get(key)
+        if demangled is not None:
+            return demangled
+
+        path = None if self.__directory is None else os.path.join(self.__directory, key)
+        if path is not None:
+            try:
+                with STATS.timer('demangle.cached'), open(path) as f:
+                    demangled = f.read().split('\n')[:-1]
+                if len(demangled) != len(funcs):
+                    demangled = None
+            except (OSError, UnicodeDecodeError):
+                demangled = None
+
+        if demangled is None:
+            if self.__batch is None:
+                return funcs
+            try:
+                with STATS.timer('demangle.batch'):
+                    demangled = self.__batch(funcs)
+            except (OSError, subprocess.CalledProcessError):
+                return funcs
+            if path is not None:
+                self.__save(path, demangled)
+
+        self.__binaries[key] = demangled
+        return demangled
+
+    def __save(self, path, demangled):
+        """
+        Writes demangled names in the cache directory, written aside then renamed so a failure never leaves a partial
+        file. The names are only kept in memory if it fails.
+        :param path: The path of the cache file
+        :param demangled: The demangled names
+        """
+        tmp = '%s.%d' % (path, os.getpid())
+        try:
+            os.makedirs(self.__directory, exist_ok=True)
+            with open(tmp, 'w') as f:
+                for name in demangled:
+                    f.write(name + '\n')
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
@@ -0,0 +1,315 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from dynamic_inst_client.communicator import Communicator, CommunicatorException
+from dynamic_inst_client.stats import STATS
+from dynamic_inst_client.table import FunctionTable
+
+
+class Fleet:
+    """
+    Controls many server processes at once, it can be used in place of a Communicator.
+    The requests are sent concurrently, each process keeps its own HTTP session (and connection).
+    A process that fails is dropped from the fleet and its error is kept in failures, the others go on.
+    The function list is the union of the processes' function lists, a function is active if it is active in
+    at least one process. The function tables of the processes share their name strings.
+    :ivar __light: The light argument of the communicators, see Communicator
+    :ivar __comms: The communicators of the connected processes, address -> Communicator
+    :ivar __executor: The thread pool sending the requests, None if not connected
+    :ivar __merged: The merged function list (FunctionTable), a function is active in at least one process
+    :ivar __counts: The number of processes in which each function is active, indexed like __merged
+    :ivar __merged_from: The addresses of the processes the merged function list was computed from
+    :ivar failures: The processes that failed since the last call to clear_failures, address -> exception
+    :ivar dropped: The addresses of every process dropped since the fleet connected, even the reported ones
+    :cvar function_list: Function list property, setting it changes the functions in every process that has them
+    :cvar MAX_WORKERS: The maximum number of concurrent requests
+    """
+    MAX_WORKERS = 32
+
+    def __init__(self, light=False):
+        """
+        :param light: True for communicators sending the requests without requests, see Communicator
+        """
+        self.__light = light
+        self.__comms = {}
+        self.__executor = None
+        self.__merged = FunctionTable()
+        self.__counts = array('I')
+        self.__merged_from = []
+        self.failures = {}
+        self.dropped = set()
+
+    def __len__(self):
+        """
+        :return: The number of connected processes
+        """
+        return len(self.__comms)
+
+    def connect(self, addresses):
+        """
+        Connects to the server processes, the ones that can't be reached are put in failures
+        :param addresses: The ports or the Unix socket paths of the processes, see Communicator.connect
+        :raise ValueError: When a port is invalid
+        :raise CommunicatorException: When no process could be reached
+        """
+        self.disconnect()
+        comms = {}
+        for address in addresses:
+            comms[address] = Communicator(self.__light)
+        self.__executor = ThreadPoolExecutor(max_workers=min(len(comms), Fleet.MAX_WORKERS) or 1)
+        self.__comms = comms
+        self.__fan_out(lambda address, comm: comm.connect(address))
+        if not self.__comms:
+            raise CommunicatorException('Could not connect to any process')
+        self.__merge(None)
+
+    def disconnect(self):
+        """
+        Disconnects from the server processes
+        """
+        for comm in self.__comms.values():
+            comm.disconnect()
+        self.__comms = {}
+        self.dropped = set()
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+        self.__merged.load(())
+        self.__counts = array('I')
+        self.__merged_from = []
+
+    def refresh(self):
+        """
+        Refreshes the function list from every process
+        :return: The set of functions whose status changed in at least one process
+        :raise CommunicatorException: When no process is left
+        """
+        results = self.__fan_out(lambda _, comm: comm.refresh())
+        changed = set()
+        for c in results.values():
+            changed.update(c)
+        if len(results) < len(self.__merged_from):
+            changed.update(self.__merged.names)
+        self.__merge(changed)
+        return changed
+
+    def libraries(self):
+        """
+        Gets the shared libraries mapped in the server processes
+        :return: The list of libraries, see Communicator.libraries, a library mapped in many processes is listed once
+        :raise CommunicatorException: When no process is left
+        """
+        results = self.__fan_out(lambda _, comm: comm.libraries())
+        libs = {}
+        for address in sorted(results):
+            for lib in results[address]:
+                libs.setdefault(lib['name'], lib)
+        return [libs[name] for name in sorted(libs)]
+
+    @property
+    def loaded_libraries(self):
+        """
+        Read-only property of the loaded libraries
+        :return: The file names of the libraries whose functions are in the function list of at least one process
+        """
+        libs = set()
+        for comm in self.__comms.values():
+            libs.update(comm.loaded_libraries)
+        return sorted(libs)
+
+    def load_library(self, lib):
+        """
+        Adds the functions of a shared library to the function list, in the processes that have the library
+        :param lib: The file name of the library
+        :return: The set of functions added
+        :raise CommunicatorException: When no process has the library or no process is left
+        """
+        def load(_, comm):
+            if not any(l['name'] == lib for l in comm.libraries()):
+                return None
+            return comm.load_library(lib)
+
+        results = self.__fan_out(load)
+        added = set()
+        for a in results.values():
+            if a is not None:
+                added.update(a)
+        if all(a is None for a in results.values()):
+            raise CommunicatorException('Library not in the processes')
+        self.__merge(None)
+        return added
+
+    def __get_function_status(self):
+        """
+        Function list getter
+        :return: The merged function list
+        """
+        self.__check_connected()
+        return self.__merged
+
+    def __set_function_status(self, funcs):
+        """
+        Function list setter, each process only receives the functions it has
+        :param funcs: The dictionary of functions to modify
+        :raise CommunicatorException: If one of the function is in none of the processes, or no process is left
+        """
+        self.set_functions(funcs)
+
+    function_list = property(__get_function_status, __set_function_status)
+
+    def set_functions(self, funcs, window=None):
+        """
+        Sets the status of functions, each process only receives the functions it has. See
+        Communicator.set_functions for the windows.
+        :param funcs: The dictionary of functions to modify
+        :param window: The length of the window in seconds, None to set the functions for good
+        :raise CommunicatorException: If one of the function is in none of the processes, or no process is left
+        """
+        self.__check_connected()
+        for f in funcs:
+            if f not in self.__merged:
+                raise CommunicatorException('Function not in the process')
+
+        def put(_, comm):
+            own = comm.function_list
+            comm.set_functions({f: funcs[f] for f in funcs if f in own}, window)
+
+        results = self.__fan_out(put)
+        if len(results) < len(self.__merged_from):
+            self.__merge(None)
+        else:
+            self.__merge(funcs)
+
+    @property
+    def process_function_lists(self):
+        """
+        Read-only property of the function lists of the processes
+        :return: The function list (FunctionTable) of each connected process, address -> function list
+        :raise CommunicatorException: If the fleet is not connected
+        """
+        self.__check_connected()
+        return {address: comm.function_list for address, comm in self.__comms.items()}
+
+    def set_process_functions(self, funcs):
+        """
+        Sets the status of functions, each process receives its own functions to modify
+        :param funcs: The dictionary of functions to modify of each process, address -> dictionary, the processes
+            not in it are left untouched
+        :raise CommunicatorException: If one of the function is not in its process, or no process is left
+        """
+        self.__check_connected()
+
+        def put(address, comm):
+            own = funcs.get(address)
+            if own:
+                comm.set_functions(own)
+
+        results = self.__fan_out(put)
+        if len(results) < len(self.__merged_from):
+            self.__merge(None)
+        else:
+            self.__merge(set().union(*funcs.values()))
+
+    def active_count(self, name):
+        """
+        Gets the number of processes in which a function is active
+        :param name: The name of the function
+        :return: The number of processes
+        """
+        i = self.__merged.find(name)
+        if i < 0:
+            return 0
+        return self.__counts[i]
+
+    def snapshot(self):
+        """
+        Copies what the ui shows, so that it can read it while the function list is updated by another thread
+        :return: (a copy of the merged function list, (a copy of the number of processes in which each function is
+            active, indexed like the function list, the number of processes))
+        """
+        self.__check_connected()
+        return self.__merged.copy(), (array('I', self.__counts), len(self))
+
+    def status(self):
+        """
+        Gets the status of the fleet
+        :return: True if at least one process is connected
+        """
+        return len(self.__comms) > 0
+
+    def clear_failures(self):
+        """
+        Forgets the failures reported so far
+        """
+        self.failures = {}
+
+    def __fan_out(self, fn):
+        """
+        Calls a function concurrently for every process, the failing processes are dropped
+        :param fn: The function, called with (address, communicator)
+        :return: The results of the processes that succeeded, address -> result
+        :raise CommunicatorException: When no process is left
+        """
+        self.__check_connected()
+        futures = {address: self.__executor.submit(fn, address, comm) for address, comm in self.__comms.items()}
+        results = {}
+        for address, future in futures.items():
+            try:
+                results[address] = future.result()
+            except (CommunicatorException, ValueError) as e:
+                self.failures[address] = e
+                self.dropped.add(address)
+                self.__comms[address].disconnect()
+                del self.__comms[address]
+        return results
+
+    def __merge(self, names):
+        """
+        Updates the merged function list from the processes' function lists
+        :param names: The names of the functions to update, None for all
+        :raise CommunicatorException: When no process is left
+        """
+        with STATS.timer('fleet.merge'):
+            self.__merge_tables(names)
+
+    def __merge_tables(self, names):
+        """
+        Updates the merged function list, see __merge
+        :param names: The names of the functions to update, None for all
+        :raise CommunicatorException: When no process is left
+        """
+        self.__check_connected()
+        self.__merged_from = list(self.__comms)
+        tables = [comm.function_list for comm in self.__comms.values()]
+        merged = self.__merged
+        if names is None:
+            # Functions of dropped processes stay in the list, the UI keeps showing them as nopped
+            # The processes usually run the same program, their tables share the same name strings
+            pool = {f: f for f in merged.names}
+            for t in tables:
+                t.share_names(pool)
+            selected = merged.selected_names()
+            merged.load((f, False) for f in sorted(pool))
+            for f in selected:
+                merged.selected[merged.index(f)] = 1
+            self.__counts = array('I', bytes(len(merged) * array('I').itemsize))
+            names = merged.names
+        for f in names:
+            i = merged.find(f)
+            if i < 0:
+                continue
+            count = 0
+            for t in tables:
+                j = t.find(f)
+                if j >= 0 and t.active[j]:
+                    count += 1
+            self.__counts[i] = count
+            merged.active[i] = 1 if count else 0
+
+    def __check_connected(self):
+        """
+        Checks if the fleet is connected
+        :raise CommunicatorException: The fleet is not connected
+        """
+        if not self.status():
+            raise CommunicatorException('Not connected')
@@ -0,0 +1,163 @@
+import codecs
+import json
+import re
+
+
+class FunctionListStream:
+    """
+    Incremental parser for the function list documents sent by the server:
+        { "member": value, ..., "functions": [ {"name": ..., "active": ...}, ... ] }
+    The body is fed chunk by chunk, the entries of the functions array are returned as soon as they are complete
+    and the other top-level members are collected in members.
+    :ivar members: The top-level members other than functions
+    :ivar __decoder: The JSON decoder used to parse the values
+    :ivar __utf8: The incremental decoder for the chunks
+    :ivar __buf: The data not parsed yet
+    :ivar __state: The state of the parser
+    :ivar __key: The top-level key whose value is being parsed
+    """
+    START, KEY, COLON, VALUE, ARRAY, ELEMENT, DONE = range(7)
+    WHITESPACE = ' \t\n\r'
+    SEPARATORS = re.compile(r'[ \t\n\r,]*')
+
+    def __init__(self):
+        self.members = {}
+        self.__decoder = json.JSONDecoder()
+        self.__utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.__buf = ''
+        self.__state = FunctionListStream.START
+        self.__key = None
+
+    def feed(self, chunk):
+        """
+        Parses a chunk of the body
+        :param chunk: The chunk, bytes
+        :return: The list of function entries completed by this chunk
+        :raise ValueError: If the document is invalid
+        """
+        self.__buf += self.__utf8.decode(chunk)
+        entries = []
+        pos = self.__parse(entries)
+        self.__buf = self.__buf[pos:]
+        return entries
+
+    def close(self):
+        """
+        Checks that the whole document was parsed
+        :raise ValueError: If the document is incomplete or invalid
+        """
+        self.__buf += self.__utf8.decode(b'', final=True)
+        self.__buf = self.__buf[self.__parse([]):]
+        if self.__state != FunctionListStream.DONE or self.__buf.strip(FunctionListStream.WHITESPACE):
+            raise ValueError('Incomplete function list')
+
+    def __parse(self, entries):
+        """
+        Parses as much of the buffer as possible
+        :param entries: The list the completed function entries are added to
+        :return: The position of the first character not parsed
+        :raise ValueError: If the document is invalid
+        """
+        buf = self.__buf
+        pos = 0
+        while True:
+            pos = self.__skip_whitespace(buf, pos)
+            if pos == len(buf):
+                return pos
+            c = buf[pos]
+            state = self.__state
+
+            if state == FunctionListStream.START:
+                self.__expect(c, '{')
+                self.__state = FunctionListStream.KEY
+                pos += 1
+            elif state == FunctionListStream.KEY:
+                if c == ',':
+                    pos += 1
+                    continue
+                if c == '}':
+                    self.__state = FunctionListStream.DONE
+                    pos += 1
+                    continue
+                value = self.__decode(buf, pos)
+                if value is None:
+                    return pos
+                self.__key, pos = value
+                self.__state = FunctionListStream.COLON
+            elif state == FunctionListStream.COLON:
+                self.__expect(c, ':')
+                pos += 1
+                if self.__key == 'functions':
+                    self.__state = FunctionListStream.ARRAY
+                else:
+                    self.__state = FunctionListStream.VALUE
+            elif state == FunctionListStream.VALUE:
+                value = self.__decode(buf, pos)
+                if value is None:
+                    return pos
+                self.members[self.__key], pos = value
+                self.__state = FunctionListStream.KEY
+            elif state == FunctionListStream.ARRAY:
+                self.__expect(c, '[')
+                self.__state = FunctionListStream.ELEMENT
+                pos += 1
+            elif state == FunctionListStream.ELEMENT:
+                # Most of the document, parsed in a tight loop
+                raw_decode = self.__decoder.raw_decode
+                separators = FunctionListStream.SEPARATORS
+                end = len(buf)
+                while True:
+                    pos = separators.match(buf, pos).end()
+                    if pos == end:
+                        return pos
+                    if buf[pos] == ']':
+                        self.__state = FunctionListStream.KEY
+                        pos += 1
+                        break
+                    try:
+                        entry, value_end = raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        return pos
+                    if value_end == end:
+                        return pos
+                    entries.append(entry)
+                    pos = value_end
+            else:
+                raise ValueError('Data after the end of the function list')
+
+    def __decode(self, buf, pos):
+        """
+        Decodes the value starting at a position.
+        A value is only complete if something follows it, otherwise a number could still be cut.
+        :param buf: The buffer
+        :param pos: The position
+        :return: (value, end position), None if the value is not complete yet
+        """
+        try:
+            value, end = self.__decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            return None
+        if end == len(buf):
+            return None
+        return value, end
+
+    @staticmethod
+    def __skip_whitespace(buf, pos):
+        """
+        :param buf: The buffer
+        :param pos: The position to start from
+        :return: The position of the first non-whitespace character
+        """
+        while pos < len(buf) and buf[pos] in FunctionListStream.WHITESPACE:
+            pos += 1
+        return pos
+
+    @staticmethod
+    def __expect(c, expected):
+        """
+        :param c: The character found
+        :param expected: The character expected
+        :raise ValueError: If they are different
+        """
+        if c != expected:
+            raise ValueError('Expected %r in the function list, found %r' % (expected, c))
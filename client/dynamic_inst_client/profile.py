@@ -0,0 +1,136 @@
+import os
+
+from dynamic_inst_client.bulk import entry_libraries, read_entries
+
+PROFILE_HEADER = '# dynamic_inst profile'
+PROFILE_SUFFIX = '.profile'
+PROFILE_DIR_ENV = 'DYN_INST_PROFILES'
+DEFAULT_PROFILE_DIR = os.path.join('~', '.config', 'dynamic_inst', 'profiles')
+
+
+def profile_path(name):
+    """
+    Gets the path of a profile. A bare name is looked up in the profile directory, $DYN_INST_PROFILES or
+    ~/.config/dynamic_inst/profiles, anything that looks like a path is used as is.
+    :param name: The name or the path of the profile
+    :return: The path of the profile file
+    """
+    if os.sep in name or name.endswith(PROFILE_SUFFIX):
+        return name
+    directory = os.environ.get(PROFILE_DIR_ENV) or os.path.expanduser(DEFAULT_PROFILE_DIR)
+    return os.path.join(directory, name + PROFILE_SUFFIX)
+
+
+class ProfileDiff:
+    """
+    Differences between a profile and the function list of a process
+    :ivar activate: The functions of the profile that are not active in the process
+    :ivar deactivate: The functions active in the process that are not in the profile
+    :ivar missing: The functions of the profile that are not in the process
+    """
+
+    def __init__(self, activate, deactivate, missing):
+        self.activate = activate
+        self.deactivate = deactivate
+        self.missing = missing
+
+    def __bool__(self):
+        """
+        :return: True if the process differs from the profile
+        """
+        return bool(self.activate or self.deactivate or self.missing)
+
+    def changes(self):
+        """
+        :return: The dictionary of functions to set for the process to match the profile
+        """
+        changes = dict.fromkeys(self.activate, True)
+        changes.update(dict.fromkeys(self.deactivate, False))
+        return changes
+
+
+class Profile:
+    """
+    Named set of active functions. Only the active functions are kept, every other function of the process is
+    inactive in the profile. The file is a header line then one name per line, sorted, so it can also be given to
+    activate with --file.
+    :ivar active: The sorted list of the active functions, function@library for the functions of a library
+    """
+
+    def __init__(self, active=()):
+        """
+        :param active: Iterable of the names of the active functions
+        """
+        self.active = sorted(set(active))
+
+    @staticmethod
+    def from_function_list(function_list):
+        """
+        Creates the profile of the active functions of a function list
+        :param function_list: The function list (FunctionTable)
+        :return: The Profile
+        """
+        table_active = function_list.active
+        return Profile(f for i, f in enumerate(function_list.names) if table_active[i])
+
+    @staticmethod
+    def load(path):
+        """
+        Reads a profile file
+        :param path: The path of the file
+        :return: The Profile
+        :raise OSError: If the file can't be read
+        :raise ValueError: If the file is not a profile
+        """
+        with open(path) as f:
+            if f.readline().rstrip('\n') != PROFILE_HEADER:
+                raise ValueError('Not a profile: %s' % path)
+            return Profile(read_entries(f))
+
+    def save(self, path):
+        """
+        Writes the profile file, it is written aside then renamed so a failure never leaves a partial profile
+        :param path: The path of the file, its directory is created if needed
+        :raise OSError: If the file can't be written
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = '%s.%d' % (path, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                f.write(PROFILE_HEADER + '\n')
+                for name in self.active:
+                    f.write(name + '\n')
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    @property
+    def libraries(self):
+        """
+        Read-only property of the libraries of the profile
+        :return: The sorted file names of the libraries whose functions are in the profile
+        """
+        return entry_libraries(self.active)
+
+    def diff(self, function_list):
+        """
+        Compares the profile with a function list
+        :param function_list: The function list (FunctionTable)
+        :return: The ProfileDiff
+        """
+        activate = []
+        missing = []
+        for name in self.active:
+            i = function_list.find(name)
+            if i < 0:
+                missing.append(name)
+            elif not function_list.active[i]:
+                activate.append(name)
+        wanted = set(self.active)
+        table_active = function_list.active
+        deactivate = [f for i, f in enumerate(function_list.names) if table_active[i] and f not in wanted]
+        return ProfileDiff(activate, deactivate, missing)
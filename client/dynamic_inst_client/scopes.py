@@ -0,0 +1,238 @@
+from bisect import bisect_right
+
+from dynamic_inst_client.util import LIBRARY_SEPARATOR
+
+# Scopes of the Itanium abbreviations that can start a nested name
+ABBREVIATIONS = {
+    'St': ['std'],
+    'Sa': ['std', 'allocator'],
+    'Sb': ['std', 'basic_string'],
+    'Ss': ['std', 'string'],
+    'Si': ['std', 'istream'],
+    'So': ['std', 'ostream'],
+    'Sd': ['std', 'iostream'],
+}
+ANONYMOUS_NAMESPACE = '_GLOBAL__N'
+# Start the encoding of something that ends with an 'E' in template arguments
+OPENERS = 'INXLJF'
+# Starts a literal in template arguments, L<type><value>E, whose value is not a length
+LITERAL = 'L'
+# Starts an ABI tag after a source name, B<length><tag>
+ABI_TAG = 'B'
+# Follow a scope's prefix in the names of the functions that are not in it: template arguments, an ABI tag, or the end
+# of the nested name (the name was the function's)
+NOT_IN_SCOPE = 'IBE'
+
+
+def skip_template_args(name, i):
+    """
+    Skips template arguments, the identifiers in them are skipped by their length, the literals (e.g. Li3E) to their
+    'E' since their value is not a length
+    :param name: The mangled name
+    :param i: The offset of the 'I' starting the arguments
+    :return: The offset after the 'E' ending them, -1 if they don't end
+    """
+    depth = 0
+    while i < len(name):
+        c = name[i]
+        if c.isdigit():
+            j = i
+            while j < len(name) and name[j].isdigit():
+                j += 1
+            i = j + int(name[i:j])
+            continue
+        # Unless it is an external name, L_Z<encoding>E
+        if c == LITERAL and not name.startswith('_Z', i + 1):
+            i = name.find('E', i)
+            if i < 0:
+                return -1
+            i += 1
+            continue
+        if c in OPENERS:
+            depth += 1
+        elif c == 'E':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return -1
+
+
+def mangled_scopes(name):
+    """
+    Finds the namespaces and classes of a function from its Itanium mangled name, without demangling it: only the
+    source names of its nested name are read. Template arguments are shown as '<...>', ABI tags as '[abi:TAG]'
+    like c++filt does.
+    :param name: The qualified name of the function, see util.qualify_name
+    :return: The list of (scope, offset of the end of the scope in name), outermost first, empty for a function that
+        is not in a namespace or class (or not mangled)
+
+    >>> mangled_scopes('_ZN5myapp6detail4implILi3EE3runEv')
+    [('myapp', 9), ('detail', 16), ('impl<...>', 27)]
+    >>> mangled_scopes('_ZN5myapp3barB5cxx11Ev')
+    [('myapp', 9)]
+    >>> mangled_scopes('_ZN5myapp3FooB5cxx113runEv')
+    [('myapp', 9), ('Foo[abi:cxx11]', 20)]
+    """
+    if not name.startswith('_ZN'):
+        return []
+    end = name.find(LIBRARY_SEPARATOR)
+    if end < 0:
+        end = len(name)
+    i = 3
+    while i < end and name[i] in 'rVKRO':
+        i += 1
+    scopes = []
+    abbreviation = ABBREVIATIONS.get(name[i:i + 2])
+    if abbreviation is not None:
+        i += 2
+        scopes += [[s, i] for s in abbreviation]
+    while i < end:
+        c = name[i]
+        if c.isdigit():
+            j = i
+            while j < end and name[j].isdigit():
+                j += 1
+            i = j + int(name[i:j])
+            source = name[j:i]
+            scopes.append(['(anonymous namespace)' if source.startswith(ANONYMOUS_NAMESPACE) else source, i])
+        elif c == 'I' and scopes:
+            i = skip_template_args(name, i)
+            if i < 0:
+                return []
+            scopes[-1] = [scopes[-1][0] + '<...>', i]
+        elif c == ABI_TAG and scopes and name[i + 1:i + 2].isdigit():
+            # The tag (e.g. B5cxx11) belongs to the name before it
+            j = i + 1
+            while j < end and name[j].isdigit():
+                j += 1
+            i = j + int(name[i + 1:j])
+            scopes[-1] = ['%s[abi:%s]' % (scopes[-1][0], name[j:i]), i]
+        else:
+            break
+    if i >= end:
+        return []
+    # The last name before the end of the nested name is the function's, not a scope (unlike a constructor,
+    # a destructor or an operator)
+    if name[i] == 'E':
+        scopes = scopes[:-1]
+    return [tuple(s) for s in scopes]
+
+
+class Scope:
+    """
+    Namespace or class of the tree. The functions of a scope are given as ranges of the tree's positions, the names
+    that start with the same mangled scope prefix are next to each other in a sorted list (the ones that continue it
+    with template arguments or an ABI tag apart, they are in another scope).
+    :ivar name: The name of the scope, '' for the root
+    :ivar path: The names of the scope and of its parents, outermost first
+    :ivar ranges: The ranges of the tree's positions of the functions in the scope, list of (start, end)
+    """
+
+    def __init__(self, name, path, ranges):
+        """
+        :param name: The name of the scope
+        :param path: The names of the scope and of its parents
+        :param ranges: The ranges of the functions in the scope
+        """
+        self.name = name
+        self.path = path
+        self.ranges = ranges
+
+    @property
+    def depth(self):
+        """
+        :return: The number of parents of the scope, 0 for the root
+        """
+        return len(self.path)
+
+
+class ScopeTree:
+    """
+    Tree of the namespaces and classes of the functions, see mangled_scopes. The children of a scope are only
+    computed when asked for, one name is parsed for each child scope and each function directly in it.
+    :ivar names: The sorted list of function names, e.g. FunctionTable.names
+    :ivar positions: The sorted positions in names of the functions of the tree
+    :ivar root: The root scope, with every function
+
+    >>> tree = ScopeTree(['_ZN3foo1xEv', '_ZN3foo3barEv', '_ZN3fooB5cxx113bazEv', '_ZN3fooIiE3bazEv',
+    ...                   '_ZN3fooIiE4quuxEv'])
+    >>> [(child.name, tree.functions(child)) for child in tree.children(tree.root)[0]]
+    [('foo', [0, 1]), ('foo<...>', [3, 4]), ('foo[abi:cxx11]', [2])]
+    >>> tree = ScopeTree(['_ZN2ns3foo3barEv', '_ZN2ns3fooEv'])
+    >>> ns = tree.children(tree.root)[0][0]
+    >>> [(child.name, tree.functions(child)) for child in tree.children(ns)[0]], tree.children(ns)[1]
+    ([('foo', [0])], [1])
+    """
+
+    def __init__(self, names, positions=None):
+        """
+        :param names: The sorted list of function names
+        :param positions: The sorted positions of the functions of the tree, None for all of them
+        """
+        self.names = names
+        self.positions = range(len(names)) if positions is None else positions
+        self.root = Scope('', (), [(0, len(self.positions))])
+
+    def children(self, scope):
+        """
+        Computes the content of a scope
+        :param scope: The Scope
+        :return: (the list of the child Scopes sorted by name, the sorted positions of the functions directly in it)
+        """
+        names = self.names
+        positions = self.positions
+        depth = scope.depth
+        groups = {}
+        functions = []
+        # The ranges to group, with the length of the prefix they were split from, a range is only split again on a
+        # longer prefix
+        pending = [(start, end, -1) for start, end in scope.ranges]
+        while pending:
+            start, end, split = pending.pop()
+            i = start
+            while i < end:
+                name = names[positions[i]]
+                scopes = mangled_scopes(name)
+                if len(scopes) <= depth:
+                    functions.append(positions[i])
+                    i += 1
+                    continue
+                child, offset = scopes[depth]
+                prefix = name[:offset]
+                j = bisect_right(positions, prefix, i + 1, end, key=lambda p: names[p][:offset])
+                # The names with the prefix, in runs of the same next character
+                k = i
+                while k < j:
+                    c = names[positions[k]][offset:offset + 1]
+                    run_end = bisect_right(positions, c, k + 1, j, key=lambda p: names[p][offset:offset + 1])
+                    if c and c in NOT_IN_SCOPE and offset > split:
+                        pending.append((k, run_end, offset))
+                    else:
+                        groups.setdefault(child, []).append((k, run_end))
+                    k = run_end
+                i = j
+        children = [Scope(child, scope.path + (child,), sorted(groups[child])) for child in sorted(groups)]
+        return children, sorted(functions)
+
+    def functions(self, scope):
+        """
+        :param scope: The Scope
+        :return: The positions in names of the functions in the scope and in its children
+        """
+        return [p for start, end in scope.ranges for p in self.positions[start:end]]
+
+    def count(self, scope, active):
+        """
+        Counts the active functions of a scope
+        :param scope: The Scope
+        :param active: The active state of each function, indexed like names, 1 if active
+        :return: (the number of active functions, the number of functions) in the scope and in its children
+        """
+        positions = self.positions
+        count = 0
+        total = 0
+        for start, end in scope.ranges:
+            count += sum(map(active.__getitem__, positions[start:end]))
+            total += end - start
+        return count, total
@@ -0,0 +1,92 @@
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate, compress, repeat
+from operator import contains
+
+
+class NameIndex:
+    """
+    Substring index of the function names, narrows the functions the filter is applied to while the user types.
+    The names are joined in a single string, one per line, so a literal is searched in all of them at C speed.
+    The candidates of the recent literals are kept: a literal that extends one of them (one more character typed)
+    is only searched in its candidates, and going back to one of them (backspace) costs nothing.
+    The index follows the name list it was built from, it is rebuilt when the list is replaced.
+    :ivar __names: The list of names the index was built from
+    :ivar __text: The names joined with '\n', built on the first search
+    :ivar __starts: The offsets of the names in __text, with the length of __text at the end
+    :ivar __results: LRU cache of the candidates, literal -> sorted positions of the names that contain it
+    :cvar CACHE_SIZE: The maximum number of literals kept in the cache
+    :cvar SCAN_RATIO: Above one occurrence of the literal every SCAN_RATIO names, the names are scanned one by one
+        instead of following the occurrences in the joined text
+    """
+    CACHE_SIZE = 32
+    SCAN_RATIO = 16
+
+    def __init__(self):
+        self.__names = None
+        self.__text = ''
+        self.__starts = array('L')
+        self.__results = OrderedDict()
+
+    def candidates(self, names, literal):
+        """
+        Finds the names that contain a literal
+        :param names: The sorted list of names, e.g. FunctionTable.names
+        :param literal: The literal, see Filter.literal
+        :return: The sorted positions of the names that contain it, None for all of them (empty literal)
+        """
+        if not literal:
+            return None
+        if names is not self.__names:
+            self.__names = names
+            self.__text = ''
+            self.__starts = array('L')
+            self.__results.clear()
+
+        result = self.__results.get(literal)
+        if result is not None:
+            self.__results.move_to_end(literal)
+            return result
+
+        # The shortest result of the literals it contains
+        base = None
+        for cached, positions in self.__results.items():
+            if cached in literal and (base is None or len(positions) < len(base)):
+                base = positions
+        if base is not None:
+            result = list(compress(base, map(contains, map(names.__getitem__, base), repeat(literal))))
+        else:
+            result = self.__search(literal)
+
+        self.__results[literal] = result
+        if len(self.__results) > NameIndex.CACHE_SIZE:
+            self.__results.popitem(last=False)
+        return result
+
+    def __search(self, literal):
+        """
+        Searches a literal in every name
+        :param literal: The literal
+        :return: The sorted positions of the names that contain it
+        """
+        names = self.__names
+        if '\n' in literal:
+            return []
+        if not self.__text and names:
+            self.__text = '\n'.join(names) + '\n'
+            # Each name is followed by its '\n'
+            self.__starts = array('L', accumulate(map((1).__add__, map(len, names)), initial=0))
+
+        text = self.__text
+        if text.count(literal) * NameIndex.SCAN_RATIO > len(names):
+            return list(compress(range(len(names)), map(contains, names, repeat(literal))))
+
+        starts = self.__starts
+        result = []
+        offset = text.find(literal)
+        while offset >= 0:
+            i = bisect_right(starts, offset) - 1
+            result.append(i)
+            offset = text.find(literal, starts[i + 1])
+        return result
@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from contextlib import nullcontext
+
+PERCENTILES = (50, 90, 99)
+
+
+class Timer:
+    """
+    Context manager recording the time spent in its block
+    :ivar __stats: The Stats to record to
+    :ivar __name: The name of the timing
+    :ivar __start: The time the block was entered
+    """
+
+    def __init__(self, stats, name):
+        """
+        :param stats: The Stats to record to
+        :param name: The name of the timing
+        """
+        self.__stats = stats
+        self.__name = name
+        self.__start = 0.0
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.__stats.record(self.__name, time.perf_counter() - self.__start)
+
+
+class Stats:
+    """
+    Timings and sizes of the phases of the client, summed up when the client exits (--stats).
+    It is off by default, then recording costs a single test.
+    The samples are recorded from the UI and the worker threads.
+    :ivar enabled: True to record the samples
+    :ivar __samples: The recorded values, name -> list of values
+    :ivar __units: The unit of the values, name -> unit ('s' for the timings, 'B' for the sizes)
+    :ivar __lock: Protects the samples
+    """
+    NULL_TIMER = nullcontext()
+
+    def __init__(self):
+        self.enabled = False
+        self.__samples = {}
+        self.__units = {}
+        self.__lock = threading.Lock()
+
+    def record(self, name, value, unit='s'):
+        """
+        Records a sample
+        :param name: The name of the measure, e.g. 'get.request'
+        :param value: The value
+        :param unit: The unit of the value
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__samples.setdefault(name, []).append(value)
+            self.__units[name] = unit
+
+    def timer(self, name):
+        """
+        :param name: The name of the timing
+        :return: A context manager recording the time spent in its block
+        """
+        if not self.enabled:
+            return Stats.NULL_TIMER
+        return Timer(self, name)
+
+    def clear(self):
+        """
+        Forgets the recorded samples
+        """
+        with self.__lock:
+            self.__samples = {}
+            self.__units = {}
+
+    def summary(self):
+        """
+        Sums up the samples of each measure
+        :return: name -> dictionary of the unit, count, total, mean, min, max and p50, p90, p99 (nearest rank)
+        """
+        with self.__lock:
+            samples = {name: sorted(values) for name, values in self.__samples.items()}
+            units = dict(self.__units)
+        summary = {}
+        for name in sorted(samples):
+            values = samples[name]
+            total = sum(values)
+            s = {
+                'unit': units[name],
+                'count': len(values),
+                'total': total,
+                'mean': total / len(values),
+                'min': values[0],
+                'max': values[-1],
+            }
+            for p in PERCENTILES:
+                s['p%d' % p] = values[max(0, -(-len(values) * p // 100) - 1)]
+            summary[name] = s
+        return summary
+
+    def report(self):
+        """
+        Formats the summary as a table, the timings in milliseconds
+        :return: The lines of the table
+        """
+        columns = ['count', 'total', 'mean', 'p50', 'p90', 'p99', 'max']
+        lines = ['%-16s %4s %8s' % ('measure', 'unit', columns[0]) + ''.join(' %10s' % c for c in columns[1:])]
+        for name, s in self.summary().items():
+            if s['unit'] == 's':
+                unit, scale = 'ms', 1000
+            else:
+                unit, scale = s['unit'], 1
+            lines.append('%-16s %4s %8d' % (name, unit, s['count']) +
+                         ''.join(' %10.3f' % (s[c] * scale) for c in columns[1:]))
+        return lines
+
+    def dump(self, path):
+        """
+        Writes the summary and the samples as JSON
+        :param path: The path of the file
+        :raise OSError: If the file can't be written
+        """
+        with self.__lock:
+            samples = {name: list(values) for name, values in self.__samples.items()}
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'samples': samples}, f, indent=1)
+            f.write('\n')
+
+
+STATS = Stats()
@@ -0,0 +1,136 @@
+from bisect import bisect_left
+from collections.abc import Mapping
+
+
+class FunctionTable(Mapping):
+    """
+    Compact function table shared by the Communicator, the UI and the command line.
+    The names are kept once and sorted, a function is identified by its position in the table.
+    The active state and the selection are byte arrays with one byte per function.
+    It is a mapping of name -> active, so it can be read like the dictionary it replaces.
+    :ivar names: The sorted list of function names
+    :ivar active: The active state of each function, 1 if active
+    :ivar selected: The selection state of each function, 1 if selected
+    """
+
+    def __init__(self, entries=()):
+        """
+        :param entries: Iterable of (name, active)
+        """
+        self.names = []
+        self.active = bytearray()
+        self.selected = bytearray()
+        self.load(entries)
+
+    def load(self, entries):
+        """
+        Replaces the content of the table, the selection is cleared
+        :param entries: Iterable of (name, active), sorting them by name first is faster
+        """
+        names = []
+        active = bytearray()
+        is_sorted = True
+        for name, a in entries:
+            if is_sorted and names and name <= names[-1]:
+                is_sorted = False
+            names.append(name)
+            active.append(1 if a else 0)
+        if not is_sorted:
+            order = sorted(range(len(names)), key=names.__getitem__)
+            names = [names[i] for i in order]
+            active = bytearray(active[i] for i in order)
+        self.names = names
+        self.active = active
+        self.selected = bytearray(len(names))
+
+    def index(self, name):
+        """
+        Gets the position of a function
+        :param name: The name of the function
+        :return: The position
+        :raise KeyError: If the function is not in the table
+        """
+        i = bisect_left(self.names, name)
+        if i == len(self.names) or self.names[i] != name:
+            raise KeyError(name)
+        return i
+
+    def find(self, name):
+        """
+        Gets the position of a function
+        :param name: The name of the function
+        :return: The position, -1 if the function is not in the table
+        """
+        i = bisect_left(self.names, name)
+        if i == len(self.names) or self.names[i] != name:
+            return -1
+        return i
+
+    def set_active(self, name, value):
+        """
+        Sets the active state of a function
+        :param name: The name of the function
+        :param value: The active state
+        :return: True if the state changed
+        :raise KeyError: If the function is not in the table
+        """
+        i = self.index(name)
+        value = 1 if value else 0
+        if self.active[i] == value:
+            return False
+        self.active[i] = value
+        return True
+
+    def share_names(self, pool):
+        """
+        Replaces the names by equal strings of a pool, so that tables of the same program share their names.
+        Unlike sys.intern, the strings are not kept alive once the pool is dropped.
+        :param pool: Dictionary of the shared strings, name -> name, the missing names are added to it
+        """
+        self.names = [pool.setdefault(f, f) for f in self.names]
+
+    def copy(self):
+        """
+        Copies the table, e.g. for another thread to read it while this one is updated. The names list is shared, a
+        table replaces it but never changes it in place.
+        :return: The FunctionTable
+        """
+        table = FunctionTable()
+        table.names = self.names
+        table.active = bytearray(self.active)
+        table.selected = bytearray(self.selected)
+        return table
+
+    def update_from(self, other):
+        """
+        Takes the functions and their active state from another table, the selection is kept
+        :param other: The FunctionTable, e.g. a copy made by another thread
+        """
+        if other.names is not self.names:
+            selected = self.selected_names()
+            self.names = other.names
+            self.selected = bytearray(len(other.names))
+            for f in selected:
+                i = self.find(f)
+                if i >= 0:
+                    self.selected[i] = 1
+        self.active = bytearray(other.active)
+
+    def selected_names(self):
+        """
+        :return: The list of the selected function names
+        """
+        names = self.names
+        return [names[i] for i, s in enumerate(self.selected) if s]
+
+    def __getitem__(self, name):
+        return self.active[self.index(name)] == 1
+
+    def __contains__(self, name):
+        return self.find(name) >= 0
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
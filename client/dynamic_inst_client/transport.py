@@ -0,0 +1,216 @@
+import http.client
+import json
+import os
+import re
+import socket
+from urllib.parse import quote, unquote, urlencode, urlsplit
+
+UNIX_SCHEME = 'http+unix://'
+SOCKET_NAME = re.compile(r'^dyn-server-(\d+)\.sock$')
+
+
+def unix_url(path, endpoint):
+    """
+    Makes the url of an endpoint of a server listening on a Unix socket
+    :param path: The path of the socket
+    :param endpoint: The path of the endpoint, e.g. '/instrumentation'
+    :return: The url, to use with a session where a UnixSocketAdapter is mounted
+    """
+    return UNIX_SCHEME + quote(os.path.abspath(path), safe='') + endpoint
+
+
+def find_sockets(directory):
+    """
+    Finds the sockets of the server processes in a directory, the server names them dyn-server-PID.sock.
+    The sockets left by the processes that are gone are skipped.
+    :param directory: The directory, DYN_SERVER_SOCKET_DIR of the processes
+    :return: The sorted list of the socket paths
+    :raise OSError: If the directory can't be read
+    """
+    paths = []
+    for name in os.listdir(directory):
+        m = SOCKET_NAME.match(name)
+        if m is not None and os.path.exists('/proc/%s' % m.group(1)):
+            paths.append(os.path.join(directory, name))
+    return sorted(paths)
+
+
+class HttpError(Exception):
+    """
+    Exception raised by HttpResponse.raise_for_status for an error status
+    """
+    pass
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection of http.client over a Unix socket
+    :ivar __path: The path of the socket
+    """
+
+    def __init__(self, path, **kwargs):
+        """
+        :param path: The path of the socket
+        :param kwargs: The arguments of http.client.HTTPConnection
+        """
+        super().__init__('localhost', **kwargs)
+        self.__path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Without a timeout, http.client passes its default timeout sentinel
+        sock.settimeout(self.timeout if isinstance(self.timeout, (int, float)) else None)
+        try:
+            sock.connect(self.__path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class HttpResponse:
+    """
+    Response of a HttpSession, with the part of the interface of requests.Response the Communicator uses
+    :ivar status_code: The HTTP status
+    :ivar __response: The http.client.HTTPResponse
+    :ivar __connection: The connection it was received on, closed if the body is not read to the end
+    :ivar __content: The body, None until it is read
+    """
+
+    def __init__(self, response, connection):
+        """
+        :param response: The http.client.HTTPResponse
+        :param connection: The connection it was received on
+        """
+        self.status_code = response.status
+        self.__response = response
+        self.__connection = connection
+        self.__content = None
+
+    @property
+    def content(self):
+        """
+        Read-only property, reads the whole body the first time
+        :return: The body
+        """
+        if self.__content is None:
+            self.__content = self.__response.read()
+        return self.__content
+
+    def json(self):
+        """
+        :return: The body decoded from JSON
+        """
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size):
+        """
+        Reads the body as it arrives
+        :param chunk_size: The maximum size of a chunk
+        :return: Generator of the chunks of the body
+        """
+        while True:
+            chunk = self.__response.read1(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def raise_for_status(self):
+        """
+        :raise HttpError: If the status is an error
+        """
+        if self.status_code >= 400:
+            raise HttpError('%d %s' % (self.status_code, self.__response.reason))
+
+    def close(self):
+        """
+        Releases the connection, it is closed if the body was not read to the end so that the next request doesn't
+        read the rest of this one
+        """
+        if not self.__response.isclosed():
+            self.__connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class HttpSession:
+    """
+    Minimal HTTP session on http.client, the requests the Communicator sends without importing requests (and
+    urllib3), which takes longer to import than a command line command takes to run. Like a requests.Session, the
+    connection to each server is kept alive between the requests, over TCP or over a Unix socket (see unix_url).
+    A request sent on a connection the server closed since the previous one is sent again on a new connection.
+    :ivar __connections: The open connections, host part of the url -> http.client.HTTPConnection
+    :ivar __responses: The last response of each connection, host part of the url -> HttpResponse
+    """
+
+    def __init__(self):
+        self.__connections = {}
+        self.__responses = {}
+
+    def request(self, method, url, params=None, data=None, stream=False):
+        """
+        Sends a request
+        :param method: The HTTP method
+        :param url: The url, http:// or http+unix://
+        :param params: The query parameters, dictionary
+        :param data: The body, str or bytes
+        :param stream: False to read the whole body before returning, True to read it with iter_content
+        :return: The HttpResponse
+        :raise OSError: If the server can't be reached
+        :raise http.client.HTTPException: If the response is invalid
+        """
+        parts = urlsplit(url)
+        target = parts.path or '/'
+        if params:
+            target += '?' + urlencode(params)
+        if isinstance(data, str):
+            data = data.encode()
+
+        previous = self.__responses.pop(parts.netloc, None)
+        if previous is not None:
+            previous.close()
+        connection = self.__connection(parts)
+        reused = connection.sock is not None
+        try:
+            connection.request(method, target, body=data)
+            response = connection.getresponse()
+        except (ConnectionError, http.client.BadStatusLine):
+            connection.close()
+            if not reused:
+                raise
+            # The server closed the connection kept alive, once
+            connection.request(method, target, body=data)
+            response = connection.getresponse()
+
+        r = HttpResponse(response, connection)
+        self.__responses[parts.netloc] = r
+        if not stream:
+            _ = r.content
+        return r
+
+    def __connection(self, parts):
+        """
+        :param parts: The split url
+        :return: The connection to the server of the url, a new one if there is none yet
+        """
+        connection = self.__connections.get(parts.netloc)
+        if connection is None:
+            if parts.scheme + '://' == UNIX_SCHEME:
+                connection = UnixHTTPConnection(unquote(parts.netloc))
+            else:
+                connection = http.client.HTTPConnection(parts.hostname, parts.port)
+            self.__connections[parts.netloc] = connection
+        return connection
+
+    def close(self):
+        """
+        Closes the connections
+        """
+        for connection in self.__connections.values():
+            connection.close()
+        self.__connections = {}
+        self.__responses = {}
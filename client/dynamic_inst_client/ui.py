@@ -1,8 +1,15 @@
+import os
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
 from functools import partial
 
 import urwid as uw
 
-from dynamic_inst_client.util import Filter
+from dynamic_inst_client.scopes import ScopeTree
+from dynamic_inst_client.search import NameIndex
+from dynamic_inst_client.stats import STATS
+from dynamic_inst_client.util import Filter, format_rate, function_status
+from dynamic_inst_client.worker import CommunicatorWorker
 
 
 def make_enableable(obj):
@@ -47,17 +54,19 @@ class SelectableFunctionText(uw.Text):
     :ivar name: The name of the function
     :ivar on_select: Called when the text is selected
     """
-    def __init__(self, name, activated, on_select):
+    def __init__(self, name, activated, on_select, count=None, processes=1, rate=None, label=None):
         """
         :param name: The name of the text
         :param activated: Active status, influences the string
         :param on_select: Callback for selection
+        :param count: The number of processes in which the function is active, None for a single process
+        :param processes: The number of processes
+        :param rate: The event rate of the function, None if unknown
+        :param label: The name shown, e.g. the demangled name, None to show the name
         """
-        markup = name
-        if activated:
-            markup += ' (active)'
-        else:
-            markup += ' (nopped)'
+        markup = (name if label is None else label) + ' ' + function_status(activated, count, processes)
+        if rate is not None:
+            markup += ' ' + format_rate(rate)
         super().__init__(markup, align=uw.CENTER)
         self.name = name
         self.on_select = on_select
@@ -74,65 +83,122 @@ class SelectableFunctionText(uw.Text):
 
 class FilterFunctionWalker(uw.ListWalker):
     """
-    Custom walker for the list, takes into account the function list
-    :ivar __function_list: The list of functions
-    :ivar __function_names: The list of function names
-    :ivar __selected: The set of currently selected functions
+    Custom walker for the list, takes into account the function list.
+    The positions are the positions of the functions in the FunctionTable, the selection is kept in the table.
+    :ivar __table: The FunctionTable of the functions
+    :ivar __matching: The sorted positions of the functions that respect the filter
+    :ivar __names: The names of the table __matching was computed for, the table replaces them when it is reloaded
+    :ivar __index: The substring index of the names, narrows the functions the filter is applied to
+    :ivar __counts: (the number of processes in which each function is active, indexed like the table, the number of
+        processes), None for a single process
+    :ivar __rates: The event rates of the functions shown next to their names, name -> events per second
+    :ivar __demangler: The Demangler of the names shown and filtered, None to show the names as they are
+    :ivar __widgets: LRU cache of the row widgets, position -> ((name, status, selected), widget)
+    :ivar __on_select: The callback given to the row widgets
     :ivar __on_change: The callback that is called when there is a change in the list (called by notify_change)
+    :cvar WIDGET_CACHE_SIZE: The maximum number of row widgets kept in the cache
     """
+    WIDGET_CACHE_SIZE = 1024
 
-    def __init__(self, function_list, fil=None, on_change=None):
+    def __init__(self, function_list, fil=None, on_change=None, counts=None, rates=None, demangler=None):
         """
-        :param function_list: The list of functions to show
+        :param function_list: The FunctionTable of the functions to show
         :param fil: The filter object to use
         :param on_change: The callback
+        :param counts: The per-process active counts of a Fleet, see Fleet.snapshot, None for a single process
+        :param rates: The event rates of the functions, name -> events per second, None to not show rates
+        :param demangler: The Demangler of the names shown and filtered, None to show the names as they are
         """
-        self.__function_list = function_list
+        self.__table = function_list
+        self.__counts = counts
+        self.__rates = rates or {}
+        self.__demangler = demangler
         if fil is None:
             self.__filter = Filter()
         else:
             self.__filter = fil
-        self.__function_names = sorted([f for f in function_list])
-        self.__selected = set()
+        self.__matching = []
+        self.__names = function_list.names
+        self.__index = NameIndex()
+        self.__build_index()
+        self.__widgets = OrderedDict()
+        self.__on_select = partial(FilterFunctionWalker.__on_function_select, self)
         self.focus = self.__get_first_matching(0, False)
         self.__on_change = on_change
 
     def __getitem__(self, item):
-        w = SelectableFunctionText(self.__function_names[item], self.__function_list[self.__function_names[item]],
-                                   partial(FilterFunctionWalker.__on_function_select, self))
-        if self.__function_names[item] in self.__selected:
-            if self.__function_list[self.__function_names[item]]:
-                return uw.AttrMap(w, 'function.active.selected', 'function.active.selected.focus')
+        table = self.__table
+        name = table.names[item]
+        active = table.active[item] == 1
+        selected = table.selected[item] == 1
+        if self.__counts is None:
+            status = (active, None, 1)
+        else:
+            counts, processes = self.__counts
+            status = (active, counts[item], processes)
+        key = (name, status, selected)
+        cached = self.__widgets.get(item)
+        if cached is not None and cached[0] == key:
+            self.__widgets.move_to_end(item)
+            return cached[1]
+
+        label = None if self.__demangler is None else self.labels[item]
+        w = SelectableFunctionText(name, active, self.__on_select, status[1], status[2], self.__rates.get(name), label)
+        if selected:
+            if active:
+                w = uw.AttrMap(w, 'function.active.selected', 'function.active.selected.focus')
             else:
-                return uw.AttrMap(w, 'function.selected', 'function.selected.focus')
+                w = uw.AttrMap(w, 'function.selected', 'function.selected.focus')
         else:
-            if self.__function_list[self.__function_names[item]]:
-                return uw.AttrMap(w, 'function.active', 'function.active.focus')
+            if active:
+                w = uw.AttrMap(w, 'function.active', 'function.active.focus')
             else:
-                return uw.AttrMap(w, 'function', 'function.focus')
+                w = uw.AttrMap(w, 'function', 'function.focus')
+
+        self.__widgets[item] = (key, w)
+        self.__widgets.move_to_end(item)
+        if len(self.__widgets) > FilterFunctionWalker.WIDGET_CACHE_SIZE:
+            self.__widgets.popitem(last=False)
+        return w
 
     def next_position(self, position):
-        pos = self.__get_first_matching(position + 1, False)
-        if pos is None:
+        i = bisect_right(self.__matching, position)
+        if i == len(self.__matching):
             raise IndexError()
-        return pos
+        return self.__matching[i]
 
     def prev_position(self, position):
-        pos = self.__get_first_matching(position - 1, True)
-        if pos is None:
+        i = bisect_left(self.__matching, position)
+        if i == 0:
             raise IndexError()
-        return pos
+        return self.__matching[i - 1]
 
     def set_focus(self, position):
         self.focus = position
-        self.notify_change()
+        self.__notify()
 
-    def notify_change(self):
+    def notify_change(self, changed=None):
         """
         Owning object must call this whenever there is a change to the filter or the function_list.
         It will notify the UI of the update.
         This function will call __on_change()
+        :param changed: The names of the functions whose status changed, None to re-apply the filter to every function
         """
+        if self.__table.names is not self.__names:
+            # The table was reloaded (functions were added), the positions moved: the focus follows its function
+            focused = self.__names[self.focus] if self.focus is not None and self.focus < len(self.__names) else None
+            position = -1 if focused is None else self.__table.find(focused)
+            self.focus = None if position < 0 else position
+            self.__widgets.clear()
+            changed = None
+        if changed is None:
+            with STATS.timer('ui.filter'):
+                self.__build_index()
+        else:
+            with STATS.timer('ui.update'):
+                for name in changed:
+                    self.__update_index(name)
+                    self.__invalidate_widget(name)
         if self.focus is None:
             self.focus = self.__get_first_matching(0, False)
         else:
@@ -140,6 +206,54 @@ class FilterFunctionWalker(uw.ListWalker):
             self.focus = self.__get_first_matching(current, True)
             if self.focus is None:
                 self.focus = self.__get_first_matching(current, False)
+        self.__notify()
+
+    def set_counts(self, counts):
+        """
+        Replaces the per-process active counts, notify_change must be called after
+        :param counts: The per-process active counts of a Fleet, see Fleet.snapshot, None for a single process
+        """
+        self.__counts = counts
+
+    @property
+    def labels(self):
+        """
+        Read-only property of the names shown and filtered
+        :return: The list of the names, demangled if there is a demangler, indexed like the FunctionTable
+        """
+        if self.__demangler is None:
+            return self.__table.names
+        return self.__demangler.demangle(self.__table.names)
+
+    def chosen(self):
+        """
+        Gets the selected functions that respect the filter's library and regex
+        :return: The list of their names
+        """
+        table = self.__table
+        labels = self.labels
+        return [table.names[i] for i, s in enumerate(table.selected) if s and self.__filter(labels[i])]
+
+    @property
+    def matching(self):
+        """
+        Read-only property of the functions that respect the filter
+        :return: The sorted list of their positions in the FunctionTable
+        """
+        return list(self.__matching)
+
+    def set_filter(self, fil):
+        """
+        Replaces the filter and re-applies it
+        :param fil: The new filter object
+        """
+        self.__filter = fil
+        self.notify_change()
+
+    def __notify(self):
+        """
+        Notifies the ListBox and calls __on_change()
+        """
         self._modified()
         if self.__on_change is not None:
             self.__on_change()
@@ -152,22 +266,21 @@ class FilterFunctionWalker(uw.ListWalker):
         position starts at 1.
         :return: (position, total)
         """
-        total = 0
+        total = len(self.__matching)
         pos = None
-        for i, f in enumerate(self.__function_names):
-            if self.__filter(f, self.__function_list[f], f in self.__selected):
-                total += 1
-                if i == self.focus:
-                    pos = total
+        if self.focus is not None:
+            i = bisect_left(self.__matching, self.focus)
+            if i < total and self.__matching[i] == self.focus:
+                pos = i + 1
         return pos, total
 
     @property
     def selected(self):
         """
         Read-only property that gets the current selection
-        :return: The current selection
+        :return: The list of the selected function names
         """
-        return self.__selected
+        return self.__table.selected_names()
 
     def __get_first_matching(self, start_position, reverse):
         """
@@ -177,62 +290,253 @@ class FilterFunctionWalker(uw.ListWalker):
         :return: The next position, None if none found
         """
         if reverse:
-            iterable = reversed(range(start_position + 1))
-        else:
-            iterable = range(start_position, len(self.__function_names))
-        for i in iterable:
-            if self.__filter(self.__function_names[i],
-                             self.__function_list[self.__function_names[i]],
-                             self.__function_names[i] in self.__selected):
-                return i
-        return None
+            i = bisect_right(self.__matching, start_position)
+            if i == 0:
+                return None
+            return self.__matching[i - 1]
+        i = bisect_left(self.__matching, start_position)
+        if i == len(self.__matching):
+            return None
+        return self.__matching[i]
+
+    def __matches(self, position):
+        """
+        Applies the filter to the function at a position
+        :param position: The position of the function
+        :return: True if the function respects the filter
+        """
+        table = self.__table
+        return self.__filter(self.labels[position], table.active[position] == 1, table.selected[position] == 1)
+
+    def __build_index(self):
+        """
+        Re-applies the filter to every function to rebuild the list of matching positions
+        """
+        fil = self.__filter
+        table = self.__table
+        labels = self.labels
+        self.__names = table.names
+        candidates = self.__index.candidates(labels, fil.literal)
+        self.__matching = fil.select(labels, table.active, table.selected, candidates)
+
+    def __update_index(self, name):
+        """
+        Re-applies the filter to a single function and updates the list of matching positions
+        :param name: The name of the function
+        """
+        position = self.__table.find(name)
+        if position < 0:
+            return
+        i = bisect_left(self.__matching, position)
+        present = i < len(self.__matching) and self.__matching[i] == position
+        if self.__matches(position):
+            if not present:
+                self.__matching.insert(i, position)
+        elif present:
+            del self.__matching[i]
+
+    def __invalidate_widget(self, name):
+        """
+        Drops the cached row widget of a function, if any
+        :param name: The name of the function
+        """
+        self.__widgets.pop(self.__table.find(name), None)
 
     def __on_function_select(self, name):
         """
         Callback called by the SelectableFunctionText when selected
         :param name: The name of the function
         """
-        if name in self.__selected:
-            self.__selected.remove(name)
-        else:
-            self.__selected.add(name)
-        self.notify_change()
+        i = self.__table.index(name)
+        self.__table.selected[i] ^= 1
+        self.notify_change([name])
 
     def select_all(self):
         """
         Selects all filtered items
         """
-        for f in self.__function_list:
-            if self.__filter(f, self.__function_list[f], False):
-                self.__selected.add(f)
+        table = self.__table
+        for i, (f, a) in enumerate(zip(self.labels, table.active)):
+            if self.__filter(f, a == 1, False):
+                table.selected[i] = 1
         self.notify_change()
 
     def clear_selection(self):
         """
         Deselects all filtered items
         """
-        for f in self.__function_list:
-            if self.__filter(f, self.__function_list[f], True):
-                try:
-                    self.__selected.remove(f)
-                except KeyError:
-                    pass
+        table = self.__table
+        for i, (f, a) in enumerate(zip(self.labels, table.active)):
+            if self.__filter(f, a == 1, True):
+                table.selected[i] = 0
         self.notify_change()
 
 
+class ScopeWidget(uw.TreeWidget):
+    """
+    Row of the tree view, a scope with the number of its active functions or a function with its status.
+    The scopes are collapsed at first, their children are only computed when they are expanded.
+    """
+    def __init__(self, node):
+        """
+        :param node: The ScopeNode or FunctionNode
+        """
+        super().__init__(node)
+        if not self.is_leaf:
+            self.expanded = node.expanded
+            self.update_expanded_icon()
+
+    def selectable(self):
+        return True
+
+    def load_inner_widget(self):
+        label, active = self.get_node().describe()
+        if active:
+            return uw.AttrMap(uw.Text(label), 'function.active', 'function.active.focus')
+        return uw.AttrMap(uw.Text(label), 'function', 'function.focus')
+
+    def keypress(self, size, key):
+        if not self.is_leaf and (key == 'enter' or key == ' '):
+            key = '-' if self.expanded else '+'
+        key = super().keypress(size, key)
+        if not self.is_leaf:
+            self.get_node().expanded = self.expanded
+        return key
+
+
+class FunctionNode(uw.TreeNode):
+    """
+    Function of the tree view, its value is its position in the FunctionTable
+    :ivar __table: The FunctionTable
+    :ivar __label: The name shown
+    """
+    def __init__(self, table, position, parent, key, label):
+        """
+        :param table: The FunctionTable
+        :param position: The position of the function in the table
+        :param parent: The ScopeNode of the function
+        :param key: The key of the node in its parent
+        :param label: The name shown, e.g. the demangled name
+        """
+        super().__init__(position, parent=parent, key=key, depth=parent.get_depth() + 1)
+        self.__table = table
+        self.__label = label
+
+    def load_widget(self):
+        return ScopeWidget(self)
+
+    def describe(self):
+        """
+        :return: (the label of the row, True if the function is active)
+        """
+        active = self.__table.active[self.get_value()] == 1
+        return self.__label + ' ' + function_status(active), active
+
+    def functions(self):
+        """
+        :return: The positions in the FunctionTable of the functions of the node
+        """
+        return [self.get_value()]
+
+
+class ScopeNode(uw.ParentNode):
+    """
+    Namespace or class of the tree view, its value is its Scope
+    :ivar expanded: True if the scope is expanded, kept by the node so that the rows can be rebuilt
+    :ivar __tree: The ScopeTree
+    :ivar __table: The FunctionTable
+    :ivar __labels: The names shown for the functions, indexed like the FunctionTable
+    :ivar __loaded: The child nodes made so far
+    :ivar __scopes: The child scopes, name -> Scope, set when the child keys are loaded
+    """
+    def __init__(self, tree, table, scope, parent=None, key=None, labels=None):
+        """
+        :param tree: The ScopeTree
+        :param table: The FunctionTable
+        :param scope: The Scope of the node
+        :param parent: The parent ScopeNode, None for the root
+        :param key: The key of the node in its parent
+        :param labels: The names shown for the functions, e.g. the demangled names, None to show the names
+        """
+        super().__init__(scope, parent=parent, key=key, depth=0 if parent is None else parent.get_depth() + 1)
+        self.__tree = tree
+        self.__table = table
+        self.__labels = table.names if labels is None else labels
+        self.__loaded = []
+        self.__scopes = {}
+        self.expanded = parent is None
+
+    @property
+    def tree(self):
+        """
+        Read-only property of the tree of the node
+        :return: The ScopeTree
+        """
+        return self.__tree
+
+    def load_widget(self):
+        return ScopeWidget(self)
+
+    def load_child_keys(self):
+        scopes, functions = self.__tree.children(self.get_value())
+        self.__scopes = {s.name: s for s in scopes}
+        # Scopes and functions can have the same name
+        return [('scope', s.name) for s in scopes] + [('function', p) for p in functions]
+
+    def load_child_node(self, key):
+        kind, value = key
+        if kind == 'scope':
+            node = ScopeNode(self.__tree, self.__table, self.__scopes[value], self, key, self.__labels)
+        else:
+            node = FunctionNode(self.__table, value, self, key, self.__labels[value])
+        self.__loaded.append(node)
+        return node
+
+    def describe(self):
+        """
+        :return: (the label of the row, True if one of its functions is active)
+        """
+        scope = self.get_value()
+        count, total = self.__tree.count(scope, self.__table.active)
+        name = scope.name or 'All functions'
+        return '%s (%d/%d active)' % (name, count, total), count > 0
+
+    def functions(self):
+        """
+        :return: The positions in the FunctionTable of the functions of the scope and of its children
+        """
+        return self.__tree.functions(self.get_value())
+
+    def reload_widgets(self):
+        """
+        Rebuilds the rows of the node and of the child nodes made so far, to show the current status of their
+        functions
+        """
+        nodes = [self]
+        while nodes:
+            node = nodes.pop()
+            node.get_widget(reload=True)
+            if isinstance(node, ScopeNode):
+                nodes += node.__loaded
+
+
 class FilterEdit(uw.Edit):
     """
-    Edit for the filter, simply calls the done_callback when pressing enter or esc
+    Edit for the filter, calls the done_callback when pressing enter or esc and the change_callback when the text
+    changes
     :ivar __done_callback: The callback to call on enter or esc
     """
-    def __init__(self, done_callback, *args, **kwargs):
+    def __init__(self, done_callback, *args, change_callback=None, **kwargs):
         """
         :param done_callback: The callback to call on enter or esc
         :param args: The args to pass to urwid.Edit.__init__
+        :param change_callback: The callback to call with the new text when it changes, None for none
         :param kwargs: The kwargs to pass urwid.Edit.__init__
         """
         super().__init__(*args, **kwargs)
         self.__done_callback = done_callback
+        if change_callback is not None:
+            uw.connect_signal(self, 'postchange', lambda _, __: change_callback(self.get_edit_text()))
 
     def keypress(self, size, key):
         if key == 'enter':
@@ -245,9 +549,27 @@ class FilterEdit(uw.Edit):
         return super().keypress(size, key)
 
 
+class TimedMainLoop(uw.MainLoop):
+    """
+    Main loop that records the time spent drawing the screen and handling the keys
+    """
+
+    def draw_screen(self):
+        with STATS.timer('ui.render'):
+            super().draw_screen()
+
+    def process_input(self, keys):
+        with STATS.timer('ui.input'):
+            return super().process_input(keys)
+
+
 class Ui:
     """
-    Ui class, runs the UI loop
+    Ui class, runs the UI loop.
+    The requests to the server are done by a CommunicatorWorker, the results are handled in the UI loop
+    through a pipe watched by urwid.
+    In live mode, the server is polled for changes made by other clients. The polling interval is reset to
+    POLL_MIN_INTERVAL when changes are seen and doubles up to POLL_MAX_INTERVAL when nothing changes.
     """
     PALETTE = [
         ('function', 'white', 'black'),
@@ -268,7 +590,9 @@ class Ui:
                 "    The options are\n" \
                 "      [active:nopped] for the status of the functions\n" \
                 "      [selected:unselected] for the current selection\n" \
-                "    press enter to apply filter\n" \
+                "      [lib=NAME] for the functions of a library\n" \
+                "    the list is filtered while typing\n" \
+                "    press enter to go back to the list\n" \
                 "    press esc to clear filter\n\n" \
                 "'s'\n" \
                 "  to select all filtered\n\n" \
@@ -276,24 +600,58 @@ class Ui:
                 "  to clear all filtered selection\n\n" \
                 "'a/d'\n" \
                 "  to activate/deactivate the selected functions\n\n" \
+                "'t'\n" \
+                "  to activate the selected functions for a while\n\n" \
+                "'v'\n" \
+                "  to switch between the list and the tree of the namespaces and classes\n" \
+                "  (enter to expand a scope, a/d/t then set all its functions)\n\n" \
                 "'r'\n" \
                 "  to refresh the function list\n\n" \
+                "'b'\n" \
+                "  to show the functions of the next library\n\n" \
                 "'q'/'Ctrl+c'\n" \
                 "  to quit"
 
     MINI_HELP_TEXT = "Press 'h' or '?' for help"
 
-    def __init__(self, communicator):
+    POLL_MIN_INTERVAL = 0.5
+    POLL_MAX_INTERVAL = 8.0
+    DEFAULT_WINDOW = 5.0
+    WINDOW_REFRESH_DELAY = 0.1
+
+    def __init__(self, communicator, live=False, rates=None, window=None, demangler=None):
+        """
+        :param communicator: The connected Communicator or Fleet
+        :param live: True to poll the server for changes
+        :param rates: The event rates of the functions shown next to their names, name -> events per second
+        :param window: Seconds during which 't' activates the functions, None for DEFAULT_WINDOW
+        :param demangler: The Demangler of the names shown and filtered, None to show the names as they are
+        """
         self.comm = communicator
+        # The ui's own copy of the function list, the worker thread updates the communicator's
+        self.table, counts = communicator.snapshot()
+        self.worker = CommunicatorWorker(self.comm, partial(Ui.__wake_up, self))
+        self.live = live
+        self.window = Ui.DEFAULT_WINDOW if window is None else window
+        self.poll_interval = Ui.POLL_MIN_INTERVAL
+        self.__polling = False
+        self.__title = None
+        self.__pending_filter = None
+        self.__filter_alarm = None
+        self.ui_tree = None
+        self.ui_tree_box = None
 
         self.filter = Filter()
-        self.func_list_walker = FilterFunctionWalker(self.comm.function_list,
+        self.func_list_walker = FilterFunctionWalker(self.table,
                                                      self.filter,
-                                                     partial(Ui.__handle_list_change, self))
+                                                     partial(Ui.__handle_list_change, self),
+                                                     counts,
+                                                     rates, demangler)
         self.ui_func_list = make_enableable(uw.ListBox(self.func_list_walker))
         self.ui_func_list_box = uw.LineBox(self.ui_func_list)
         self.ui_filter_edit = uw.AttrMap(
-            make_enableable(FilterEdit(partial(Ui.__edit_is_done, self))), 'edit.normal')
+            make_enableable(FilterEdit(partial(Ui.__edit_is_done, self),
+                                       change_callback=partial(Ui.__filter_changed, self))), 'edit.normal')
         self.func_list_walker.notify_change()
         self.ui_filter_edit_box = uw.AttrMap(uw.LineBox(uw.Filler(self.ui_filter_edit)), 'edit.normal')
         self.ui_filter_edit.base_widget.disable()
@@ -305,23 +663,112 @@ class Ui:
 
         self.top = uw.Padding(self.main, left=1, right=1)
 
-        self.loop = uw.MainLoop(self.top,
-                                palette=Ui.PALETTE,
-                                unhandled_input=partial(Ui.__handle_keyboard, self))
+        self.loop = TimedMainLoop(self.top,
+                                  palette=Ui.PALETTE,
+                                  unhandled_input=partial(Ui.__handle_keyboard, self))
+        self.worker_pipe = self.loop.watch_pipe(partial(Ui.__handle_worker_done, self))
 
     def run(self):
-        self.loop.run()
+        self.worker.start()
+        if self.live:
+            self.loop.set_alarm_in(self.poll_interval, partial(Ui.__poll, self))
+        try:
+            self.loop.run()
+        finally:
+            self.worker.stop()
+            self.loop.remove_watch_pipe(self.worker_pipe)
+
+    def __wake_up(self):
+        """
+        Called by the worker thread, wakes up the UI loop to handle the results
+        """
+        os.write(self.worker_pipe, b'\n')
+
+    def __handle_worker_done(self, _):
+        """
+        Handles the results of the worker in the UI loop, the ui's function list is updated from the snapshots of the
+        worker here, never while the list is drawn
+        :raise CommunicatorException: If a request failed
+        :return: True to keep watching the pipe
+        """
+        any_changed = False
+        for changed, error, snapshot in self.worker.results():
+            if error is not None:
+                raise error
+            table, counts = snapshot
+            reloaded = table.names is not self.table.names
+            self.table.update_from(table)
+            self.func_list_walker.set_counts(counts)
+            if changed or reloaded:
+                any_changed = True
+                self.func_list_walker.notify_change(changed)
+                if self.ui_tree is not None:
+                    self.__update_tree()
+        if self.__polling and not self.worker.pending:
+            self.__polling = False
+            if any_changed:
+                self.poll_interval = Ui.POLL_MIN_INTERVAL
+            else:
+                self.poll_interval = min(self.poll_interval * 2, Ui.POLL_MAX_INTERVAL)
+            self.loop.set_alarm_in(self.poll_interval, partial(Ui.__poll, self))
+        self.__handle_list_change()
+        return True
+
+    def __poll(self, *_):
+        """
+        Alarm callback of the live mode, queues a refresh
+        """
+        self.__polling = True
+        self.worker.refresh()
+
+    def __refresh(self, *_):
+        """
+        Alarm callback, queues a refresh
+        """
+        self.worker.refresh()
+        self.__handle_list_change()
+
+    def __filter_changed(self, text):
+        """
+        Called when the filter text changes, the filter is applied once the pending keys are handled so that a burst
+        of keys applies it once. An invalid filter, e.g. a regex being typed, is shown and the list is kept.
+        :param text: The new filter text
+        """
+        try:
+            fil = Filter(text)
+        except ValueError:
+            self.ui_filter_edit_box.set_attr_map({None: 'edit.error'})
+            return
+        self.ui_filter_edit_box.set_attr_map({None: 'edit.normal'})
+        self.__pending_filter = fil
+        if self.__filter_alarm is None:
+            self.__filter_alarm = self.loop.set_alarm_in(0, partial(Ui.__apply_filter, self))
+
+    def __apply_filter(self, *_):
+        """
+        Alarm callback, applies the last valid filter typed
+        """
+        if self.__filter_alarm is not None:
+            self.loop.remove_alarm(self.__filter_alarm)
+            self.__filter_alarm = None
+        if self.__pending_filter is not None:
+            self.filter = self.__pending_filter
+            self.__pending_filter = None
+            self.func_list_walker.set_filter(self.filter)
+            if self.ui_tree is not None:
+                self.__show_tree()
 
     def __edit_is_done(self):
         try:
-            self.filter.filter = self.ui_filter_edit.base_widget.get_edit_text()
-            self.func_list_walker.notify_change()
-            self.ui_func_list.enable()
-            self.ui_filter_edit.base_widget.disable()
-            self.main.set_focus(0)
-            self.ui_filter_edit_box.set_attr_map({None: 'edit.normal'})
+            Filter(self.ui_filter_edit.base_widget.get_edit_text())
         except ValueError:
             self.ui_filter_edit_box.set_attr_map({None: 'edit.error'})
+            return
+        self.__apply_filter()
+        self.__shown_list().enable()
+        self.ui_filter_edit.base_widget.disable()
+        self.main.set_focus(0)
+        self.ui_filter_edit_box.set_attr_map({None: 'edit.normal'})
 
     def __handle_keyboard(self, key):
         if key == 'q':
@@ -332,7 +779,7 @@ class Ui:
         elif key == 'h' or key == '?':
             self.top.original_widget = self.ui_help
         elif key == 'f' or key == '/':
-            self.ui_func_list.disable()
+            self.__shown_list().disable()
             self.ui_filter_edit.base_widget.enable()
             self.main.set_focus(1)
         elif key == 's':
@@ -340,19 +787,119 @@ class Ui:
         elif key == 'c':
             self.func_list_walker.clear_selection()
         elif key == 'a':
-            funcs = {f: True for f in self.func_list_walker.selected if self.filter(f)}
-            self.comm.function_list = funcs
-            self.func_list_walker.notify_change()
+            funcs = {f: True for f in self.__chosen_functions()}
+            if funcs:
+                self.worker.set_functions(funcs)
+            self.__handle_list_change()
         elif key == 'd':
-            funcs = {f: False for f in self.func_list_walker.selected if self.filter(f)}
-            self.comm.function_list = funcs
-            self.func_list_walker.notify_change()
+            funcs = {f: False for f in self.__chosen_functions()}
+            if funcs:
+                self.worker.set_functions(funcs)
+            self.__handle_list_change()
+        elif key == 't':
+            funcs = {f: True for f in self.__chosen_functions()}
+            if funcs:
+                self.worker.set_functions(funcs, self.window)
+                # The server sets them back by itself, the list is refreshed to show it
+                self.loop.set_alarm_in(self.window + Ui.WINDOW_REFRESH_DELAY, partial(Ui.__refresh, self))
+            self.__handle_list_change()
         elif key == 'r':
-            self.comm.refresh()
-            self.func_list_walker.notify_change()
+            self.worker.refresh()
+            self.__handle_list_change()
+        elif key == 'v':
+            if self.ui_tree is None:
+                self.__show_tree()
+            else:
+                self.__show_list()
+        elif key == 'b':
+            groups = [None, ''] + self.comm.loaded_libraries
+            current = self.filter.library
+            i = groups.index(current) if current in groups else 0
+            self.__show_library(groups[(i + 1) % len(groups)])
+
+    def __chosen_functions(self):
+        """
+        Gets the functions the keys act on: the filtered selection of the list, or the functions of the scope in focus
+        in the tree, in one request
+        :return: The list of the function names
+        """
+        if self.ui_tree is None:
+            return self.func_list_walker.chosen()
+        _, node = self.ui_tree.body.get_focus()
+        names = self.table.names
+        return [names[p] for p in node.functions()]
+
+    def __shown_list(self):
+        """
+        :return: The list box shown, the tree or the list
+        """
+        return self.ui_func_list if self.ui_tree is None else self.ui_tree
+
+    def __show_box(self, box):
+        """
+        Shows a list box in place of the other one
+        :param box: The LineBox around it
+        """
+        self.main.contents[0] = (box, self.main.contents[0][1])
+        self.__title = None
+        self.__handle_list_change()
+
+    def __show_tree(self):
+        """
+        Shows the tree of the namespaces and classes of the filtered functions, built again from the filtered list
+        """
+        table = self.table
+        tree = ScopeTree(table.names, self.func_list_walker.matching)
+        root = ScopeNode(tree, table, tree.root, labels=self.func_list_walker.labels)
+        self.ui_tree = make_enableable(uw.TreeListBox(uw.TreeWalker(root)))
+        self.ui_tree_box = uw.LineBox(self.ui_tree)
+        self.__show_box(self.ui_tree_box)
+
+    def __show_list(self):
+        """
+        Shows the list of the filtered functions in place of the tree
+        """
+        self.ui_tree = None
+        self.ui_tree_box = None
+        self.__show_box(self.ui_func_list_box)
+
+    def __update_tree(self):
+        """
+        Shows the current status of the functions in the tree, the tree is built again if the function list changed
+        """
+        _, node = self.ui_tree.body.get_focus()
+        root = node.get_root()
+        if self.table.names is not root.tree.names:
+            self.__show_tree()
+            return
+        root.reload_widgets()
+        self.ui_tree.body.set_focus(node)
+
+    def __show_library(self, lib):
+        """
+        Replaces the library op of the filter, the other ops and the regex are kept
+        :param lib: None for every library, '' for the main program, else the file name of the library
+        """
+        ops = self.ui_filter_edit.base_widget.get_edit_text().split(':')
+        ops = [op for op in ops[:-1] if not op.startswith('lib=')] + ops[-1:]
+        if lib is not None:
+            ops.insert(0, 'lib=' + lib)
+        self.ui_filter_edit.base_widget.set_edit_text(':'.join(ops))
+        self.__edit_is_done()
 
     def __handle_list_change(self):
-        pos, total = self.func_list_walker.position
-        if pos is None:
-            pos = 0
-        self.ui_func_list_box.set_title('Item %s of %s' % (pos, total))
+        if self.ui_tree is None:
+            pos, total = self.func_list_walker.position
+            if pos is None:
+                pos = 0
+            title = 'Item %s of %s' % (pos, total)
+        else:
+            _, node = self.ui_tree.body.get_focus()
+            title = 'Tree of %d functions' % len(node.get_root().tree.positions)
+        if self.filter.library is not None:
+            title += ' in %s' % (self.filter.library or 'the main program')
+        if self.worker.pending:
+            title += ' (updating...)'
+        if title != self.__title:
+            self.__title = title
+            (self.ui_func_list_box if self.ui_tree is None else self.ui_tree_box).set_title(title)
@@ -1,35 +1,71 @@
 
 import re
 
+LIBRARY_SEPARATOR = '@'
+
+
+def qualify_name(name, lib=None):
+    """
+    Gets the name of a function in the client, the functions of a shared library are named function@library
+    :param name: The name of the function in its binary
+    :param lib: The file name of the library, None for the main program
+    :return: The qualified name
+    """
+    if lib is None:
+        return name
+    return name + LIBRARY_SEPARATOR + lib
+
+
+def split_name(name):
+    """
+    Splits a qualified function name, the reverse of qualify_name
+    :param name: The qualified name
+    :return: (name of the function in its binary, file name of the library or None for the main program)
+    """
+    func, sep, lib = name.rpartition(LIBRARY_SEPARATOR)
+    if not sep or not func or not lib:
+        return name, None
+    return func, lib
+
 
 class Filter:
     """
-    Function filter, used to filter function based on status, selection and name.
+    Function filter, used to filter function based on status, selection, library and name.
     :ivar __status_filter: None for no filter, 'active' for active functions, 'nopped' for nopped functions
     :ivar __selected filter: None for no filter, 'selected' for selected functions,
         'unselected' for un-selected functions
-    :ivar __regex: The regex for the function name, empty or None for no filter
+    :ivar __library_filter: None for no filter, '' for the main program, else the file name of a library
+    :ivar __regex: The regex for the function name (without its library), empty or None for no filter
+    :ivar __literal: The longest literal the function name must contain to match the regex, '' if none
     :cvar filter: The filter property, uses the __set_filter function to modify the filter
+    :cvar OPS: The op's, apart from lib=NAME
     The filter's format is:
         [op1]:[op2]:[regex]
         Where op1 and op2 can be:
             active/nopped: To filter based on the function's status
             selected/unselected: To filter based on the current selection
+            lib=NAME: To filter the functions of the shared library NAME, lib= alone for the main program
         The regex must follow the Python's regex rules.
         All the parameters are optional, an empty filters accepts all, the op's must be followed by the ':' character
+        Everything after the leading op's is the regex, it can contain ':' (e.g. ns::func with the demangled names)
         Examples:
             active:-> Filters currently active functions
             active:do_.*-> Filters currently active functions witht the name that respects 'do_.*'
             nopped:selected:-> Filters currently nopped functions that are selected
             nopped:unselected:main-> Filters currently nopped functions that are not selected and that start with 'main'
+            lib=libplugin.so:init-> Filters the functions of libplugin.so with a name containing 'init'
     """
+    OPS = ('active', 'nopped', 'selected', 'unselected')
+
     def __init__(self, regex=None):
         """
         :param regex: The filter to apply.
         """
         self.__status_filter = None
         self.__selected_filter = None
+        self.__library_filter = None
         self.__regex = None
+        self.__literal = ''
         if regex is not None:
             self.filter = regex
 
@@ -41,15 +77,22 @@ class Filter:
         """
         if regex is None:
             self.__status_filter = None
+            self.__library_filter = None
             self.__regex = None
+            self.__literal = ''
             return
 
+        # The leading ops, the regex may contain ':' (e.g. the demangled names)
         split = regex.split(':')
-        regex = split[-1]
-        split = split[:-1]
+        ops = 0
+        while ops < len(split) - 1 and Filter.__is_op(split[ops]):
+            ops += 1
+        regex = ':'.join(split[ops:])
+        split = split[:ops]
 
         self.__status_filter = None
         self.__selected_filter = None
+        self.__library_filter = None
         for s in split:
             if s == 'active':
                 if self.__status_filter is not None:
@@ -67,19 +110,193 @@ class Filter:
                 if self.__selected_filter is not None:
                     raise ValueError()
                 self.__selected_filter = 'unselected'
+            elif s.startswith('lib='):
+                if self.__library_filter is not None:
+                    raise ValueError()
+                self.__library_filter = s[len('lib='):]
             else:
                 raise ValueError()
         try:
             self.__regex = re.compile(regex)
         except re.error:
             raise ValueError()
+        self.__literal = max(Filter.__required_literals(regex), key=len, default='')
+
+    @staticmethod
+    def __is_op(text):
+        """
+        :param text: A part of the filter before a ':'
+        :return: True if it is an op
+        """
+        return text in Filter.OPS or text.startswith('lib=')
 
     filter = property(fset=__set_filter)
 
+    @property
+    def library(self):
+        """
+        Read-only property of the library filter
+        :return: None for no filter, '' for the main program, else the file name of the library
+        """
+        return self.__library_filter
+
+    @property
+    def literal(self):
+        """
+        Read-only property of the longest literal the function name must contain, to narrow the functions the
+        filter is applied to (see search.NameIndex)
+        :return: The literal, '' if the regex doesn't require one
+        """
+        return self.__literal
+
+    REGEX_SPECIAL = '.^$*+?{}[]\\|()'
+    GLOB_SPECIAL = '*?[\\'
+    # The size of the server's buffer of the pattern, with its terminating null byte
+    SERVER_MATCH_SIZE = 256
+
+    def server_query(self):
+        """
+        Translates the filter into the query parameters of the server's function list, so that only the functions
+        that can match are sent. The status and the library are always translated, the regex only if it is made of
+        literal characters, '.', '.*' and the '^' and '$' anchors, and if the pattern fits in the server's buffer.
+        The selection is unknown to the server.
+        :return: (query parameters, True if the server applies the whole filter)
+        """
+        query = {}
+        exact = self.__selected_filter is None
+        if self.__status_filter is not None:
+            query['status'] = self.__status_filter
+        if self.__library_filter:
+            query['lib'] = self.__library_filter
+        if self.__regex is not None and self.__regex.pattern:
+            glob = Filter.__to_glob(self.__regex.pattern)
+            if glob is None or len(glob.encode()) >= Filter.SERVER_MATCH_SIZE:
+                exact = False
+            elif glob != '*':
+                query['match'] = glob
+        return query, exact
+
+    @staticmethod
+    def __to_glob(regex):
+        """
+        Translates a regex used with re.search into an fnmatch pattern
+        :param regex: The regex
+        :return: The pattern, None if the regex can't be translated or only matches the empty name (the server
+            takes an empty pattern as no pattern)
+        """
+        anchored_start = regex.startswith('^')
+        if anchored_start:
+            regex = regex[1:]
+        anchored_end = regex.endswith('$') and not regex.endswith('\\$')
+        if anchored_end:
+            regex = regex[:-1]
+
+        glob = ''
+        i = 0
+        while i < len(regex):
+            c = regex[i]
+            if c == '\\':
+                if i + 1 == len(regex) or regex[i + 1] not in Filter.REGEX_SPECIAL:
+                    return None
+                c = regex[i + 1]
+                glob += '[' + c + ']' if c in Filter.GLOB_SPECIAL else c
+                i += 2
+            elif c == '.':
+                if regex[i + 1:i + 2] == '*':
+                    glob += '*'
+                    i += 2
+                else:
+                    glob += '?'
+                    i += 1
+            elif c in Filter.REGEX_SPECIAL:
+                return None
+            else:
+                glob += '[' + c + ']' if c in Filter.GLOB_SPECIAL else c
+                i += 1
+
+        if not anchored_start:
+            glob = '*' + glob
+        if not anchored_end:
+            glob += '*'
+        while '**' in glob:
+            glob = glob.replace('**', '*')
+        return glob or None
+
+    @staticmethod
+    def __required_literals(regex):
+        """
+        Finds the literals a string must contain to match a regex with re.search. Only the runs of literal characters
+        before the first group or set are looked at, nothing is required by a regex with alternatives or flags.
+        :param regex: The regex
+        :return: The list of the literals
+        """
+        if '|' in regex or '(?' in regex:
+            return []
+        literals = []
+        run = ''
+        i = 0
+        while i < len(regex):
+            c = regex[i]
+            if c == '\\':
+                if i + 1 == len(regex) or regex[i + 1] not in Filter.REGEX_SPECIAL:
+                    # A class like \d or \w
+                    literals.append(run)
+                    run = ''
+                else:
+                    run += regex[i + 1]
+                i += 2
+                continue
+            if c in '*?':
+                # The previous character is optional
+                literals.append(run[:-1])
+                run = ''
+            elif c == '+':
+                literals.append(run)
+                run = ''
+            elif c in '([{':
+                # The previous character may be repeated by a {m,n}
+                literals.append(run[:-1] if c == '{' else run)
+                run = ''
+                break
+            elif c in Filter.REGEX_SPECIAL:
+                literals.append(run)
+                run = ''
+            else:
+                run += c
+            i += 1
+        literals.append(run)
+        return [l for l in literals if l]
+
+    def select(self, names, active, selected, positions=None):
+        """
+        Applies the filter to many functions, faster than calling it on each one
+        :param names: The qualified names of the functions, e.g. FunctionTable.names
+        :param active: The active state of each function, 1 if active
+        :param selected: The selection state of each function, 1 if selected
+        :param positions: The sorted positions of the functions to filter, None for all of them
+        :return: The sorted list of the positions of the functions that respect the filter
+        """
+        if positions is None:
+            positions = range(len(names))
+        if self.__status_filter is not None:
+            want = 1 if self.__status_filter == 'active' else 0
+            positions = [i for i in positions if active[i] == want]
+        if self.__selected_filter is not None:
+            want = 1 if self.__selected_filter == 'selected' else 0
+            positions = [i for i in positions if selected[i] == want]
+        if self.__library_filter is not None:
+            positions = [i for i in positions if (split_name(names[i])[1] or '') == self.__library_filter]
+        if self.__regex is not None and self.__regex.pattern:
+            search = self.__regex.search
+            # Only the names of the library functions have to be split
+            positions = [i for i in positions
+                         if search(names[i] if LIBRARY_SEPARATOR not in names[i] else split_name(names[i])[0])]
+        return list(positions)
+
     def __call__(self, func, active=None, selected=None):
         """
         Applies the filter to a function
-        :param func: The name of the function
+        :param func: The qualified name of the function, see qualify_name
         :param active: If the function is active, None if you don't care
         :param selected: If the function is selected, None if you don't care
         :return: True if the function respects the filter
@@ -94,6 +311,37 @@ class Filter:
                 return False
             if self.__selected_filter == 'unselected' and selected:
                 return False
+        if self.__library_filter is not None or self.__regex is not None:
+            func, lib = split_name(func)
+            if self.__library_filter is not None and (lib or '') != self.__library_filter:
+                return False
         if self.__regex is not None:
             return self.__regex.search(func) is not None
         return True
+
+
+def function_status(active, count=None, processes=1):
+    """
+    Formats the status of a function
+    :param active: If the function is active
+    :param count: The number of processes in which the function is active, None for a single process
+    :param processes: The number of processes
+    :return: The status string
+    """
+    if not active:
+        return '(nopped)'
+    if count is None or processes <= 1:
+        return '(active)'
+    return '(active %d/%d)' % (count, processes)
+
+
+def format_rate(rate):
+    """
+    Formats an event rate
+    :param rate: The number of events per second
+    :return: The rate string, e.g. '12.5k/s'
+    """
+    for unit, scale in (('G', 1e9), ('M', 1e6), ('k', 1e3)):
+        if rate >= scale:
+            return '%.1f%s/s' % (rate / scale, unit)
+    return '%.0f/s' % rate
@@ -0,0 +1,132 @@
+import threading
+
+from dynamic_inst_client.communicator import CommunicatorException
+
+
+class CommunicatorWorker:
+    """
+    Runs the Communicator requests on a background thread so that the caller doesn't wait on the server.
+    Requests made while another one is pending are coalesced: the function statuses set one after the other are
+    merged in a single PUT and the refreshes are done once. The changes are sent in the order they were made.
+    The function list of the communicator is only touched by the worker thread once started, each batch of requests
+    ends with a snapshot of it (see Communicator.snapshot) for the caller's thread to read.
+    :ivar __comm: The communicator
+    :ivar __on_done: Called from the worker thread each time a batch of requests is done
+    :ivar __cond: Protects the pending requests and the results
+    :ivar __changes: The function statuses waiting to be sent, list of (funcs, window) sent in order, window is None
+        for the statuses set for good
+    :ivar __refresh: True if a refresh is waiting to be done
+    :ivar __busy: True while the worker thread is doing requests
+    :ivar __results: The results not yet collected, list of (changed functions, exception or None, snapshot or None)
+    :ivar __thread: The worker thread, None if not started
+    :ivar __stopped: True when the worker must stop
+    """
+
+    def __init__(self, communicator, on_done=None):
+        """
+        :param communicator: The communicator to use, only the worker must do requests with it once started
+        :param on_done: The callback, called from the worker thread when results are available
+        """
+        self.__comm = communicator
+        self.__on_done = on_done
+        self.__cond = threading.Condition()
+        self.__changes = []
+        self.__refresh = False
+        self.__busy = False
+        self.__results = []
+        self.__thread = None
+        self.__stopped = False
+
+    def start(self):
+        """
+        Starts the worker thread
+        """
+        self.__stopped = False
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stops the worker thread, waits for the current request to finish
+        """
+        with self.__cond:
+            self.__stopped = True
+            self.__cond.notify()
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+
+    def set_functions(self, funcs, window=None):
+        """
+        Queues a function status change, merged with the last change not yet sent if neither has a window. The
+        changes with a window are not merged, each is sent in its own request.
+        :param funcs: The dictionary of functions to modify
+        :param window: The length in seconds of the window after which the server sets the functions back, None for
+            no window
+        """
+        with self.__cond:
+            if window is None and self.__changes and self.__changes[-1][1] is None:
+                self.__changes[-1][0].update(funcs)
+            else:
+                self.__changes.append((dict(funcs), window))
+            self.__cond.notify()
+
+    def refresh(self):
+        """
+        Queues a refresh of the function list
+        """
+        with self.__cond:
+            self.__refresh = True
+            self.__cond.notify()
+
+    @property
+    def pending(self):
+        """
+        Read-only property that tells if there are requests queued or in progress
+        :return: True if there is work pending
+        """
+        with self.__cond:
+            return self.__busy or self.__refresh or len(self.__changes) > 0
+
+    def results(self):
+        """
+        Collects the results of the requests done since the last call
+        :return: The list of (changed functions, exception or None, snapshot of the communicator after the requests or
+            None if they failed)
+        """
+        with self.__cond:
+            results, self.__results = self.__results, []
+        return results
+
+    def __run(self):
+        """
+        Worker thread loop
+        """
+        while True:
+            with self.__cond:
+                while not self.__stopped and not self.__refresh and not self.__changes:
+                    self.__cond.wait()
+                if self.__stopped:
+                    return
+                changes, self.__changes = self.__changes, []
+                refresh, self.__refresh = self.__refresh, False
+                self.__busy = True
+
+            changed = set()
+            error = None
+            snapshot = None
+            try:
+                for funcs, window in changes:
+                    self.__comm.set_functions(funcs, window)
+                    changed.update(funcs)
+                if refresh:
+                    changed.update(self.__comm.refresh())
+                snapshot = self.__comm.snapshot()
+            except CommunicatorException as e:
+                error = e
+
+            with self.__cond:
+                self.__results.append((changed, error, snapshot))
+                self.__busy = False
+            if self.__on_done is not None:
+                self.__on_done()
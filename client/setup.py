@@ -10,6 +10,7 @@ setuptools.setup(
     license='GPLv2',
     url='https://github.com/jabarszcz/dynamic_inst_tui',
     packages=['dynamic_inst_client'],
+    python_requires='>=3.10',
     install_requires=[
         'requests',
         'urwid'
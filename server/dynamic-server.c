@@ -1,5 +1,13 @@
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fnmatch.h>
 #include <pthread.h>
 #include <stdbool.h>
+#include <sys/socket.h>
+#include <sys/stat.h>
+#include <sys/un.h>
+#include <time.h>
 #include <unistd.h>
 
 #include "mongoose/mongoose.h"
@@ -7,61 +15,408 @@
 
 #include "list.h"
 #include "dynamic-symbols.h"
+#include "symbol-cache.h"
 
 struct server_data {
 	struct symtabs *symtabs;
+	struct instrumentation_state *state;
 	char *port;
+	char *socket_path;	/* NULL to listen on the port */
+	char *exec_name;
+	char *symcache_dir;	/* NULL when the symbol cache is off */
+	struct list_head libs;	/* struct instrumented_lib */
+	struct list_head timers;	/* struct revert_timer, by deadline */
+	/* LOADING until the loader thread is done, read with __atomic */
+	int load_status;
+};
+
+/*
+ * Function set for a while (PUT with for=MS), set back to its previous
+ * status by the server thread when the window ends, even if the client
+ * is gone by then.
+ */
+struct revert_timer {
+	struct list_head list;
+	struct instrumentation_state *state;
+	struct sym *sym;
+	int active;		/* status to set back */
+	double deadline;	/* monotonic, in seconds */
+};
+
+enum load_status {
+	LOADING,
+	LOADED,
+	LOAD_FAILED,
 };
 
 #define EXEC_NAME_SIZE 1024
+#define LIB_NAME_SIZE 256
+#define MAX_POLL_MS 1000
+#define LIST_CHUNK_SIZE (64 * 1024)
+/* room for the function that crosses the chunk size */
+#define LIST_CHUNK_SLACK 1024
 static const int CHUNKED = -1;
 static const struct mg_str s_get_method = MG_MK_STR("GET");
 static const struct mg_str s_put_method = MG_MK_STR("PUT");
 static char *default_port = "8489";
 
 static struct symtabs symtabs;
+static struct instrumentation_state state;
 
 static int is_equal(const struct mg_str *s1, const struct mg_str *s2)
 {
 	return s1->len == s2->len && memcmp(s1->p, s2->p, s2->len) == 0;
 }
 
-static void handle_list(struct mg_connection *nc,
-			struct http_message *hm)
+struct list_query {
+	int status;		/* -1 for any, 0 for nopped, 1 for active */
+	char match[256];	/* fnmatch(3) pattern, empty for any */
+	unsigned long offset;
+	unsigned long limit;	/* 0 for no limit */
+};
+
+static int get_ulong_var(struct http_message *hm, const char *name,
+			 unsigned long *value)
 {
-	struct symtabs *symtabs;
-	struct instrumented_func *pos;
-	LIST_HEAD(ifs);
-	symtabs = ((struct server_data*)nc->user_data)->symtabs;
-	get_instrumented_funcs(&symtabs->symtab, &ifs);
+	char buf[32];
+	char *end;
+
+	if (mg_get_http_var(&hm->query_string, name,
+			    buf, sizeof(buf)) <= 0)
+		return 0;
+
+	*value = strtoul(buf, &end, 10);
+	return *end == '\0';
+}
+
+/*
+ * mg_get_http_var fails both when the variable is not in the query string
+ * and when its value doesn't fit in the buffer, this tells them apart.
+ */
+static int has_http_var(const struct mg_str *qs, const char *name)
+{
+	size_t len = strlen(name);
+	const char *p;
+
+	for (p = qs->p; p + len < qs->p + qs->len; p++) {
+		if ((p == qs->p || p[-1] == '&') && p[len] == '=' &&
+		    strncmp(p, name, len) == 0)
+			return 1;
+	}
+	return 0;
+}
+
+static int get_list_query(struct http_message *hm, struct list_query *q)
+{
+	char status[8];
+	int len;
+
+	q->status = -1;
+	if (mg_get_http_var(&hm->query_string, "status",
+			    status, sizeof(status)) > 0) {
+		if (strcmp(status, "active") == 0)
+			q->status = 1;
+		else if (strcmp(status, "nopped") == 0)
+			q->status = 0;
+		else
+			return -1;
+	}
+
+	len = mg_get_http_var(&hm->query_string, "match",
+			      q->match, sizeof(q->match));
+	/* A pattern too long for the buffer is not dropped silently */
+	if (len < 0 && has_http_var(&hm->query_string, "match"))
+		return -1;
+	if (len <= 0)
+		q->match[0] = '\0';
+
+	if (!get_ulong_var(hm, "offset", &q->offset))
+		q->offset = 0;
+	if (!get_ulong_var(hm, "limit", &q->limit))
+		q->limit = 0;
+
+	return 0;
+}
+
+static int query_matches(struct list_query *q, struct instrumented_func *f)
+{
+	if (q->status >= 0 && !!f->active != q->status)
+		return 0;
+
+	return !q->match[0] || fnmatch(q->match, f->sym->name, 0) == 0;
+}
+
+/*
+ * The state of the library named by the lib parameter, loaded on first
+ * use, or of the main program without it. Sends the error response and
+ * returns NULL if there is no such library, or if the parameter can't be
+ * read (e.g. too long): it must not fall back to the main program.
+ */
+static struct instrumentation_state *get_request_state(struct mg_connection *nc,
+						       struct http_message *hm,
+						       char *lib)
+{
+	struct server_data *data = nc->user_data;
+	struct instrumented_lib *il;
+
+	lib[0] = '\0';
+	if (!has_http_var(&hm->query_string, "lib"))
+		return data->state;
+
+	if (mg_get_http_var(&hm->query_string, "lib",
+			    lib, LIB_NAME_SIZE) < 0) {
+		mg_http_send_error(nc, 400, NULL);
+		return NULL;
+	}
+
+	il = find_instrumented_lib(&data->libs, lib);
+	if (!il) {
+		/* It may have been loaded since the last lookup */
+		update_instrumented_libs(data->symtabs, &data->libs,
+					 data->exec_name);
+		il = find_instrumented_lib(&data->libs, lib);
+	}
+	if (!il) {
+		mg_http_send_error(nc, 404, NULL);
+		return NULL;
+	}
+
+	if (load_instrumented_lib(data->symtabs, il) < 0) {
+		mg_http_send_error(nc, 500, NULL);
+		return NULL;
+	}
+
+	return &il->state;
+}
+
+/*
+ * The response is written in a buffer sent in chunks of about
+ * LIST_CHUNK_SIZE bytes, instead of one chunk per function.
+ */
+static void append_str(struct mbuf *buf, const char *s)
+{
+	mbuf_append(buf, s, strlen(s));
+}
+
+static void flush_chunk(struct mg_connection *nc, struct mbuf *buf)
+{
+	mg_send_http_chunk(nc, buf->buf, buf->len);
+	mbuf_remove(buf, buf->len);
+}
+
+static void handle_list(struct mg_connection *nc, struct http_message *hm,
+			struct instrumentation_state *state, const char *lib)
+{
+	struct instrumented_func *f, *end;
+	struct list_query query;
+	struct mbuf buf;
+	char head[128];
+	unsigned long since, total = 0, sent = 0;
+	int delta;
+
+	if (get_list_query(hm, &query) < 0) {
+		mg_http_send_error(nc, 400, NULL);
+		return;
+	}
+
+	/*
+	 * A client that knows a generation only gets the functions that
+	 * changed after it, or nothing at all if it is up to date. Unknown
+	 * (future) generations get the whole list.
+	 */
+	delta = get_ulong_var(hm, "since", &since) &&
+		since <= state->generation;
+	if (delta && since == state->generation) {
+		mg_send_head(nc, 304, 0, NULL);
+		return;
+	}
 
 	mg_send_head(nc, 200, CHUNKED, NULL);
 
-	mg_printf_http_chunk(nc, "{ \"functions\": [");
-	list_for_each_entry(pos, &ifs, list) {
-		mg_printf_http_chunk(nc,
-				     "{\"name\":\"%s\", "
-				     "\"active\":%s}%s",
-				     pos->sym->name,
-				     pos->active ? "true" : "false",
-				     list_is_last(&pos->list, &ifs) ?
-				     "" : ", ");
+	mbuf_init(&buf, LIST_CHUNK_SIZE + LIST_CHUNK_SLACK);
+	snprintf(head, sizeof(head), "{ \"generation\": %lu, ",
+		 state->generation);
+	append_str(&buf, head);
+	if (lib[0]) {
+		append_str(&buf, "\"lib\": \"");
+		append_str(&buf, lib);
+		append_str(&buf, "\", ");
 	}
-	mg_printf_http_chunk(nc, "] }\n");
+	if (delta) {
+		snprintf(head, sizeof(head), "\"since\": %lu, ", since);
+		append_str(&buf, head);
+	}
+	append_str(&buf, "\"functions\": [");
+
+	end = state->funcs + state->nr_funcs;
+	for (f = state->funcs; f < end; f++) {
+		if (delta && f->gen <= since)
+			continue;
+		if (!query_matches(&query, f))
+			continue;
+
+		/* total counts every match, only the page is sent */
+		total++;
+		if (total <= query.offset ||
+		    (query.limit && sent == query.limit))
+			continue;
+
+		append_str(&buf, sent ? ", {\"name\":\"" : "{\"name\":\"");
+		append_str(&buf, f->sym->name);
+		append_str(&buf, f->active ? "\", \"active\":true}" :
+			   "\", \"active\":false}");
+		sent++;
+
+		if (buf.len >= LIST_CHUNK_SIZE)
+			flush_chunk(nc, &buf);
+	}
+	snprintf(head, sizeof(head), "], \"total\": %lu }\n", total);
+	append_str(&buf, head);
+	flush_chunk(nc, &buf);
 	/* Send empty chunk, the end of response */
 	mg_send_http_chunk(nc, "", 0);
 
-	free_instrumented_funcs(&ifs);
+	mbuf_free(&buf);
 }
 
-static void handle_set(struct mg_connection *nc, struct http_message *hm)
+static int wants_ack(struct http_message *hm)
 {
-	struct symtabs *symtabs;
+	char reply[8];
+
+	if (mg_get_http_var(&hm->query_string, "reply",
+			    reply, sizeof(reply)) <= 0)
+		return 0;
+
+	return strcmp(reply, "ack") == 0;
+}
+
+static void handle_ack(struct mg_connection *nc,
+		       struct instrumentation_state *state, int updated)
+{
+	mg_send_head(nc, 200, CHUNKED, NULL);
+	mg_printf_http_chunk(nc, "{ \"updated\": %d, \"generation\": %lu }\n",
+			     updated, state->generation);
+	/* Send empty chunk, the end of response */
+	mg_send_http_chunk(nc, "", 0);
+}
+
+static double monotonic_time(void)
+{
+	struct timespec ts;
+
+	clock_gettime(CLOCK_MONOTONIC, &ts);
+	return ts.tv_sec + ts.tv_nsec / 1e9;
+}
+
+static struct revert_timer *find_revert(struct server_data *data,
+					struct sym *sym)
+{
+	struct revert_timer *t;
+
+	list_for_each_entry(t, &data->timers, list) {
+		if (t->sym == sym)
+			return t;
+	}
+	return NULL;
+}
+
+static void cancel_revert(struct server_data *data, struct sym *sym)
+{
+	struct revert_timer *t = find_revert(data, sym);
+
+	if (t) {
+		list_del(&t->list);
+		free(t);
+	}
+}
+
+/*
+ * A function already in a window keeps the status it had before the
+ * first one, only its deadline moves.
+ */
+static int schedule_revert(struct server_data *data,
+			   struct instrumentation_state *state,
+			   struct sym *sym, double deadline)
+{
+	struct revert_timer *t, *pos;
+	struct instrumented_func *f;
+
+	t = find_revert(data, sym);
+	if (t) {
+		list_del(&t->list);
+	} else {
+		t = malloc(sizeof(*t));
+		if (!t)
+			return -1;
+		f = find_instrumented_func(state, sym);
+		if (!f) {
+			/* Not instrumentable, nothing to set back */
+			free(t);
+			return 0;
+		}
+		t->state = state;
+		t->sym = sym;
+		t->active = f->active;
+	}
+	t->deadline = deadline;
+
+	list_for_each_entry(pos, &data->timers, list) {
+		if (pos->deadline > deadline)
+			break;
+	}
+	list_add_tail(&t->list, &pos->list);
+	return 0;
+}
+
+static void run_timers(struct server_data *data)
+{
+	struct revert_timer *t, *tmp;
+	double now = monotonic_time();
+
+	list_for_each_entry_safe(t, tmp, &data->timers, list) {
+		if (t->deadline > now)
+			break;
+		update_instrumentation_sym(t->state, t->sym, t->active,
+					   t->state->generation + 1);
+		list_del(&t->list);
+		free(t);
+	}
+}
+
+/* Wakes up the poll loop in time for the next window end */
+static int poll_timeout(struct server_data *data)
+{
+	struct revert_timer *t;
+	double ms;
+
+	if (list_empty(&data->timers))
+		return MAX_POLL_MS;
+
+	t = list_entry(data->timers.next, struct revert_timer, list);
+	ms = (t->deadline - monotonic_time()) * 1000;
+	if (ms <= 0)
+		return 0;
+	if (ms >= MAX_POLL_MS)
+		return MAX_POLL_MS;
+	/* Rounded up, waking up early would only poll again */
+	return (int) ms + 1;
+}
+
+static void handle_set(struct mg_connection *nc, struct http_message *hm,
+		       struct instrumentation_state *state, const char *lib)
+{
+	struct server_data *data = nc->user_data;
 	struct json_token t;
+	unsigned long window_ms;
+	double deadline = 0;
+	/* The functions changed by the request share one generation */
+	unsigned long gen = state->generation + 1;
 	int i;
 
+	if (get_ulong_var(hm, "for", &window_ms) && window_ms > 0)
+		deadline = monotonic_time() + window_ms / 1000.0;
+
 	// parse JSON with frozen
-	symtabs = ((struct server_data*)nc->user_data)->symtabs;
 	for (i = 0;
 	     json_scanf_array_elem(hm->body.p, hm->body.len,
 				   ".functions", i, &t) > 0;
@@ -75,7 +430,7 @@ static void handle_set(struct mg_connection *nc, struct http_message *hm)
 		if (!function)
 			continue;
 
-		struct sym *s = find_symname(&symtabs->symtab, function);
+		struct sym *s = find_symname(state->symtab, function);
 		free(function);
 
 		if (!s) {
@@ -83,26 +438,101 @@ static void handle_set(struct mg_connection *nc, struct http_message *hm)
 			return;
 		}
 
-		set_instrumentation_sym(s, active);
+		/* A set without a window ends the pending one */
+		if (!deadline)
+			cancel_revert(data, s);
+		else if (schedule_revert(data, state, s, deadline) < 0) {
+			mg_http_send_error(nc, 500, NULL);
+			return;
+		}
+
+		update_instrumentation_sym(state, s, active, gen);
+	}
+
+	/*
+	 * Clients sending only a change set don't need the whole table
+	 * back, a short acknowledgement is enough.
+	 */
+	if (wants_ack(hm))
+		handle_ack(nc, state, i);
+	else
+		handle_list(nc, hm, state, lib);
+}
+
+static void handle_libraries(struct mg_connection *nc)
+{
+	struct server_data *data = nc->user_data;
+	struct instrumented_lib *il;
+
+	update_instrumented_libs(data->symtabs, &data->libs, data->exec_name);
+
+	mg_send_head(nc, 200, CHUNKED, NULL);
+	mg_printf_http_chunk(nc, "{ \"libraries\": [");
+	list_for_each_entry(il, &data->libs, list) {
+		mg_printf_http_chunk(nc,
+				     "{\"name\":\"%s\", \"path\":\"%s\", "
+				     "\"loaded\":%s}%s",
+				     instrumented_lib_name(il),
+				     il->map->libname,
+				     il->loaded ? "true" : "false",
+				     list_is_last(&il->list, &data->libs) ?
+				     "" : ", ");
 	}
+	mg_printf_http_chunk(nc, "] }\n");
+	/* Send empty chunk, the end of response */
+	mg_send_http_chunk(nc, "", 0);
+}
 
-	handle_list(nc, hm);
+static void handle_loading(struct mg_connection *nc)
+{
+	static const char body[] = "{ \"loading\": true }\n";
+
+	mg_send_head(nc, 503, sizeof(body) - 1,
+		     "Content-Type: application/json\r\n"
+		     "Retry-After: 1");
+	mg_send(nc, body, sizeof(body) - 1);
 }
 
 static void ev_handler(struct mg_connection *nc, int ev, void *ev_data)
 {
 	struct http_message *hm = (struct http_message *) ev_data;
+	struct server_data *data = nc->user_data;
+	struct instrumentation_state *state;
+	char lib[LIB_NAME_SIZE];
 
 	switch (ev) {
 	case MG_EV_HTTP_REQUEST:
 		if (mg_vcmp(&hm->uri, "/instrumentation") == 0) {
-			if (is_equal(&hm->method, &s_get_method)) {
-				handle_list(nc, hm);
-			} else if (is_equal(&hm->method, &s_put_method)) {
-				handle_set(nc, hm);
-			} else {
+			/* The symbols are only there once the loader is done */
+			switch (__atomic_load_n(&data->load_status,
+						__ATOMIC_ACQUIRE)) {
+			case LOADING:
+				handle_loading(nc);
+				return;
+			case LOAD_FAILED:
+				mg_http_send_error(nc, 500, NULL);
+				return;
+			}
+
+			if (!is_equal(&hm->method, &s_get_method) &&
+			    !is_equal(&hm->method, &s_put_method)) {
 				mg_http_send_error(nc, 405, NULL);
+				return;
 			}
+
+			state = get_request_state(nc, hm, lib);
+			if (!state)
+				return;
+
+			if (is_equal(&hm->method, &s_get_method))
+				handle_list(nc, hm, state, lib);
+			else
+				handle_set(nc, hm, state, lib);
+		} else if (mg_vcmp(&hm->uri, "/libraries") == 0) {
+			if (is_equal(&hm->method, &s_get_method))
+				handle_libraries(nc);
+			else
+				mg_http_send_error(nc, 405, NULL);
 		} else {
 			mg_http_send_error(nc, 404, NULL);
 		}
@@ -112,42 +542,155 @@ static void ev_handler(struct mg_connection *nc, int ev, void *ev_data)
 	}
 }
 
+static void *load_symbols(void *data)
+{
+	struct server_data *server_data = data;
+	struct symtabs *symtabs = server_data->symtabs;
+	char *dir = server_data->symcache_dir;
+	int status = LOADED;
+
+	/* A cached table spares parsing and sorting the ELF symbols */
+	if (dir && symcache_load(dir, server_data->exec_name,
+				 &symtabs->symtab) == 0) {
+		symtabs->loaded = true;
+	} else {
+		load_symtabs(symtabs, NULL, server_data->exec_name);
+		if (dir && symcache_save(dir, server_data->exec_name,
+					 &symtabs->symtab) < 0)
+			fprintf(stderr, "Error saving the symbols in %s\n",
+				dir);
+	}
+
+	if (init_instrumentation_state(server_data->state,
+				       &server_data->symtabs->symtab) < 0) {
+		fprintf(stderr, "Error loading the symbols of %s\n",
+			server_data->exec_name);
+		status = LOAD_FAILED;
+	}
+
+	__atomic_store_n(&server_data->load_status, status, __ATOMIC_RELEASE);
+	return NULL;
+}
+
+/*
+ * Mongoose 6 only binds TCP and UDP addresses, the Unix socket is bound
+ * here and handed to it as a listening connection.
+ */
+static int bind_unix_socket(const char *path)
+{
+	struct sockaddr_un addr = { .sun_family = AF_UNIX };
+	int fd;
+
+	if (strlen(path) >= sizeof(addr.sun_path))
+		return -1;
+	strcpy(addr.sun_path, path);
+
+	fd = socket(AF_UNIX, SOCK_STREAM | SOCK_CLOEXEC, 0);
+	if (fd < 0)
+		return -1;
+
+	/* Left by a process that had the same pid */
+	unlink(path);
+	if (bind(fd, (struct sockaddr *) &addr, sizeof(addr)) < 0 ||
+	    listen(fd, SOMAXCONN) < 0) {
+		close(fd);
+		return -1;
+	}
+
+	return fd;
+}
+
+static char *unix_socket_path;
+
+static void remove_unix_socket(void)
+{
+	unlink(unix_socket_path);
+}
+
+static struct mg_connection *bind_server(struct mg_mgr *mgr,
+					 struct server_data *data)
+{
+	struct mg_bind_opts opts = {0};
+	struct mg_add_sock_opts sock_opts = {0};
+	struct mg_connection *nc;
+	int fd;
+
+	if (!data->socket_path) {
+		opts.user_data = data;
+		return mg_bind_opt(mgr, data->port, ev_handler, opts);
+	}
+
+	fd = bind_unix_socket(data->socket_path);
+	if (fd < 0)
+		return NULL;
+
+	sock_opts.user_data = data;
+	nc = mg_add_sock_opt(mgr, fd, ev_handler, sock_opts);
+	if (nc == NULL) {
+		close(fd);
+		unlink(data->socket_path);
+		return NULL;
+	}
+	nc->flags |= MG_F_LISTENING;
+
+	unix_socket_path = data->socket_path;
+	atexit(remove_unix_socket);
+	return nc;
+}
+
 static void *run_server(void *data) {
 	struct mg_mgr mgr;
 	struct mg_connection *nc;
+	pthread_t loader;
 
 	struct server_data *server_data = data;
-	struct mg_bind_opts opts = {0};
-
-	opts.user_data = data;
+	const char *address = server_data->socket_path ?: server_data->port;
 
 	mg_mgr_init(&mgr, NULL);
 
-	nc = mg_bind_opt(&mgr, server_data->port, ev_handler, opts);
+	nc = bind_server(&mgr, server_data);
 	if (nc == NULL) {
-		fprintf(stderr, "Error starting server on port %s\n",
-			server_data->port);
+		fprintf(stderr, "Error starting server on %s\n", address);
 		exit(1);
 	}
 
 	mg_set_protocol_http_websocket(nc);
 
-	fprintf(stderr, "Starting RESTful server on port %s\n",
-		server_data->port);
+	/*
+	 * Parsing and sorting the symbol table takes a while on big
+	 * binaries, the server answers "loading" in the meantime.
+	 */
+	if (pthread_create(&loader, NULL, load_symbols, data) != 0) {
+		fprintf(stderr, "Error starting the symbol loader\n");
+		exit(1);
+	}
+	pthread_detach(loader);
+
+	fprintf(stderr, "Starting RESTful server on %s\n", address);
 	for (;;) {
-		mg_mgr_poll(&mgr, 1000);
+		mg_mgr_poll(&mgr, poll_timeout(server_data));
+		run_timers(server_data);
 	}
 	mg_mgr_free(&mgr);
 }
 
-void start_dyn_server(char *port, struct symtabs *s)
+void start_dyn_server(char *port, char *socket_path, char *exec_name,
+		      char *symcache_dir, struct symtabs *s,
+		      struct instrumentation_state *is)
 {
 	pthread_t thread;
 	struct server_data *data;
 
 	data = malloc(sizeof(*data));
 	data->symtabs = s;
+	data->state = is;
 	data->port = port;
+	data->socket_path = socket_path;
+	data->exec_name = exec_name;
+	data->symcache_dir = symcache_dir;
+	INIT_LIST_HEAD(&data->libs);
+	INIT_LIST_HEAD(&data->timers);
+	data->load_status = LOADING;
 
 	pthread_create(&thread, NULL, run_server, (void*)data);
 }
@@ -155,7 +698,7 @@ void start_dyn_server(char *port, struct symtabs *s)
 __attribute__((constructor))
 void init_dyn_server(void)
 {
-	char *port, *exec_name;
+	char *port, *socket_dir, *socket_path = NULL, *exec_name, *symcache_dir;
 	int ret;
 
 	/* Take port from environment or default */
@@ -163,6 +706,24 @@ void init_dyn_server(void)
 	if (!port)
 		port = default_port;
 
+	/*
+	 * One socket per process in a directory instead of the port, the
+	 * processes of a host don't compete for the same port.
+	 */
+	socket_dir = getenv("DYN_SERVER_SOCKET_DIR");
+	if (socket_dir && socket_dir[0]) {
+		if (mkdir(socket_dir, 0700) < 0 && errno != EEXIST)
+			goto err;
+		if (asprintf(&socket_path, "%s/dyn-server-%d.sock",
+			     socket_dir, getpid()) < 0)
+			goto err;
+	}
+
+	/* Opt-in cache of the parsed symbols, shared by every process */
+	symcache_dir = getenv("DYN_SERVER_SYMCACHE");
+	if (symcache_dir && !symcache_dir[0])
+		symcache_dir = NULL;
+
 	/* Find executable file name */
 	exec_name = malloc(EXEC_NAME_SIZE);
 	ret = readlink("/proc/self/exe", exec_name, EXEC_NAME_SIZE);
@@ -170,11 +731,12 @@ void init_dyn_server(void)
 		goto err;
 	exec_name[ret] = '\0';
 
-	/* Init symtabs */
-	load_symtabs(&symtabs, NULL, exec_name);
-
-	/* Start server */
-	start_dyn_server(port, &symtabs);
+	/*
+	 * Start server, the symtabs are loaded by the server thread so
+	 * the program doesn't wait for them before main().
+	 */
+	start_dyn_server(port, socket_path, exec_name, symcache_dir, &symtabs,
+			 &state);
 	return;
 err:
 	printf("Error while starting dynamic instrumentation server\n");
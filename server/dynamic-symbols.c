@@ -1,5 +1,11 @@
+#define _GNU_SOURCE
+
+#include <limits.h>
 #include <stddef.h>
 #include <malloc.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
 #include <lttng-mcount/dynamic.h>
 
 #include "dynamic-symbols.h"
@@ -9,37 +15,241 @@ int set_instrumentation_sym(struct sym *sym, int enable)
 	return set_instrumentation(sym->addr, enable);
 }
 
-void free_instrumented_funcs(struct list_head *list)
+int get_instrumentation_sym(struct sym *sym, int *active)
 {
-	struct instrumented_func *pos, *tmp;
-	list_for_each_entry_safe(pos, tmp, list, list) {
-		list_del(&pos->list);
-		free(pos);
-	}
+	enum lttng_mcount_patch status;
+	int ret;
+
+	ret = get_instrumentation(sym->addr, &status);
+	if (ret)
+		return ret;
+	if (status == NO_PATCH)
+		return -1;
+
+	*active = (int) status;
+	return 0;
 }
-struct list_head *get_instrumented_funcs(struct symtab *symtab,
-					 struct list_head *ifs)
+
+/*
+ * Asks lttng-mcount for the status of every symbol once, the requests
+ * then only go through the instrumentable ones.
+ */
+int init_instrumentation_state(struct instrumentation_state *state,
+			       struct symtab *symtab)
 {
-	int ret;
 	unsigned i;
+	int active;
 	struct sym *sym;
-	enum lttng_mcount_patch status;
-	struct instrumented_func *new = NULL;
+	struct instrumented_func *f;
+
+	state->symtab = symtab;
+	state->generation = 0;
+	state->nr_funcs = 0;
+	state->funcs = malloc((symtab->nr_sym ? symtab->nr_sym : 1) *
+			      sizeof(*state->funcs));
+	state->func_index = malloc((symtab->nr_sym ? symtab->nr_sym : 1) *
+				   sizeof(*state->func_index));
+	if (!state->funcs || !state->func_index) {
+		free(state->funcs);
+		free(state->func_index);
+		return -1;
+	}
+
+	for (i = 0; i < symtab->nr_sym; i++)
+		state->func_index[i] = NO_FUNC;
 
 	for (i = 0; i < symtab->nr_sym; i++) {
-		sym = &symtab->sym[i];
+		/* name order lets clients stream the list without sorting it */
+		if (symtab->name_sorted)
+			sym = symtab->sym_names[i];
+		else
+			sym = &symtab->sym[i];
 
-		ret = get_instrumentation(sym->addr, &status);
-		if (ret || status == NO_PATCH)
+		if (get_instrumentation_sym(sym, &active))
 			continue;
 
-		new = malloc(sizeof(*new));
-		INIT_LIST_HEAD(&new->list);
-		new->active = (int) status;
-		new->sym = sym;
+		f = &state->funcs[state->nr_funcs];
+		f->sym = sym;
+		f->active = active;
+		f->gen = 0;
+		state->func_index[sym - symtab->sym] = state->nr_funcs++;
+	}
+
+	/* Most symbols of a big program aren't instrumentable */
+	f = realloc(state->funcs, (state->nr_funcs ? state->nr_funcs : 1) *
+		    sizeof(*state->funcs));
+	if (f)
+		state->funcs = f;
+
+	return 0;
+}
+
+struct instrumented_func *find_instrumented_func(struct instrumentation_state *state,
+						 struct sym *sym)
+{
+	size_t i = state->func_index[sym - state->symtab->sym];
+
+	return i == NO_FUNC ? NULL : &state->funcs[i];
+}
+
+int update_instrumentation_sym(struct instrumentation_state *state,
+			       struct sym *sym, int enable, unsigned long gen)
+{
+	int ret;
+	struct instrumented_func *f = find_instrumented_func(state, sym);
+
+	if (!f)
+		return -1;
+
+	/* Only real changes are seen by clients asking for a delta */
+	if (f->active == !!enable)
+		return 0;
+
+	ret = set_instrumentation_sym(sym, enable);
+	if (ret)
+		return ret;
+
+	f->active = !!enable;
+	f->gen = gen;
+	state->generation = gen;
+	return 0;
+}
+
+static struct ftrace_proc_maps *find_map_by_path(struct ftrace_proc_maps *maps,
+						 const char *path)
+{
+	for (; maps; maps = maps->next) {
+		if (!strcmp(maps->libname, path))
+			return maps;
+	}
+	return NULL;
+}
+
+static int add_instrumented_lib(struct symtabs *symtabs,
+				struct list_head *libs, const char *path,
+				uint64_t start, uint64_t end,
+				const char *prot)
+{
+	struct ftrace_proc_maps *map;
+	struct instrumented_lib *lib;
+	size_t len = strlen(path);
 
-		list_add_tail(&new->list, ifs);
+	map = calloc(1, sizeof(*map) + len + 1);
+	lib = calloc(1, sizeof(*lib));
+	if (!map || !lib) {
+		free(map);
+		free(lib);
+		return -1;
 	}
-	
-	return ifs;
+
+	map->start = start;
+	map->end = end;
+	memcpy(map->prot, prot, sizeof(map->prot));
+	map->len = len;
+	memcpy(map->libname, path, len + 1);
+	map->next = symtabs->maps;
+	symtabs->maps = map;
+
+	lib->map = map;
+	list_add_tail(&lib->list, libs);
+	return 0;
+}
+
+int update_instrumented_libs(struct symtabs *symtabs, struct list_head *libs,
+			     const char *exename)
+{
+	FILE *fp;
+	char *line = NULL;
+	size_t len = 0;
+	char group[PATH_MAX] = "";
+	uint64_t group_start = 0;
+	int ret = 0;
+
+	/* Libraries loaded since the last update are added, none removed */
+	fp = fopen("/proc/self/maps", "r");
+	if (fp == NULL)
+		return -1;
+
+	while (getline(&line, &len, fp) > 0) {
+		struct ftrace_proc_maps *map;
+		unsigned long start, end;
+		char prot[5];
+		char *path;
+		int pos = 0;
+
+		if (sscanf(line, "%lx-%lx %4s %*s %*s %*s %n",
+			   &start, &end, prot, &pos) < 3 || !pos)
+			continue;
+
+		path = line + pos;
+		path[strcspn(path, "\n")] = '\0';
+		if (path[0] != '/' || !strcmp(path, exename))
+			continue;
+
+		/*
+		 * The mappings of a file are contiguous, the first one is
+		 * where its first segment, and the symbol offsets, start.
+		 */
+		if (strcmp(path, group)) {
+			snprintf(group, sizeof(group), "%s", path);
+			group_start = start;
+		}
+
+		map = find_map_by_path(symtabs->maps, path);
+		if (map) {
+			if (end > map->end)
+				map->end = end;
+			continue;
+		}
+
+		/* Only code can be instrumented */
+		if (prot[2] != 'x')
+			continue;
+
+		if (add_instrumented_lib(symtabs, libs, path, group_start,
+					 end, prot) < 0) {
+			ret = -1;
+			break;
+		}
+	}
+
+	free(line);
+	fclose(fp);
+	return ret;
+}
+
+const char *instrumented_lib_name(struct instrumented_lib *lib)
+{
+	const char *name = strrchr(lib->map->libname, '/');
+
+	return name ? name + 1 : lib->map->libname;
+}
+
+struct instrumented_lib *find_instrumented_lib(struct list_head *libs,
+					       const char *name)
+{
+	struct instrumented_lib *lib;
+
+	/* Either the file name or the whole path */
+	list_for_each_entry(lib, libs, list) {
+		if (!strcmp(instrumented_lib_name(lib), name) ||
+		    !strcmp(lib->map->libname, name))
+			return lib;
+	}
+	return NULL;
+}
+
+int load_instrumented_lib(struct symtabs *symtabs,
+			  struct instrumented_lib *lib)
+{
+	if (lib->loaded)
+		return 0;
+
+	/* A library without symbols is loaded, with no function */
+	load_maps_symtab(symtabs, lib->map);
+	if (init_instrumentation_state(&lib->state, &lib->map->symtab) < 0)
+		return -1;
+
+	lib->loaded = true;
+	return 0;
 }
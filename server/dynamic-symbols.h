@@ -4,14 +4,64 @@
 #include "symbol.h"
 #include "list.h"
 
+/*
+ * Instrumentable function of a symbol table. Its status is read from
+ * lttng-mcount once, when the table is loaded, then kept up to date by
+ * update_instrumentation_sym: the server is the only one patching them.
+ */
 struct instrumented_func {
-	struct list_head list;
-	int active;
 	struct sym *sym;
+	int active;
+	/* generation of the last change */
+	unsigned long gen;
+};
+
+/*
+ * Instrumentation state of a symbol table, every change set (a PUT, or
+ * the end of a window) that changes a function's status bumps the
+ * generation once, so clients can ask for what changed since the
+ * generation they last saw, and a client whose change set was acked one
+ * generation past its own knows nothing else changed.
+ */
+struct instrumentation_state {
+	struct symtab *symtab;
+	unsigned long generation;
+	/* the instrumentable functions, in name order if the table has it */
+	struct instrumented_func *funcs;
+	size_t nr_funcs;
+	/* index in funcs, indexed like symtab->sym, NO_FUNC if none */
+	size_t *func_index;
+};
+
+#define NO_FUNC ((size_t) -1)
+
+/*
+ * Shared library mapped in the process, its symbols and instrumentation
+ * state are only loaded when a client first asks for it.
+ */
+struct instrumented_lib {
+	struct list_head list;
+	struct ftrace_proc_maps *map;
+	struct instrumentation_state state;
+	bool loaded;
 };
 
 int set_instrumentation_sym(struct sym *sym, int enable);
-void free_instrumented_funcs(struct list_head *list);
-struct list_head *get_instrumented_funcs(struct symtab *symtab, struct list_head *ifs);
+int get_instrumentation_sym(struct sym *sym, int *active);
+
+int init_instrumentation_state(struct instrumentation_state *state,
+			       struct symtab *symtab);
+struct instrumented_func *find_instrumented_func(struct instrumentation_state *state,
+						 struct sym *sym);
+int update_instrumentation_sym(struct instrumentation_state *state,
+			       struct sym *sym, int enable, unsigned long gen);
+
+int update_instrumented_libs(struct symtabs *symtabs, struct list_head *libs,
+			     const char *exename);
+struct instrumented_lib *find_instrumented_lib(struct list_head *libs,
+					       const char *name);
+const char *instrumented_lib_name(struct instrumented_lib *lib);
+int load_instrumented_lib(struct symtabs *symtabs,
+			  struct instrumented_lib *lib);
 
 #endif // _DYNAMIC_SYMBOLS_H_
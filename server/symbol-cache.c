@@ -0,0 +1,308 @@
+#define _GNU_SOURCE
+
+#include <errno.h>
+#include <fcntl.h>
+#include <limits.h>
+#include <link.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include "symbol-cache.h"
+
+#define SYMCACHE_MAGIC		"DYNSYMC"
+#define SYMCACHE_VERSION	1
+#define MAX_BUILD_ID		64
+
+/*
+ * File layout, native byte order:
+ *   struct symcache_header
+ *   struct symcache_sym	sym[nr_sym]		address order
+ *   uint32_t			names[nr_sym]		name order, indexes in sym
+ *   char			strtab[strtab_size]
+ */
+struct symcache_header {
+	char magic[8];
+	uint32_t version;
+	uint32_t nr_sym;
+	uint64_t strtab_size;
+};
+
+struct symcache_sym {
+	uint64_t addr;
+	uint32_t size;
+	uint32_t type;
+	uint32_t name;		/* offset in strtab */
+	uint32_t pad;
+};
+
+struct build_id_search {
+	const char *filename;
+	int is_main;
+	char *key;
+};
+
+static int is_main_program(const char *filename)
+{
+	char exe[PATH_MAX];
+	ssize_t len;
+
+	len = readlink("/proc/self/exe", exe, sizeof(exe) - 1);
+	if (len < 0)
+		return 0;
+	exe[len] = '\0';
+
+	return strcmp(exe, filename) == 0;
+}
+
+static int find_build_id(struct dl_phdr_info *info, size_t size, void *data)
+{
+	struct build_id_search *search = data;
+	int i;
+
+	/* An older libc may pass a shorter info, stop without a build-id */
+	if (size < offsetof(struct dl_phdr_info, dlpi_phnum) +
+		   sizeof(info->dlpi_phnum))
+		return 1;
+
+	/* The main program is the object without a name */
+	if (info->dlpi_name[0] == '\0' ? !search->is_main :
+	    strcmp(info->dlpi_name, search->filename) != 0)
+		return 0;
+
+	/* The notes are already mapped, no need to read the file */
+	for (i = 0; i < info->dlpi_phnum; i++) {
+		const ElfW(Phdr) *phdr = &info->dlpi_phdr[i];
+		const char *pos, *end;
+		size_t align;
+
+		if (phdr->p_type != PT_NOTE)
+			continue;
+
+		align = phdr->p_align == 8 ? 8 : 4;
+		pos = (const char *) (info->dlpi_addr + phdr->p_vaddr);
+		end = pos + phdr->p_memsz;
+		while (pos + sizeof(ElfW(Nhdr)) <= end) {
+			const ElfW(Nhdr) *note = (const void *) pos;
+			const char *name = pos + sizeof(*note);
+			const unsigned char *desc;
+			uint32_t j;
+
+			desc = (const void *) (name + ((note->n_namesz +
+							 align - 1) &
+							~(align - 1)));
+			if (note->n_type == NT_GNU_BUILD_ID &&
+			    note->n_namesz == 4 && memcmp(name, "GNU", 4) == 0 &&
+			    note->n_descsz <= MAX_BUILD_ID) {
+				for (j = 0; j < note->n_descsz; j++)
+					sprintf(search->key + 2 * j, "%02x",
+						desc[j]);
+				return 1;
+			}
+
+			pos = (const char *) desc +
+				((note->n_descsz + align - 1) & ~(align - 1));
+		}
+	}
+
+	return 1;
+}
+
+static char *symcache_path(const char *dirname, const char *filename)
+{
+	char key[2 * MAX_BUILD_ID + 1] = "";
+	struct build_id_search search = {
+		.filename = filename,
+		.is_main = is_main_program(filename),
+		.key = key,
+	};
+	struct stat st;
+	char *path = NULL;
+
+	dl_iterate_phdr(find_build_id, &search);
+	if (!key[0]) {
+		/* Without a build-id, any change of the file is a miss */
+		if (stat(filename, &st) < 0)
+			return NULL;
+		snprintf(key, sizeof(key), "%lx-%lx-%lx-%lx.%09lx",
+			 (unsigned long) st.st_dev, (unsigned long) st.st_ino,
+			 (unsigned long) st.st_size,
+			 (unsigned long) st.st_mtim.tv_sec,
+			 (unsigned long) st.st_mtim.tv_nsec);
+	}
+
+	if (asprintf(&path, "%s/%s-%s.symcache", dirname, basename(filename),
+		     key) < 0)
+		return NULL;
+
+	return path;
+}
+
+int symcache_load(const char *dirname, const char *filename,
+		  struct symtab *symtab)
+{
+	const struct symcache_header *header;
+	const struct symcache_sym *csym;
+	const uint32_t *names;
+	const char *strtab;
+	struct stat st;
+	char *path;
+	void *map;
+	uint32_t i, nr_sym;
+	int fd;
+
+	path = symcache_path(dirname, filename);
+	if (!path)
+		return -1;
+
+	fd = open(path, O_RDONLY);
+	free(path);
+	if (fd < 0)
+		return -1;
+
+	if (fstat(fd, &st) < 0 || (size_t) st.st_size < sizeof(*header)) {
+		close(fd);
+		return -1;
+	}
+
+	/* The mapping is kept, the symbol names point into it */
+	map = mmap(NULL, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+	close(fd);
+	if (map == MAP_FAILED)
+		return -1;
+
+	header = map;
+	nr_sym = header->nr_sym;
+	csym = (const void *) (header + 1);
+	names = (const void *) (csym + nr_sym);
+	strtab = (const void *) (names + nr_sym);
+
+	if (memcmp(header->magic, SYMCACHE_MAGIC, sizeof(header->magic)) ||
+	    header->version != SYMCACHE_VERSION ||
+	    (uint64_t) st.st_size != sizeof(*header) +
+	    (uint64_t) nr_sym * (sizeof(*csym) + sizeof(*names)) +
+	    header->strtab_size ||
+	    header->strtab_size == 0 ||
+	    strtab[header->strtab_size - 1] != '\0')
+		goto err_unmap;
+
+	symtab->sym = calloc(nr_sym ? nr_sym : 1, sizeof(*symtab->sym));
+	symtab->sym_names = calloc(nr_sym ? nr_sym : 1,
+				   sizeof(*symtab->sym_names));
+	if (!symtab->sym || !symtab->sym_names)
+		goto err_free;
+
+	for (i = 0; i < nr_sym; i++) {
+		if (csym[i].name >= header->strtab_size ||
+		    names[i] >= nr_sym)
+			goto err_free;
+
+		symtab->sym[i].addr = csym[i].addr;
+		symtab->sym[i].size = csym[i].size;
+		symtab->sym[i].type = csym[i].type;
+		symtab->sym[i].name = (char *) strtab + csym[i].name;
+		symtab->sym_names[i] = &symtab->sym[names[i]];
+	}
+
+	symtab->nr_sym = nr_sym;
+	symtab->nr_alloc = nr_sym;
+	symtab->name_sorted = true;
+	return 0;
+
+err_free:
+	free(symtab->sym);
+	free(symtab->sym_names);
+	symtab->sym = NULL;
+	symtab->sym_names = NULL;
+err_unmap:
+	munmap(map, st.st_size);
+	return -1;
+}
+
+int symcache_save(const char *dirname, const char *filename,
+		  struct symtab *symtab)
+{
+	struct symcache_header header = {
+		.magic = SYMCACHE_MAGIC,
+		.version = SYMCACHE_VERSION,
+		.nr_sym = symtab->nr_sym,
+	};
+	struct symcache_sym csym = {0};
+	char *path, *tmp = NULL;
+	uint64_t offset = 0;
+	uint32_t index;
+	FILE *fp;
+	size_t i;
+	int ret = 0;
+
+	if (!symtab->name_sorted || symtab->nr_sym > UINT32_MAX)
+		return -1;
+
+	for (i = 0; i < symtab->nr_sym; i++)
+		header.strtab_size += strlen(symtab->sym[i].name) + 1;
+	if (header.strtab_size > UINT32_MAX)
+		return -1;
+	/* Never empty, so a valid file ends with a '\0' */
+	if (header.strtab_size == 0)
+		header.strtab_size = 1;
+
+	if (mkdir(dirname, 0755) < 0 && errno != EEXIST)
+		return -1;
+
+	path = symcache_path(dirname, filename);
+	if (!path)
+		return -1;
+
+	/*
+	 * Written aside then renamed, processes starting at the same time
+	 * never see a partial file.
+	 */
+	if (asprintf(&tmp, "%s.%d", path, getpid()) < 0) {
+		free(path);
+		return -1;
+	}
+
+	fp = fopen(tmp, "wx");
+	if (fp == NULL) {
+		free(tmp);
+		free(path);
+		return -1;
+	}
+
+	fwrite(&header, sizeof(header), 1, fp);
+	for (i = 0; i < symtab->nr_sym; i++) {
+		csym.addr = symtab->sym[i].addr;
+		csym.size = symtab->sym[i].size;
+		csym.type = symtab->sym[i].type;
+		csym.name = offset;
+		offset += strlen(symtab->sym[i].name) + 1;
+		fwrite(&csym, sizeof(csym), 1, fp);
+	}
+	for (i = 0; i < symtab->nr_sym; i++) {
+		index = symtab->sym_names[i] - symtab->sym;
+		fwrite(&index, sizeof(index), 1, fp);
+	}
+	for (i = 0; i < symtab->nr_sym; i++)
+		fwrite(symtab->sym[i].name, strlen(symtab->sym[i].name) + 1,
+		       1, fp);
+	if (symtab->nr_sym == 0)
+		fputc('\0', fp);
+
+	if (ferror(fp))
+		ret = -1;
+	if (fclose(fp) != 0)
+		ret = -1;
+
+	if (ret == 0 && rename(tmp, path) < 0)
+		ret = -1;
+	if (ret < 0)
+		unlink(tmp);
+
+	free(tmp);
+	free(path);
+	return ret;
+}
@@ -0,0 +1,23 @@
+#ifndef _SYMBOL_CACHE_H_
+#define _SYMBOL_CACHE_H_
+
+#include "symbol.h"
+
+/*
+ * On-disk cache of parsed symbol tables, one file per binary in a cache
+ * directory, keyed by the binary's build-id (or by its inode and mtime
+ * when it has none).
+ *
+ * The file is laid out so it can be memory-mapped and used in place: the
+ * symbols in address order, their name order and the string table. No
+ * ELF parsing, sorting or string copy is needed to load it, and processes
+ * of the same binary share the mapped names. A symtab loaded from the
+ * cache points into the mapping, it must not be freed with
+ * unload_symtabs().
+ */
+int symcache_load(const char *dirname, const char *filename,
+		  struct symtab *symtab);
+int symcache_save(const char *dirname, const char *filename,
+		  struct symtab *symtab);
+
+#endif // _SYMBOL_CACHE_H_
@@ -694,6 +694,16 @@ struct ftrace_proc_maps *find_map_by_name(struct symtabs *symtabs,
 	return NULL;
 }
 
+int load_maps_symtab(struct symtabs *symtabs, struct ftrace_proc_maps *maps)
+{
+	if (maps->symtab.nr_sym)
+		return 0;
+
+	/* maps->start is where the first PT_LOAD segment is mapped */
+	return load_symtab(&maps->symtab, maps->libname, maps->start,
+			   symtabs->flags | SYMTAB_FL_ADJ_OFFSET);
+}
+
 void load_symtabs(struct symtabs *symtabs, const char *dirname,
 		  const char *filename)
 {
@@ -92,6 +92,7 @@ size_t count_dynsym(struct symtabs *symtabs);
 
 struct ftrace_proc_maps *find_map_by_name(struct symtabs *symtabs,
 					  const char *prefix);
+int load_maps_symtab(struct symtabs *symtabs, struct ftrace_proc_maps *maps);
 
 int load_kernel_symbol(void);
 struct symtab * get_kernel_symtab(void);